@@ -0,0 +1,209 @@
+#!/usr/bin/env python
+# Copyright (C) 2021, Roland Jung, Control of Networked Systems, University of Klagenfurt, Austria.
+#
+# All rights reserved.
+#
+# This software is licensed under the terms of the BSD-2-Clause-License with
+# no commercial use allowed, the full terms of which are made available in the
+# LICENSE file. No license in patents is granted.
+#
+# You can contact the author at <roland.jung@aau.at>
+#
+# Requirements:
+# re, concurrent.futures
+########################################################################################################################
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+
+
+class BagDiscovery:
+    """
+    Finds the bag files of an EVAL folder structure (EVAL/ATTR_*/LVL_*/RUN_*/*ATTR_*_LVL_*_RUN_*_EST_*.bag).
+
+    The directories are listed level by level with os.scandir, the listings of a level are distributed over
+    `num_threads` threads (directory listing is I/O bound, e.g. on network file systems). The names are matched by
+    compiled regular expressions; malformed names are collected in `malformed_list` instead of stopping the
+    discovery. The bags are returned in the order of the directory listings (as the former nested walk).
+
+    The IDs of ATTR, LVL, RUN and EST must be numeric, since the reports, the analysis and the error series store keep
+    them as integers: directories and bags with other IDs (e.g. ATTR_x, accepted by the former string_to_list parsing)
+    are skipped, counted in the summary line and printed each with a warning.
+    """
+    re_attr = re.compile(r'ATTR_(\d+)')
+    re_lvl = re.compile(r'LVL_(\d+)')
+    re_run = re.compile(r'RUN_(\d+)')
+    re_bag = re.compile(r'ATTR_(\d+)_LVL_(\d+)_RUN_(\d+)_EST_(\d+)\.bag$')
+
+    num_threads = 8
+    bag_list = None  # list of bag file names (absolute)
+    key_list = None  # list of [attr, lvl, run, est] per bag file
+    malformed_list = None  # list of directories/files with a name not matching the naming convention
+
+    def __init__(self, eval_dir, num_threads=8, verbose=False):
+        self.num_threads = max(1, int(num_threads))
+        self.bag_list = []
+        self.key_list = []
+        self.malformed_list = []
+        self.discover(eval_dir, verbose=verbose)
+
+    def discover(self, eval_dir, verbose=False):
+        eval_dir = os.path.abspath(eval_dir)
+        attr_list = self.scan_level([eval_dir], 'ATTR_', BagDiscovery.re_attr)
+        lvl_list = self.scan_level(attr_list, 'LVL_', BagDiscovery.re_lvl)
+        run_list = self.scan_level(lvl_list, 'RUN_', BagDiscovery.re_run)
+
+        for bags in self.map(BagDiscovery.scan_bags, run_list):
+            for bag_fn, key in bags:
+                if key is None:
+                    self.malformed_list.append(bag_fn)
+                else:
+                    self.bag_list.append(bag_fn)
+                    self.key_list.append(key)
+
+        print("BagDiscovery: " + str(eval_dir) + ": " + str(len(attr_list)) + " ATTR, " + str(len(lvl_list)) +
+              " LVL, " + str(len(run_list)) + " RUN folders, " + str(len(self.bag_list)) + " bag files, " +
+              str(len(self.malformed_list)) + " skipped (malformed or non-numeric IDs)")
+        if verbose:
+            for bag_fn, key in zip(self.bag_list, self.key_list):
+                print("\t-bag: " + str(bag_fn) + ', values: attr={0},lvl={1},run={2}, est={3}'.format(*key))
+        for fn in self.malformed_list:
+            print("BagDiscovery: WARNING skipped (malformed name or non-numeric ID): " + str(fn))
+
+    def scan_level(self, dir_list, prefix, regex):
+        # lists all directories of the next level, keeping the order of `dir_list`
+        entry_list = []
+        for sub_dirs, malformed in self.map(lambda d: BagDiscovery.scan_dirs(d, prefix, regex), dir_list):
+            entry_list.extend(sub_dirs)
+            self.malformed_list.extend(malformed)
+        return entry_list
+
+    def map(self, func, args):
+        if self.num_threads > 1 and len(args) > 1:
+            with ThreadPoolExecutor(max_workers=min(self.num_threads, len(args))) as executor:
+                return list(executor.map(func, args))
+        return [func(arg) for arg in args]
+
+    @staticmethod
+    def scan_dirs(directory, prefix, regex):
+        """
+        Output:
+        dir_list -- sub directories whose name contains `prefix` and matches `regex`
+        malformed_list -- sub directories whose name contains `prefix` but does not match `regex`
+        """
+        dir_list = []
+        malformed_list = []
+        with os.scandir(directory) as it:
+            for entry in it:
+                if prefix in entry.name and entry.is_dir():
+                    if regex.fullmatch(entry.name):
+                        dir_list.append(entry.path)
+                    else:
+                        malformed_list.append(entry.path)
+        return dir_list, malformed_list
+
+    @staticmethod
+    def scan_bags(directory):
+        # returns a list of (bag file name, [attr, lvl, run, est] or None)
+        bags = []
+        with os.scandir(directory) as it:
+            for entry in it:
+                if '.bag' in entry.name and entry.is_file():
+                    bags.append((entry.path, BagDiscovery.parse_bag_fn(entry.name)))
+        return bags
+
+    @staticmethod
+    def parse_bag_fn(bag_fn):
+        # returns [attr, lvl, run, est] (strings of digits, as they appear in the name) or None
+        m = BagDiscovery.re_bag.search(os.path.basename(bag_fn))
+        if m is None:
+            return None
+        return list(m.groups())
+
+
+########################################################################################################################
+#################################################### T E S T ###########################################################
+########################################################################################################################
+import unittest
+import tempfile
+import time
+import io
+import contextlib
+
+
+class BagDiscovery_Test(unittest.TestCase):
+    @staticmethod
+    def create_tree(eval_dir, num_attr, num_lvl, num_run, num_est):
+        # synthetic EVAL tree of empty bag files (also used by the tests of EstimatorEvaluation and the Benchmark),
+        # returns the bag files in the order of creation
+        bag_list = []
+        for a in range(1, num_attr + 1):
+            for l in range(1, num_lvl + 1):
+                for r in range(1, num_run + 1):
+                    run_dir = os.path.join(eval_dir, 'ATTR_{0}'.format(a), 'LVL_{0}'.format(l), 'RUN_{0}'.format(r))
+                    os.makedirs(os.path.join(run_dir, 'RESULTS'))
+                    for e in range(1, num_est + 1):
+                        fn = os.path.join(run_dir, 'EVAL_ATTR_{0}_LVL_{1}_RUN_{2}_EST_{3}.bag'.format(a, l, r, e))
+                        open(fn, 'w').close()
+                        bag_list.append(fn)
+        return bag_list
+
+    @staticmethod
+    def walk(eval_dir):
+        # reference: the nested os.listdir walk in listing order
+        bag_list = []
+        for attr in os.listdir(eval_dir):
+            attr_dir = os.path.join(eval_dir, attr)
+            if 'ATTR_' not in attr or not os.path.isdir(attr_dir):
+                continue
+            for lvl in os.listdir(attr_dir):
+                lvl_dir = os.path.join(attr_dir, lvl)
+                if 'LVL_' not in lvl or not os.path.isdir(lvl_dir):
+                    continue
+                for run in os.listdir(lvl_dir):
+                    run_dir = os.path.join(lvl_dir, run)
+                    if 'RUN_' not in run or not os.path.isdir(run_dir):
+                        continue
+                    for bag in os.listdir(run_dir):
+                        if '.bag' in bag and os.path.isfile(os.path.join(run_dir, bag)):
+                            bag_list.append(os.path.join(run_dir, bag))
+        return bag_list
+
+    def test_discover(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            BagDiscovery_Test.create_tree(tmp_dir, 2, 3, 4, 2)
+            os.makedirs(os.path.join(tmp_dir, 'ATTR_x', 'LVL_1'))
+            os.makedirs(os.path.join(tmp_dir, 'ATTR_1', 'LVL_1', 'RUN_'))
+            open(os.path.join(tmp_dir, 'ATTR_1', 'LVL_1', 'RUN_1', 'EST_1.bag'), 'w').close()
+            open(os.path.join(tmp_dir, 'ATTR_1', 'LVL_1', 'RUN_1', 'notes.txt'), 'w').close()
+
+            bag_list_ref = BagDiscovery_Test.walk(tmp_dir)
+            for num_threads in [1, 4]:
+                discovery = BagDiscovery(tmp_dir, num_threads=num_threads)
+                self.assertEqual(len(discovery.bag_list), 2 * 3 * 4 * 2)
+                self.assertEqual(discovery.bag_list, [fn for fn in bag_list_ref if 'EVAL_' in fn])
+                self.assertEqual(sorted(os.path.basename(fn) for fn in discovery.malformed_list),
+                                 ['ATTR_x', 'EST_1.bag', 'RUN_'])
+                for bag_fn, key in zip(discovery.bag_list, discovery.key_list):
+                    self.assertEqual(os.path.basename(bag_fn), 'EVAL_ATTR_{0}_LVL_{1}_RUN_{2}_EST_{3}.bag'.format(*key))
+
+            # the skipped names are reported
+            with contextlib.redirect_stdout(io.StringIO()) as stdout:
+                BagDiscovery(tmp_dir)
+            self.assertIn('3 skipped', stdout.getvalue())
+            for fn in discovery.malformed_list:
+                self.assertIn('WARNING skipped (malformed name or non-numeric ID): ' + fn + '\n', stdout.getvalue())
+
+    def test_discover_speed(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            BagDiscovery_Test.create_tree(tmp_dir, 2, 10, 100, 4)
+            t_start = time.time()
+            discovery = BagDiscovery(tmp_dir)
+            t_discover = time.time() - t_start
+            print("BagDiscovery of " + str(len(discovery.bag_list)) + " bags took: " + str(t_discover) + " [sec]")
+            self.assertEqual(len(discovery.bag_list), 2 * 10 * 100 * 4)
+            self.assertLess(t_discover, 5.0)
+
+
+if __name__ == "__main__":
+    unittest.main()
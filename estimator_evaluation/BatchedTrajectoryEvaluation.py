@@ -0,0 +1,414 @@
+#!/usr/bin/env python
+# Copyright (C) 2021, Roland Jung, Control of Networked Systems, University of Klagenfurt, Austria.
+#
+# All rights reserved.
+#
+# This software is licensed under the terms of the BSD-2-Clause-License with
+# no commercial use allowed, the full terms of which are made available in the
+# LICENSE file. No license in patents is granted.
+#
+# You can contact the author at <roland.jung@aau.at>
+#
+# Requirements:
+# numpy, cnspy_timestamp_association, cnspy_trajectory_evaluation
+########################################################################################################################
+import os
+import numpy as numpy
+
+from cnspy_timestamp_association.TimestampAssociation import TimestampAssociation
+from cnspy_trajectory_evaluation.TrajectoryAlignmentTypes import TrajectoryAlignmentTypes
+from cnspy_trajectory_evaluation.SpatialAlignment import SpatialAlignement
+from cnspy_trajectory_evaluation.TrajectoryNEES import TrajectoryNEES
+from cnspy_trajectory_evaluation.EvaluationReport import EvaluationReport
+from estimator_evaluation.StageTimer import StageTimer
+from estimator_evaluation.ErrorSeriesStore import ErrorSeriesStore
+from estimator_evaluation.InMemoryTrajectoryEvaluation import InMemoryTrajectoryEvaluation
+
+
+class BatchedTrajectoryEvaluation:
+    """
+    Evaluates N estimated trajectories of a RUN against their common ground truth at once: the same steps as
+    InMemoryTrajectoryEvaluation (association, alignment, ATE, NEES), but on the matched samples of all estimates
+    stacked into one array [sum of the matched samples x ...] with the estimate as segment. The timestamps of all
+    estimates are associated by one search, the Umeyama alignments are solved by one stacked SVD [N x 3 x 3] and the
+    orientation errors, their roll-pitch-yaw angles, the rotation vectors and the NEES are computed by array
+    operations on rotation matrices instead of per sample quaternion objects.
+
+    The reports hold the values of the per estimate evaluation (cnspy_trajectory_evaluation.TrajectoryEvaluation) up to
+    rounding (about 1e-12 relative), thus EstimatorEvaluation uses it only if `batched` is requested; the tests compare
+    it with TrajectoryEvaluation to see when the library changes. Estimates without associated samples are not
+    evaluated (their report is None). Only the report.ini (and error_series.npy) is written to the result
+    directories, by the `writer` (see ResultWriter) if given.
+    """
+    report_list = None  # EvaluationReport per estimate or None
+    error_series_list = None  # numpy array float32 [metric x step] per estimate or None, see ErrorSeriesStore
+
+    # columns of CSVFormatPose.PoseWithCov
+    idx_t = 0
+    idx_p = slice(1, 4)
+    idx_q = slice(4, 8)  # qx, qy, qz, qw
+    idx_Sigma_p = slice(8, 14)  # pxx, pxy, pxz, pyy, pyz, pzz
+    idx_Sigma_q = slice(14, 20)  # qrr, qrp, qry, qpp, qpy, qyy
+
+    def __init__(self, arr_gt, arr_est_list, result_dir_list=None, alignment_type=TrajectoryAlignmentTypes.se3,
+                 num_aligned_samples=-1, fn_gt='', fn_est_list=None, timer=None, num_series_samples=0, writer=None,
+                 bag=''):
+        if timer is None:
+            timer = StageTimer()
+        write = writer.submit if writer is not None else InMemoryTrajectoryEvaluation.write
+        num_est = len(arr_est_list)
+        if fn_est_list is None:
+            fn_est_list = [''] * num_est
+        self.report_list = [None] * num_est
+        self.error_series_list = [None] * num_est
+        arr_gt = numpy.asarray(arr_gt, dtype=float)
+        arr_est_list = [numpy.asarray(arr_est, dtype=float) for arr_est in arr_est_list]
+
+        with timer.stage('association', bag=bag):
+            idx_est_list, idx_gt_list = BatchedTrajectoryEvaluation.associate(
+                arr_gt[:, BatchedTrajectoryEvaluation.idx_t],
+                [arr_est[:, BatchedTrajectoryEvaluation.idx_t] for arr_est in arr_est_list])
+            est_list = [i for i in range(num_est) if len(idx_est_list[i]) > 0]
+            if not est_list:
+                return
+            lengths = numpy.array([len(idx_est_list[i]) for i in est_list])
+            est = numpy.concatenate([arr_est_list[i][idx_est_list[i]] for i in est_list])
+            gt = arr_gt[numpy.concatenate([idx_gt_list[i] for i in est_list])]
+
+        with timer.stage('alignment', bag=bag):
+            p_est = est[:, BatchedTrajectoryEvaluation.idx_p]
+            p_gt = gt[:, BatchedTrajectoryEvaluation.idx_p]
+            s, R, t = BatchedTrajectoryEvaluation.align(p_est, p_gt, est[:, BatchedTrajectoryEvaluation.idx_q],
+                                                        gt[:, BatchedTrajectoryEvaluation.idx_q], lengths,
+                                                        alignment_type, num_aligned_samples)
+            seg = numpy.repeat(numpy.arange(len(lengths)), lengths)
+            p_est_aligned = numpy.einsum('nij,nj->ni', R[seg], s[seg, None] * p_est) + t[seg]
+            R_est_aligned = R[seg] @ BatchedTrajectoryEvaluation.quat_to_rot(est[:, BatchedTrajectoryEvaluation.idx_q])
+
+        with timer.stage('ate', bag=bag):
+            err_p = p_est_aligned - p_gt
+            rmse_p = numpy.sqrt(numpy.sum(err_p ** 2, axis=1))
+            # local perturbation: R_err = R_gt' * R_est
+            R_err = numpy.swapaxes(BatchedTrajectoryEvaluation.quat_to_rot(gt[:, BatchedTrajectoryEvaluation.idx_q]),
+                                   1, 2) @ R_est_aligned
+            rmse_q_deg = numpy.rad2deg(numpy.linalg.norm(BatchedTrajectoryEvaluation.rot_to_rpy(R_err), axis=1))
+
+        with timer.stage('nees', bag=bag):
+            nees_p = BatchedTrajectoryEvaluation.compute_nees(
+                BatchedTrajectoryEvaluation.tri_to_mat(est[:, BatchedTrajectoryEvaluation.idx_Sigma_p]), err_p)
+            nees_q = BatchedTrajectoryEvaluation.compute_nees(
+                BatchedTrajectoryEvaluation.tri_to_mat(est[:, BatchedTrajectoryEvaluation.idx_Sigma_q]),
+                BatchedTrajectoryEvaluation.rot_to_theta(R_err))
+
+        starts = numpy.concatenate(([0], numpy.cumsum(lengths)[:-1]))
+        metrics = numpy.stack([numpy.add.reduceat(v, starts) for v in [rmse_p, rmse_q_deg, nees_p, nees_q]],
+                              axis=1) / lengths[:, None]
+        for k, i in enumerate(est_list):
+            result_dir = result_dir_list[i] if result_dir_list is not None else None
+            report = EvaluationReport(directory=os.path.abspath(result_dir) if result_dir else '', fn_gt=fn_gt,
+                                      fn_est=fn_est_list[i], alignment=str(alignment_type),
+                                      num_aligned_samples=num_aligned_samples)
+            report.ARMSE_p, report.ARMSE_q, report.ANEES_p, report.ANEES_q = metrics[k]
+            self.report_list[i] = report
+
+            segment = slice(starts[k], starts[k] + lengths[k])
+            if num_series_samples > 0:
+                with timer.stage('series', bag=bag):
+                    self.error_series_list[i] = ErrorSeriesStore.resample(
+                        est[segment, BatchedTrajectoryEvaluation.idx_t],
+                        [rmse_p[segment], rmse_q_deg[segment], nees_p[segment], nees_q[segment]], num_series_samples)
+            if result_dir:
+                if not os.path.exists(result_dir):
+                    os.makedirs(os.path.abspath(result_dir))
+                if self.error_series_list[i] is not None:
+                    # before the report.ini: a check point always has its series
+                    write(ErrorSeriesStore.save_series, ErrorSeriesStore.get_series_fn(result_dir),
+                          self.error_series_list[i])
+                write(InMemoryTrajectoryEvaluation.save_report, report, os.path.join(result_dir, 'report.ini'))
+
+    @staticmethod
+    def associate(t_gt, t_est_list, max_difference=0.02):
+        """
+        TimestampAssociation.associate_timestamps() of many estimates against the same ground truth: the estimates
+        that are not longer than the ground truth (the usual case) are associated by a single search.
+
+        Output:
+        idx_est_list -- list of index arrays into the estimates
+        idx_gt_list -- list of index arrays into the ground truth
+        """
+        t_gt = numpy.asarray(t_gt, dtype=float).ravel()
+        idx_est_list = [None] * len(t_est_list)
+        idx_gt_list = [None] * len(t_est_list)
+        batch_list = []
+        for i, t_est in enumerate(t_est_list):
+            t_est = numpy.asarray(t_est, dtype=float).ravel()
+            if len(t_est) > len(t_gt):
+                idx_est_list[i], idx_gt_list[i], _, _ = TimestampAssociation.associate_timestamps(
+                    t_est[:, None], t_gt[:, None], max_difference=max_difference)
+            else:
+                batch_list.append(i)
+        if not batch_list:
+            return idx_est_list, idx_gt_list
+
+        t_est = numpy.concatenate([numpy.asarray(t_est_list[i], dtype=float).ravel() for i in batch_list])
+        # closest ground truth sample of each estimate sample (see TimestampAssociation.get_closest())
+        idx = numpy.searchsorted(t_gt, t_est, side='left')
+        prev_is_closer = (idx == len(t_gt)) | (numpy.fabs(t_est - t_gt[numpy.maximum(idx - 1, 0)]) <
+                                               numpy.fabs(t_est - t_gt[numpy.minimum(idx, len(t_gt) - 1)]))
+        idx[prev_is_closer] -= 1
+        matched = numpy.abs(t_gt[idx] - t_est) < max_difference
+        start = 0
+        for i in batch_list:
+            n = len(t_est_list[i])
+            mask = matched[start:start + n]
+            idx_est_list[i] = numpy.nonzero(mask)[0].astype(numpy.int32)
+            idx_gt_list[i] = idx[start:start + n][mask]
+            start += n
+        return idx_est_list, idx_gt_list
+
+    @staticmethod
+    def align(p_est, p_gt, q_est, q_gt, lengths, alignment_type=TrajectoryAlignmentTypes.se3, num_aligned_samples=-1):
+        """
+        TrajectoryAlignmentTypes.trajectory_aligment() of the stacked, matched trajectories: s, R, t per segment so
+        that gt = R * s * est + t
+
+        Input:
+        p_est, p_gt -- numpy arrays [M x 3], q_est, q_gt -- numpy arrays [M x 4] (qx, qy, qz, qw)
+        lengths -- numpy array [N] of the segment lengths, sum = M
+
+        Output:
+        s -- numpy array [N], R -- numpy array [N x 3 x 3], t -- numpy array [N x 3]
+        """
+        method = TrajectoryAlignmentTypes(str(alignment_type))
+        num_seg = len(lengths)
+        s = numpy.ones(num_seg)
+        R = numpy.tile(numpy.identity(3), (num_seg, 1, 1))
+        t = numpy.zeros((num_seg, 3))
+        starts = numpy.concatenate(([0], numpy.cumsum(lengths)[:-1]))
+        if method == TrajectoryAlignmentTypes.none:
+            return s, R, t
+        if method == TrajectoryAlignmentTypes.sim3:
+            assert num_aligned_samples >= 2 or num_aligned_samples == -1, "sim3 uses at least 2 frames"
+
+        if num_aligned_samples == 1 and method != TrajectoryAlignmentTypes.sim3:
+            # aligned by the first pose: a few operations per estimate
+            for k, i in enumerate(starts):
+                if method == TrajectoryAlignmentTypes.posyaw:
+                    R_k, t[k] = SpatialAlignement.align_position_yaw_single(p_est[i:i + 1], p_gt[i:i + 1],
+                                                                            q_est[i:i + 1], q_gt[i:i + 1])
+                    # a spatialmath SO3 (which TrajectoryAlignmentTypes passes on to Trajectory.transform())
+                    R[k] = numpy.asarray(getattr(R_k, 'A', R_k))
+                else:
+                    R[k], t[k] = SpatialAlignement.align_SE3_single(p_est[i:i + 1], p_gt[i:i + 1], q_est[i:i + 1],
+                                                                    q_gt[i:i + 1])
+        else:
+            # the first `num_aligned_samples` of each segment (see SpatialAlignement.get_indices())
+            num_aligned = lengths if num_aligned_samples == -1 else numpy.minimum(lengths, max(num_aligned_samples, 1))
+            seg = numpy.repeat(numpy.arange(num_seg), lengths)
+            mask = numpy.arange(len(seg)) - starts[seg] < num_aligned[seg]
+            s_umeyama, R, t = BatchedTrajectoryEvaluation.align_Umeyama(
+                p_gt[mask], p_est[mask], num_aligned, known_scale=(method != TrajectoryAlignmentTypes.sim3),
+                yaw_only=(method == TrajectoryAlignmentTypes.posyaw))
+            if method == TrajectoryAlignmentTypes.sim3:
+                s = s_umeyama
+
+        if method == TrajectoryAlignmentTypes.pos:
+            # the translation of the SE3 alignment without its rotation
+            R = numpy.tile(numpy.identity(3), (num_seg, 1, 1))
+        return s, R, t
+
+    @staticmethod
+    def align_Umeyama(gt_pos_arr, est_pos_arr, lengths, known_scale=False, yaw_only=False):
+        """
+        SpatialAlignement.align_Umeyama() of the segments of stacked position arrays [M x 3] with a stacked SVD:
+        gt_pos_arr = s * R * est_pos_arr + t
+
+        Output:
+        s -- numpy array [N], R -- numpy array [N x 3 x 3], t -- numpy array [N x 3]
+        """
+        lengths = numpy.asarray(lengths)
+        starts = numpy.concatenate(([0], numpy.cumsum(lengths)[:-1]))
+        seg = numpy.repeat(numpy.arange(len(lengths)), lengths)
+        mu_M = numpy.add.reduceat(gt_pos_arr, starts, axis=0) / lengths[:, None]
+        mu_D = numpy.add.reduceat(est_pos_arr, starts, axis=0) / lengths[:, None]
+        model_zerocentered = gt_pos_arr - mu_M[seg]
+        data_zerocentered = est_pos_arr - mu_D[seg]
+
+        # correlation
+        C = numpy.add.reduceat(model_zerocentered[:, :, None] * data_zerocentered[:, None, :], starts, axis=0) / \
+            lengths[:, None, None]
+        Sigma2 = numpy.add.reduceat(numpy.sum(data_zerocentered ** 2, axis=1), starts) / lengths
+        U_svd, D_svd, Vh_svd = numpy.linalg.svd(C)
+        S = numpy.tile(numpy.identity(3), (len(lengths), 1, 1))
+        S[numpy.linalg.det(U_svd) * numpy.linalg.det(Vh_svd) < 0, 2, 2] = -1
+
+        if yaw_only:
+            # SpatialAlignement.get_best_yaw() of data' * model = C'
+            theta = numpy.pi / 2 - numpy.arctan2(C[:, 0, 0] + C[:, 1, 1], C[:, 1, 0] - C[:, 0, 1])
+            R = numpy.zeros((len(lengths), 3, 3))
+            R[:, 0, 0] = numpy.cos(theta)
+            R[:, 0, 1] = -numpy.sin(theta)
+            R[:, 1, 0] = numpy.sin(theta)
+            R[:, 1, 1] = numpy.cos(theta)
+            R[:, 2, 2] = 1.0
+        else:
+            R = U_svd @ S @ Vh_svd
+
+        if known_scale:
+            s = numpy.ones(len(lengths))
+        else:
+            s = numpy.einsum('ni,nii->n', D_svd, S) / Sigma2
+        t = mu_M - s[:, None] * numpy.einsum('nij,nj->ni', R, mu_D)
+        return s, R, t
+
+    @staticmethod
+    def quat_to_rot(q_arr):
+        # rotation matrices [M x 3 x 3] of the normalized quaternions [M x 4] (qx, qy, qz, qw)
+        q_arr = q_arr / numpy.linalg.norm(q_arr, axis=1)[:, None]
+        x, y, z, w = q_arr[:, 0], q_arr[:, 1], q_arr[:, 2], q_arr[:, 3]
+        return numpy.stack([1 - 2 * (y ** 2 + z ** 2), 2 * (x * y - w * z), 2 * (x * z + w * y),
+                            2 * (x * y + w * z), 1 - 2 * (x ** 2 + z ** 2), 2 * (y * z - w * x),
+                            2 * (x * z - w * y), 2 * (y * z + w * x), 1 - 2 * (x ** 2 + y ** 2)],
+                           axis=1).reshape(-1, 3, 3)
+
+    @staticmethod
+    def rot_to_rpy(R, tol=20):
+        # spatialmath.base.tr2rpy(R, order='xyz') of rotation matrices [M x 3 x 3]
+        rpy = numpy.zeros((len(R), 3))
+        with numpy.errstate(divide='ignore', invalid='ignore'):
+            rpy[:, 0] = -numpy.arctan2(R[:, 0, 1], R[:, 0, 0])
+            rpy[:, 2] = -numpy.arctan2(R[:, 1, 2], R[:, 2, 2])
+            k = numpy.argmax(numpy.abs(numpy.stack([R[:, 0, 0], R[:, 0, 1], R[:, 1, 2], R[:, 2, 2]], axis=1)), axis=1)
+            rpy[:, 1] = numpy.choose(k, [numpy.arctan(R[:, 0, 2] * numpy.cos(rpy[:, 0]) / R[:, 0, 0]),
+                                         -numpy.arctan(R[:, 0, 2] * numpy.sin(rpy[:, 0]) / R[:, 0, 1]),
+                                         -numpy.arctan(R[:, 0, 2] * numpy.sin(rpy[:, 2]) / R[:, 1, 2]),
+                                         numpy.arctan(R[:, 0, 2] * numpy.cos(rpy[:, 2]) / R[:, 2, 2])])
+        # singularity |R13| == 1: roll is zero
+        singular = numpy.abs(numpy.abs(R[:, 0, 2]) - 1) < tol * numpy.finfo(float).eps
+        if numpy.any(singular):
+            R_s = R[singular]
+            rpy[singular, 0] = 0
+            rpy[singular, 2] = numpy.where(R_s[:, 0, 2] > 0, numpy.arctan2(R_s[:, 2, 1], R_s[:, 1, 1]),
+                                           -numpy.arctan2(R_s[:, 1, 0], R_s[:, 2, 0]))
+            rpy[singular, 1] = numpy.arcsin(numpy.clip(R_s[:, 0, 2], -1.0, 1.0))
+        return rpy
+
+    @staticmethod
+    def rot_to_theta(R, tol=20):
+        # rotation vectors [M x 3] of rotation matrices (spatialmath.base.trlog(R, twist=True), see TrajectoryNEES)
+        tr = numpy.trace(R, axis1=1, axis2=2)
+        theta = numpy.arccos(numpy.clip((tr - 1) / 2, -1.0, 1.0))
+        st = numpy.sin(theta)
+        w = numpy.stack([R[:, 2, 1] - R[:, 1, 2], R[:, 0, 2] - R[:, 2, 0], R[:, 1, 0] - R[:, 0, 1]], axis=1)
+        with numpy.errstate(divide='ignore', invalid='ignore'):
+            w = numpy.where((st == 0)[:, None], 0.0, w * (theta / (2 * st))[:, None])
+        # rotation by +/- pi
+        half_turn = numpy.abs(tr + 1) < tol * numpy.finfo(float).eps
+        for i in numpy.nonzero(half_turn)[0]:
+            k = R[i].diagonal().argmax()
+            w[i] = (R[i][:, k] + numpy.identity(3)[:, k]) / numpy.sqrt(2 * (1 + R[i, k, k])) * numpy.pi
+        return w
+
+    @staticmethod
+    def tri_to_mat(tri_arr):
+        # symmetric matrices [M x 3 x 3] of the upper triangles [M x 6] (xx, xy, xz, yy, yz, zz)
+        P = numpy.empty((len(tri_arr), 3, 3))
+        for k, (i, j) in enumerate(zip(*numpy.triu_indices(3))):
+            P[:, i, j] = tri_arr[:, k]
+            P[:, j, i] = tri_arr[:, k]
+        return P
+
+    @staticmethod
+    def compute_nees(P, err):
+        """
+        TrajectoryNEES.toNEES() of stacked covariances [M x 3 x 3] and errors [M x 3]: err' * inv(P) * err, zero if
+        the covariance is zero or has negative eigenvalues.
+
+        Output:
+        nees -- numpy array [M]
+        """
+        nees = numpy.zeros(len(P))
+        try:
+            valid = (numpy.trace(P, axis1=1, axis2=2) >= 1e-16) & ~numpy.any(numpy.linalg.eigvals(P) < 0, axis=1)
+            P_inv = numpy.linalg.inv(P[valid])
+        except numpy.linalg.LinAlgError:
+            # e.g. a singular covariance: evaluated one by one, like TrajectoryNEES
+            return TrajectoryNEES.toNEES_arr(False, P, err).ravel()
+        nees[valid] = numpy.einsum('ni,nij,nj->n', err[valid], P_inv, err[valid])
+        return nees
+
+
+########################################################################################################################
+#################################################### T E S T ###########################################################
+########################################################################################################################
+import unittest
+import tempfile
+
+
+class BatchedTrajectoryEvaluation_Test(unittest.TestCase):
+    @staticmethod
+    def create_run(num_est, num_gt=400):
+        # ground truth and estimates of a RUN (see InMemoryTrajectoryEvaluation_Test.create_trajectories())
+        from estimator_evaluation.InMemoryTrajectoryEvaluation import InMemoryTrajectoryEvaluation_Test
+        arr_est_list = []
+        for i in range(num_est):
+            arr_gt, arr_est = InMemoryTrajectoryEvaluation_Test.create_trajectories(num_gt=num_gt, seed_est=i + 1)
+            # estimates of different lengths, rotated and offset: the alignments differ
+            arr_est = arr_est[i:len(arr_est) - 2 * i]
+            c, s = numpy.cos(0.1 * i), numpy.sin(0.1 * i)
+            arr_est[:, 1:4] = arr_est[:, 1:4] @ numpy.array([[c, -s, 0], [s, c, 0], [0, 0, 1]]).T + 0.2 * i
+            arr_est_list.append(arr_est)
+        return arr_gt, arr_est_list
+
+    def test_compare_with_InMemoryTrajectoryEvaluation(self):
+        arr_gt, arr_est_list = BatchedTrajectoryEvaluation_Test.create_run(5)
+        # a singular and an empty covariance, an estimate without associated samples
+        arr_est_list[1][3, [8, 11, 13]] = [0.01, 0.01, 0.0]
+        arr_est_list[2][4, 8:20] = 0.0
+        arr_est_list.append(arr_est_list[0][:10].copy())
+        arr_est_list[-1][:, 0] += 1000.0
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            for alignment_type in ['se3', 'sim3', 'pos', 'posyaw', 'none']:
+                # sim3 uses at least 2 samples, posyaw with 1 sample fails in Trajectory.transform()
+                for num_aligned_samples in ([-1, 1, 20] if alignment_type not in ['sim3', 'posyaw'] else [-1, 20]):
+                    e = BatchedTrajectoryEvaluation(arr_gt, arr_est_list, alignment_type=alignment_type,
+                                                    num_aligned_samples=num_aligned_samples, num_series_samples=50)
+                    self.assertIsNone(e.report_list[-1])
+                    for i, arr_est in enumerate(arr_est_list[:-1]):
+                        e_ref = InMemoryTrajectoryEvaluation(arr_gt, arr_est, result_dir=tmp_dir,
+                                                             alignment_type=alignment_type,
+                                                             num_aligned_samples=num_aligned_samples,
+                                                             num_series_samples=50)
+                        for name in ['ARMSE_p', 'ARMSE_q', 'ANEES_p', 'ANEES_q']:
+                            self.assertAlmostEqual(getattr(e.report_list[i], name) / getattr(e_ref.report, name), 1.0,
+                                                   places=9, msg=alignment_type + ' ' + name)
+                        self.assertTrue(numpy.allclose(e.error_series_list[i], e_ref.error_series, rtol=1e-6))
+
+            e = BatchedTrajectoryEvaluation(arr_gt, arr_est_list[:2], result_dir_list=[os.path.join(tmp_dir, 'A'),
+                                                                                        os.path.join(tmp_dir, 'B')])
+            report = EvaluationReport()
+            report.load(os.path.join(tmp_dir, 'B', 'report.ini'))
+            self.assertAlmostEqual(float(report.ARMSE_p), e.report_list[1].ARMSE_p)
+
+    def test_compare_with_TrajectoryEvaluation(self):
+        # the CSV based evaluation of the library, on the files written by InMemoryTrajectoryEvaluation
+        from cnspy_trajectory_evaluation.TrajectoryEvaluation import TrajectoryEvaluation
+        arr_gt, arr_est_list = BatchedTrajectoryEvaluation_Test.create_run(3)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            for alignment_type in ['se3', 'sim3', 'posyaw']:
+                e = BatchedTrajectoryEvaluation(arr_gt, arr_est_list, alignment_type=alignment_type)
+                for i, arr_est in enumerate(arr_est_list):
+                    csv_dir = os.path.join(tmp_dir, alignment_type, str(i))
+                    InMemoryTrajectoryEvaluation(arr_gt, arr_est, result_dir=csv_dir, alignment_type=alignment_type,
+                                                 keep_csv=True)
+                    e_ref = TrajectoryEvaluation(fn_gt=os.path.join(csv_dir, 'pose-gt.csv'),
+                                                 fn_est=os.path.join(csv_dir, 'pose-est-cov.csv'),
+                                                 result_dir=os.path.join(csv_dir, 'ref'),
+                                                 alignment_type=alignment_type)
+                    for name in ['ARMSE_p', 'ARMSE_q', 'ANEES_p', 'ANEES_q']:
+                        self.assertAlmostEqual(getattr(e.report_list[i], name) / getattr(e_ref.report, name), 1.0,
+                                               places=9, msg=alignment_type + ' ' + name)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,375 @@
+#!/usr/bin/env python
+# Copyright (C) 2021, Roland Jung, Control of Networked Systems, University of Klagenfurt, Austria.
+#
+# All rights reserved.
+#
+# This software is licensed under the terms of the BSD-2-Clause-License with
+# no commercial use allowed, the full terms of which are made available in the
+# LICENSE file. No license in patents is granted.
+#
+# You can contact the author at <roland.jung@aau.at>
+#
+# Requirements:
+# numpy, pandas, argparse, cnspy_trajectory_evaluation
+########################################################################################################################
+import os
+import io
+import sys
+import json
+import time
+import argparse
+import tempfile
+import platform
+import subprocess
+import contextlib
+import numpy as numpy
+import pandas as pandas
+
+from cnspy_trajectory_evaluation.EvaluationReport import EvaluationReport
+from cnspy_trajectory_evaluation.TrajectoryAlignmentTypes import TrajectoryAlignmentTypes
+from estimator_evaluation.BagDiscovery import BagDiscovery
+from estimator_evaluation.BagDiscovery import BagDiscovery_Test
+from estimator_evaluation.EstimatorEvaluation import EstimatorEvaluation
+from estimator_evaluation.EstimatorReport import EstimatorReport
+from estimator_evaluation.EvaluationAnalyzer import EvaluationAnalyzer
+from estimator_evaluation.InMemoryTrajectoryEvaluation import InMemoryTrajectoryEvaluation
+from estimator_evaluation.InMemoryTrajectoryEvaluation import InMemoryTrajectoryEvaluation_Test
+from estimator_evaluation.BatchedTrajectoryEvaluation import BatchedTrajectoryEvaluation
+from estimator_evaluation.StageTimer import StageTimer
+from estimator_evaluation.StreamingAnalyzer import StreamingAnalyzer
+from estimator_evaluation.ThresholdSweep import ThresholdSweep
+
+
+class Benchmark:
+    """
+    Times the stages of the evaluation pipeline on synthetic data, without ROS:
+    - the cold start: a new python process importing EstimatorEvaluation and EvaluationAnalyzer
+    - a synthetic EVAL tree with empty bag files and report.ini check points: discovery and crawl_through()
+    - synthetic trajectories of `num_samples` poses: InMemoryTrajectoryEvaluation (association, alignment, ATE, NEES)
+      one by one and BatchedTrajectoryEvaluation of as many estimates of a RUN at once
+    - a synthetic eval report with `num_report_runs` runs: EstimatorReport append/save/load, EvaluationAnalyzer
+      statistics and averages
+    - a synthetic eval report of `num_load_rows` rows: appending its rows one by one (linear in the number of rows,
+      compare with 'report_append'), loading it from CSV and from the binary format (npz) and the
+      StreamingAnalyzer of its CSV
+    - synthetic statistics of `num_sweep_groups` (attr, lvl, est) groups: the failure rates of a 20 x 20 threshold grid
+      (ThresholdSweep)
+
+    The results are appended to a JSON lines file, tagged with the git revision, thus regressions between versions
+    can be seen by compare(). A `work_dir` keeps the synthetic EVAL tree: a later run with the same parameters reuses
+    it, a `work_dir` holding a tree of other parameters is refused (ValueError).
+    """
+    params = None
+    timer = None
+
+    def __init__(self, work_dir=None, num_attr=2, num_lvl=5, num_run=20, num_est=4, num_samples=2000,
+                 num_trajectories=4, num_report_runs=500, num_load_rows=1000000, num_sweep_groups=100000, seed=0):
+        self.params = {'num_attr': int(num_attr), 'num_lvl': int(num_lvl), 'num_run': int(num_run),
+                       'num_est': int(num_est), 'num_samples': int(num_samples),
+                       'num_trajectories': int(num_trajectories), 'num_report_runs': int(num_report_runs),
+                       'num_load_rows': int(num_load_rows), 'num_sweep_groups': int(num_sweep_groups),
+                       'seed': int(seed)}
+        self.timer = StageTimer()
+        if work_dir is None:
+            with tempfile.TemporaryDirectory() as tmp_dir:
+                self.run(tmp_dir)
+        else:
+            self.run(work_dir)
+
+    def run(self, work_dir):
+        p = self.params
+        eval_dir = os.path.join(work_dir, 'EVAL')
+        with self.timer.stage('cold_start'):
+            Benchmark.import_tools()
+        if not Benchmark.has_eval_tree(work_dir, p):
+            Benchmark.create_eval_tree(eval_dir, p['num_attr'], p['num_lvl'], p['num_run'], p['num_est'], p['seed'])
+            Benchmark.save_tree_params(work_dir, p)
+
+        # the crawler prints every bag, its output is not part of the measurement
+        with contextlib.redirect_stdout(io.StringIO()):
+            with self.timer.stage('discovery'):
+                BagDiscovery(eval_dir)
+            with self.timer.stage('crawl_checkpoints'):
+                EstimatorEvaluation(eval_dir=eval_dir, alignment_type_=TrajectoryAlignmentTypes.se3)
+
+            for i in range(p['num_trajectories']):
+                arr_gt, arr_est = InMemoryTrajectoryEvaluation_Test.create_trajectories(num_gt=p['num_samples'],
+                                                                                        seed=p['seed'] + i)
+                with self.timer.stage('trajectory_evaluation'):
+                    InMemoryTrajectoryEvaluation(arr_gt, arr_est, result_dir=os.path.join(work_dir, 'TRAJ'),
+                                                 alignment_type=TrajectoryAlignmentTypes.se3)
+
+            # the same number of estimates, evaluated at once against the ground truth of their RUN
+            arr_gt, arr_est_list = Benchmark.create_run(num_samples=p['num_samples'], num_est=p['num_trajectories'],
+                                                        seed=p['seed'])
+            with self.timer.stage('batched_evaluation'):
+                BatchedTrajectoryEvaluation(arr_gt, arr_est_list, alignment_type='se3')
+
+        df = Benchmark.create_report_data(p['num_attr'], p['num_lvl'], p['num_report_runs'], p['num_est'],
+                                          p['seed'])
+        report = EstimatorReport()
+        values = df.to_numpy()
+        with self.timer.stage('report_append'):
+            for row in values:
+                report.append_row(*row)
+
+        for fmt in ['csv', 'npz']:
+            fn = os.path.join(work_dir, 'eval.' + fmt)
+            with self.timer.stage('report_save_' + fmt):
+                report.save(fn)
+            with self.timer.stage('report_load_' + fmt):
+                EstimatorReport().load(fn)
+
+        # a report of many rows, e.g. 1e6: appending the rows and the loaders of the CSV and the binary format
+        values = Benchmark.create_report_data(1, 1, p['num_load_rows'], 1, p['seed']).to_numpy()
+        report = EstimatorReport()
+        with self.timer.stage('report_append_rows'):
+            for row in values:
+                report.append_row(*row)
+        for fmt in ['csv', 'npz']:
+            fn = os.path.join(work_dir, 'eval_rows.' + fmt)
+            report.save(fn)
+            with self.timer.stage('report_load_rows_' + fmt):
+                EstimatorReport().load(fn)
+        with contextlib.redirect_stdout(io.StringIO()):
+            with self.timer.stage('streaming_analyzer'):
+                StreamingAnalyzer(fn=os.path.join(work_dir, 'eval_rows.csv'), rmse_p_th=0.5, rmse_q_th=5)
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            analyzer = EvaluationAnalyzer(fn=os.path.join(work_dir, 'eval.npz'), rmse_p_th=0.5, rmse_q_th=5)
+            with self.timer.stage('analyzer_statistics'):
+                analyzer.compute_statistics()
+            with self.timer.stage('analyzer_average'):
+                analyzer.compute_average()
+
+        df_stats = Benchmark.create_stats_data(p['num_sweep_groups'], p['seed'])
+        th_p, th_q = ThresholdSweep.make_grid(numpy.linspace(0, 1, 20), numpy.linspace(0, 10, 20))
+        with self.timer.stage('threshold_sweep'):
+            ThresholdSweep.compute_failure_rates(df_stats, th_p, th_q)
+
+    def get_result(self):
+        stages = dict()
+        for stage, row in self.timer.summary().iterrows():
+            stages[stage] = {'count': int(row['count']), 'wall': float(row['wall']), 'cpu': float(row['cpu']),
+                             'max_rss': int(row['max_rss'])}
+        return {'time': time.strftime('%Y-%m-%dT%H:%M:%S'), 'revision': Benchmark.get_revision(),
+                'host': platform.node(), 'python': platform.python_version(), 'numpy': numpy.__version__,
+                'pandas': pandas.__version__, 'params': self.params, 'stages': stages}
+
+    def save(self, fn):
+        # appends the result as one line to a JSON lines file
+        head = os.path.dirname(os.path.abspath(fn))
+        if not os.path.exists(head):
+            os.makedirs(head)
+        with open(fn, 'a') as f:
+            f.write(json.dumps(self.get_result()) + '\n')
+
+    @staticmethod
+    def load(fn):
+        result_list = []
+        if os.path.exists(fn):
+            with open(fn, 'r') as f:
+                for line in f:
+                    if line.strip():
+                        result_list.append(json.loads(line))
+        return result_list
+
+    @staticmethod
+    def compare(result_list):
+        """
+        compares the wall times of the last result with the previous result of the same parameters.
+
+        Output:
+        df -- pandas.DataFrame: per stage the wall times [sec] and their ratio (last/previous), or None
+        """
+        if not result_list:
+            return None
+        last = result_list[-1]
+        prev_list = [r for r in result_list[:-1] if r['params'] == last['params']]
+        if not prev_list:
+            return None
+        prev = prev_list[-1]
+        rows = []
+        for stage, values in last['stages'].items():
+            wall_prev = prev['stages'].get(stage, {}).get('wall', numpy.nan)
+            rows.append([stage, wall_prev, values['wall'], values['wall'] / wall_prev if wall_prev else numpy.nan])
+        df = pandas.DataFrame(rows, columns=['stage', prev['revision'] or 'previous', last['revision'] or 'last',
+                                             'ratio'])
+        return df.set_index('stage')
+
+    @staticmethod
+    def get_revision():
+        # git revision of this module, '' if unknown
+        try:
+            res = subprocess.run(['git', 'describe', '--always', '--dirty'], cwd=os.path.dirname(os.path.abspath(
+                __file__)), stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, timeout=10)
+            return res.stdout.decode().strip()
+        except (OSError, subprocess.SubprocessError):
+            return ''
+
+    @staticmethod
+    def import_tools():
+        # by a new python process: the modules are loaded in this one already
+        env = dict(os.environ)
+        root_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        env['PYTHONPATH'] = os.pathsep.join([root_dir] + [p for p in [env.get('PYTHONPATH')] if p])
+        code = 'import estimator_evaluation.EstimatorEvaluation\nimport estimator_evaluation.EvaluationAnalyzer\n'
+        subprocess.run([sys.executable, '-c', code], env=env, check=True)
+
+    @staticmethod
+    def get_tree_params(params):
+        # the parameters defining the synthetic EVAL tree
+        return dict((key, params[key]) for key in ['num_attr', 'num_lvl', 'num_run', 'num_est', 'seed'])
+
+    @staticmethod
+    def has_eval_tree(work_dir, params):
+        # True, if `work_dir` holds the EVAL tree of `params`; raises a ValueError, if it holds other data
+        fn = os.path.join(work_dir, 'benchmark_tree.json')
+        if os.path.exists(fn):
+            with open(fn, 'r') as f:
+                tree_params = json.load(f)
+            if tree_params == Benchmark.get_tree_params(params):
+                return True
+            raise ValueError("Benchmark: " + str(work_dir) + " holds an EVAL tree of other parameters: " +
+                             str(tree_params) + "; use another --work_dir")
+        if os.path.exists(os.path.join(work_dir, 'EVAL')):
+            raise ValueError("Benchmark: " + str(work_dir) + " holds an EVAL folder not created by the benchmark; "
+                             "use another --work_dir")
+        return False
+
+    @staticmethod
+    def save_tree_params(work_dir, params):
+        # written after the tree is complete: an interrupted generation is not reused
+        fn = os.path.join(work_dir, 'benchmark_tree.json')
+        with open(fn + '.tmp', 'w') as f:
+            json.dump(Benchmark.get_tree_params(params), f)
+        os.replace(fn + '.tmp', fn)
+
+    @staticmethod
+    def create_eval_tree(eval_dir, num_attr, num_lvl, num_run, num_est, seed=0):
+        # the synthetic tree of the tests (see BagDiscovery_Test.create_tree()) with report.ini check points (with
+        # random metrics)
+        rng = numpy.random.default_rng(seed)
+        for bag_fn in BagDiscovery_Test.create_tree(eval_dir, num_attr, num_lvl, num_run, num_est):
+            result_dir = EstimatorEvaluation.get_result_dir(bag_fn)
+            os.makedirs(result_dir)
+            metrics = rng.random(4)
+            report = EvaluationReport(directory=result_dir, fn_gt=bag_fn, fn_est=bag_fn, alignment='se3',
+                                      num_aligned_samples=-1, RMSE_p=metrics[0], RMSE_q=metrics[1] * 5,
+                                      ANEES_p=metrics[2] * 10, ANEES_q=metrics[3] * 10)
+            report.save(os.path.join(result_dir, 'report.ini'))
+
+    @staticmethod
+    def create_run(num_samples, num_est, seed=0):
+        # a ground truth and `num_est` estimates of it with different noise, see
+        # InMemoryTrajectoryEvaluation_Test.create_trajectories()
+        arr_gt, arr_est = InMemoryTrajectoryEvaluation_Test.create_trajectories(num_gt=num_samples, seed=seed)
+        rng = numpy.random.default_rng(seed)
+        arr_est_list = []
+        for i in range(num_est):
+            arr = arr_est.copy()
+            arr[:, 1:4] += rng.normal(size=(len(arr), 3)) * 0.05
+            arr_est_list.append(arr)
+        return arr_gt, arr_est_list
+
+    @staticmethod
+    def create_stats_data(num_groups, seed=0):
+        # statistics of (attr, lvl, est) groups with random means, see ThresholdSweep
+        rng = numpy.random.default_rng(seed)
+        return pandas.DataFrame({'attr': rng.integers(1, 6, num_groups), 'lvl': rng.integers(1, 11, num_groups),
+                                 'est': rng.integers(1, 13, num_groups), 'armse_p.mean': rng.random(num_groups),
+                                 'armse_q.mean': rng.random(num_groups) * 10})
+
+    @staticmethod
+    def create_report_data(num_attr, num_lvl, num_run, num_est, seed=0):
+        # rows of an eval report: all combinations of attr, lvl, run, est with random metrics
+        rng = numpy.random.default_rng(seed)
+        attr, lvl, run, est = numpy.meshgrid(numpy.arange(1, num_attr + 1), numpy.arange(1, num_lvl + 1),
+                                             numpy.arange(1, num_run + 1), numpy.arange(1, num_est + 1),
+                                             indexing='ij')
+        num_rows = attr.size
+        data = {'attr': attr.ravel(), 'lvl': lvl.ravel(), 'run': run.ravel(), 'est': est.ravel(),
+                'armse_p': rng.random(num_rows), 'armse_q': rng.random(num_rows) * 5,
+                'anees_p': rng.random(num_rows) * 10, 'anees_q': rng.random(num_rows) * 10}
+        return pandas.DataFrame(data, columns=EstimatorReport.get_column_format())
+
+
+########################################################################################################################
+#################################################### T E S T ###########################################################
+########################################################################################################################
+import unittest
+from unittest import mock
+
+
+class Benchmark_Test(unittest.TestCase):
+    def test_run(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            fn = os.path.join(tmp_dir, 'benchmark.jsonl')
+            for i in range(2):
+                benchmark = Benchmark(num_attr=1, num_lvl=2, num_run=3, num_est=2, num_samples=200,
+                                      num_trajectories=1, num_report_runs=10, num_load_rows=100,
+                                      num_sweep_groups=100)
+                benchmark.save(fn)
+            result_list = Benchmark.load(fn)
+
+        self.assertEqual(len(result_list), 2)
+        stages = result_list[-1]['stages']
+        for stage in ['cold_start', 'discovery', 'crawl_checkpoints', 'trajectory_evaluation', 'batched_evaluation',
+                      'report_append', 'report_save_csv', 'report_load_csv', 'report_save_npz', 'report_load_npz',
+                      'report_append_rows', 'report_load_rows_csv', 'report_load_rows_npz', 'streaming_analyzer',
+                      'analyzer_statistics', 'analyzer_average', 'threshold_sweep']:
+            self.assertIn(stage, stages)
+        self.assertEqual(stages['trajectory_evaluation']['count'], 1)
+        df = Benchmark.compare(result_list)
+        self.assertEqual(len(df.index), len(stages))
+
+    def test_work_dir(self):
+        # the EVAL tree of a work_dir is reused by runs of the same parameters
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            params = dict(num_attr=1, num_lvl=1, num_run=2, num_est=2, num_samples=100, num_trajectories=1,
+                          num_report_runs=5, num_load_rows=100, num_sweep_groups=100)
+            Benchmark(work_dir=tmp_dir, **params)
+            with mock.patch.object(Benchmark, 'create_eval_tree') as create_eval_tree:
+                benchmark = Benchmark(work_dir=tmp_dir, **params)
+                create_eval_tree.assert_not_called()
+            self.assertIn('crawl_checkpoints', benchmark.get_result()['stages'])
+            with self.assertRaises(ValueError):
+                Benchmark(work_dir=tmp_dir, **dict(params, num_run=3))
+
+
+########################################################################################################################
+################################################### APPLICATION ########################################################
+########################################################################################################################
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description='Benchmark: times the evaluation pipeline on synthetic EVAL trees, trajectories and reports '
+                    '(no ROS needed) and appends the results to a JSON lines file')
+    parser.add_argument('--attr', type=int, help='# of attributes', default=2)
+    parser.add_argument('--lvl', type=int, help='# of levels per attribute', default=5)
+    parser.add_argument('--run', type=int, help='# of runs per level (EVAL tree)', default=20)
+    parser.add_argument('--est', type=int, help='# of estimators per run', default=4)
+    parser.add_argument('--samples', type=int, help='# of ground truth poses per trajectory', default=2000)
+    parser.add_argument('--trajectories', type=int, help='# of evaluated trajectories', default=4)
+    parser.add_argument('--report_runs', type=int, help='# of runs per level (eval report)', default=500)
+    parser.add_argument('--load_rows', type=int, help='# of rows of the report appended and loaded from CSV and npz',
+                        default=1000000)
+    parser.add_argument('--sweep_groups', type=int, help='# of (attr, lvl, est) groups of the threshold sweep',
+                        default=100000)
+    parser.add_argument('--seed', type=int, help='seed of the random data', default=0)
+    parser.add_argument('--work_dir', help='keeps the synthetic data in this folder (default: temporary folder)',
+                        default=None)
+    parser.add_argument('--result_fn', help='JSON lines file the result is appended to',
+                        default='benchmark_results.jsonl')
+    args = parser.parse_args()
+
+    benchmark = Benchmark(work_dir=args.work_dir, num_attr=args.attr, num_lvl=args.lvl, num_run=args.run,
+                          num_est=args.est, num_samples=args.samples, num_trajectories=args.trajectories,
+                          num_report_runs=args.report_runs, num_load_rows=args.load_rows,
+                          num_sweep_groups=args.sweep_groups, seed=args.seed)
+    benchmark.save(args.result_fn)
+    print(benchmark.timer.summary())
+
+    df_cmp = Benchmark.compare(Benchmark.load(args.result_fn))
+    if df_cmp is not None:
+        print("\ncompared with the previous result of the same parameters (ratio > 1: slower):")
+        print(df_cmp)
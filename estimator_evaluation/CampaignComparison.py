@@ -0,0 +1,236 @@
+#!/usr/bin/env python
+# Copyright (C) 2021, Roland Jung, Control of Networked Systems, University of Klagenfurt, Austria.
+#
+# All rights reserved.
+#
+# This software is licensed under the terms of the BSD-2-Clause-License with
+# no commercial use allowed, the full terms of which are made available in the
+# LICENSE file. No license in patents is granted.
+#
+# You can contact the author at <roland.jung@aau.at>
+#
+# Requirements:
+# numpy, pandas, argparse
+########################################################################################################################
+import os
+import time
+import argparse
+import numpy as numpy
+import pandas as pandas
+
+from estimator_evaluation.EstimatorReport import EstimatorReport
+from estimator_evaluation.EvaluationAnalyzer import EvaluationAnalyzer
+
+
+class CampaignComparison:
+    """
+    Compares the estimators across campaigns (e.g. one EVAL tree per software release) without re-evaluation: the
+    reports are merged (see EstimatorReport.merge()) and the statistics of all (campaign, attr, lvl, est) groups are
+    computed in one grouped pass. The outliers are removed per campaign, thus the statistics of a campaign equal the
+    ones of the EvaluationAnalyzer on its report alone. The deltas are the differences of the means and medians to the
+    same (attr, lvl, est) group of the baseline campaign.
+    """
+    df_merged = None  # merged reports: campaign, attr, lvl, run, est, armse_p, armse_q, anees_p, anees_q
+    df_stats = None  # statistics per (campaign, attr, lvl, est) group, in the order of the campaigns
+    campaign_list = None
+    baseline = None  # campaign key of the baseline
+
+    def __init__(self, fn_list, campaign_list=None, baseline=None, rmse_p_th=0, rmse_q_th=0, num_resamples=0,
+                 confidence=0.95, cache=False):
+        """
+        Input:
+        fn_list -- list of report file names (eval.csv or eval.npz), one per campaign
+        campaign_list -- list of campaign keys, see EstimatorReport.merge()
+        baseline -- campaign key the deltas are computed to, default: the first campaign
+        rmse_p_th, rmse_q_th -- thresholds for judging the estimators (see EvaluationAnalyzer.judge())
+        num_resamples, confidence -- bootstrap intervals of the means (see EvaluationAnalyzer)
+        cache -- write the binary equivalent of the CSV reports (see EstimatorReport.merge())
+        """
+        self.df_merged = EstimatorReport.merge(fn_list, campaign_list=campaign_list, cache=cache)
+        self.campaign_list = list(pandas.unique(self.df_merged['campaign'])) if campaign_list is None \
+            else [str(campaign) for campaign in campaign_list]
+        self.baseline = self.campaign_list[0] if baseline is None else str(baseline)
+        if self.baseline not in self.campaign_list:
+            raise ValueError("CampaignComparison: unknown baseline campaign: " + self.baseline)
+        self.df_stats = CampaignComparison.compute_statistics(self.df_merged, self.campaign_list, rmse_p_th,
+                                                              rmse_q_th, num_resamples=num_resamples,
+                                                              confidence=confidence)
+
+    @staticmethod
+    def get_group_keys():
+        return ['campaign'] + EvaluationAnalyzer.get_group_keys()
+
+    @staticmethod
+    def get_delta_statistics():
+        return ['mean', 'median']
+
+    @staticmethod
+    def compute_statistics(df_merged, campaign_list, rmse_p_th=0, rmse_q_th=0, num_resamples=0, confidence=0.95):
+        keys = CampaignComparison.get_group_keys()
+        # number of runs of the campaign of each row: defines the number of outliers per campaign
+        num_runs = df_merged.groupby('campaign', sort=False)['run'].transform('nunique').to_numpy()
+        df_stats = EvaluationAnalyzer.compute_group_statistics(df_merged, num_runs=num_runs, keys=keys,
+                                                              num_resamples=num_resamples, confidence=confidence)
+        EvaluationAnalyzer.judge(df_stats, rmse_p_th, rmse_q_th)
+
+        # the groups are sorted by the keys; the campaigns are reordered as given (stable, keeps attr, lvl, est)
+        campaign_pos = {campaign: i for i, campaign in enumerate(campaign_list)}
+        order = numpy.argsort(df_stats['campaign'].map(campaign_pos).to_numpy(), kind='stable')
+        df_stats = df_stats.iloc[order].reset_index(drop=True)
+        fmt = ['campaign'] + EvaluationAnalyzer.get_column_format(intervals=num_resamples > 0)
+        return df_stats[fmt]
+
+    def compute_deltas(self, baseline=None):
+        """
+        Output:
+        df_delta -- pandas.DataFrame: one row per (campaign, attr, lvl, est) group, columns: campaign, attr, lvl, est,
+                    for each metric and statistic (mean, median): <metric>.<stat>, <metric>.<stat>.delta (difference to
+                    the baseline), <metric>.<stat>.rel_delta (relative to the baseline), and failure,
+                    failure.baseline. Groups missing in the baseline have NaN deltas.
+        """
+        if baseline is None:
+            baseline = self.baseline
+        return CampaignComparison.compute_delta_frame(self.df_stats, str(baseline))
+
+    @staticmethod
+    def compute_delta_frame(df_stats, baseline):
+        keys = EvaluationAnalyzer.get_group_keys()
+        columns = [metric + '.' + stat for metric in EvaluationAnalyzer.get_metric_columns()
+                   for stat in CampaignComparison.get_delta_statistics()]
+        df_base = df_stats.loc[df_stats['campaign'] == baseline, keys + columns + ['failure']]
+        df_base = df_base.rename(columns={col: col + '.baseline' for col in columns + ['failure']})
+        # a left join keeps the order of the statistics
+        df = df_stats[['campaign'] + keys + columns + ['failure']].merge(df_base, on=keys, how='left')
+
+        dict_delta = {col: df[col] for col in ['campaign'] + keys}
+        with numpy.errstate(divide='ignore', invalid='ignore'):
+            for col in columns:
+                value = df[col].to_numpy(dtype=float)
+                value_base = df[col + '.baseline'].to_numpy(dtype=float)
+                dict_delta[col] = value
+                dict_delta[col + '.delta'] = value - value_base
+                dict_delta[col + '.rel_delta'] = (value - value_base) / numpy.abs(value_base)
+        dict_delta['failure'] = df['failure']
+        dict_delta['failure.baseline'] = df['failure.baseline']
+        return pandas.DataFrame(dict_delta)
+
+    @staticmethod
+    def pivot(df_delta, campaign_list, value='armse_p.mean.delta', keys=None):
+        # dashboard table: one row per key (mean over the other groups), one column per campaign (in the given order)
+        if keys is None:
+            keys = ['est']
+        table = df_delta.pivot_table(index=keys, columns='campaign', values=value, aggfunc='mean')
+        return table.reindex(columns=[campaign for campaign in campaign_list if campaign in table.columns])
+
+
+########################################################################################################################
+#################################################### T E S T ###########################################################
+########################################################################################################################
+import unittest
+import tempfile
+
+
+class CampaignComparison_Test(unittest.TestCase):
+    @staticmethod
+    def save_campaigns(tmp_dir):
+        # three releases: the sample report, a report with worse position errors and a report with fewer runs
+        report = EstimatorReport()
+        report.load("./sample_data/EVAL/eval.csv")
+        df = report.data_frame.copy()
+        df_worse = df.copy()
+        df_worse['armse_p'] = df_worse['armse_p'] * 2.0
+        df_fewer = df[df['run'] <= df['run'].min() + 1].reset_index(drop=True)
+        fn_list = []
+        for release, df_release in zip(['v1.10', 'v1.2', 'v1.9'], [df, df_worse, df_fewer]):
+            fn = os.path.join(tmp_dir, release, 'EVAL', 'eval.csv')
+            report_release = EstimatorReport()
+            report_release.data_frame = df_release
+            report_release.save(fn)
+            fn_list.append(fn)
+        return fn_list
+
+    def test_compare(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            fn_list = CampaignComparison_Test.save_campaigns(tmp_dir)
+            comparison = CampaignComparison(fn_list, campaign_list=['v1.10', 'v1.2', 'v1.9'], baseline='v1.10',
+                                            rmse_p_th=0.5, rmse_q_th=5)
+            self.assertEqual(list(pandas.unique(comparison.df_stats['campaign'])), ['v1.10', 'v1.2', 'v1.9'])
+
+            # the statistics of each campaign equal the ones of the EvaluationAnalyzer on its report alone
+            fmt = EvaluationAnalyzer.get_column_format()
+            for campaign, fn in zip(comparison.campaign_list, fn_list):
+                df_ref = EvaluationAnalyzer(fn=fn, rmse_p_th=0.5, rmse_q_th=5).data_frame_analyzer
+                df_res = comparison.df_stats[comparison.df_stats['campaign'] == campaign]
+                df_res = df_res[fmt].reset_index(drop=True)
+                self.assertEqual(len(df_res.index), len(df_ref.index))
+                for col in fmt[:-1]:
+                    self.assertTrue(numpy.allclose(df_res[col].values, df_ref[col].values, equal_nan=True), col)
+                self.assertEqual(list(df_res['failure']), list(df_ref['failure']))
+
+            df_delta = comparison.compute_deltas()
+            df_base = df_delta[df_delta['campaign'] == 'v1.10']
+            self.assertTrue((df_base['armse_p.mean.delta'].dropna() == 0.0).all())
+            df_worse = df_delta[df_delta['campaign'] == 'v1.2']
+            self.assertTrue(numpy.allclose(df_worse['armse_p.mean.rel_delta'].dropna(), 1.0))
+            self.assertTrue(numpy.allclose(df_worse['armse_q.mean.delta'].dropna(), 0.0))
+
+            table = CampaignComparison.pivot(df_delta, comparison.campaign_list)
+            self.assertEqual(list(table.columns), ['v1.10', 'v1.2', 'v1.9'])
+            self.assertEqual(len(table.index), len(df_delta['est'].unique()))
+
+    def test_default_campaigns(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            fn_list = CampaignComparison_Test.save_campaigns(tmp_dir)
+            comparison = CampaignComparison(fn_list, baseline='v1.2/EVAL', num_resamples=50)
+            self.assertEqual(comparison.campaign_list, ['v1.10/EVAL', 'v1.2/EVAL', 'v1.9/EVAL'])
+            self.assertIn('armse_p.ci_low', comparison.df_stats.columns)
+            with self.assertRaises(ValueError):
+                CampaignComparison(fn_list, baseline='v2.0')
+
+
+########################################################################################################################
+################################################### APPLICATION ########################################################
+########################################################################################################################
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description='CampaignComparison: merges the reports of many evaluations (e.g. one EVAL tree per release) and '
+                    'computes the statistics per campaign and the deltas to a baseline campaign without '
+                    're-evaluation')
+    parser.add_argument('--eval_dirs', nargs='+', help='root directories of the evaluations (holding eval.csv)',
+                        required=True)
+    parser.add_argument('--campaigns', nargs='+', help='campaign keys (one per eval_dir), default: the eval_dirs '
+                                                       'relative to their common directory', default=None)
+    parser.add_argument('--baseline', help='campaign the deltas are computed to (default: the first)', default=None)
+    parser.add_argument('--format', help='file format of the reports: csv (default) or npz', choices=['csv', 'npz'],
+                        default='csv')
+    parser.add_argument('--cache', action='store_true', help='write eval.npz next to each parsed eval.csv; it is '
+                                                              'read instead of the CSV as long as it is up to date')
+    parser.add_argument('--rmse_p_th', type=float, help='position armse threshold [m]', default=1.0)
+    parser.add_argument('--rmse_q_th', type=float, help='orientation armse threshold [deg]', default=10.0)
+    parser.add_argument('--bootstrap', type=int, help='number of bootstrap resamples for confidence intervals of the '
+                                                      'means, 0 = none', default=0)
+    parser.add_argument('--confidence', type=float, help='confidence level of the intervals', default=0.95)
+    parser.add_argument('--value', help='column shown in the dashboard table', default='armse_p.mean.delta')
+    parser.add_argument('--by', nargs='+', help='dashboard rows per: est (default), attr, lvl', default=['est'],
+                        choices=['attr', 'lvl', 'est'])
+    parser.add_argument('--result_dir', help='directory campaign_statistics.csv and campaign_deltas.csv are '
+                                             'written to', default='.')
+    args = parser.parse_args()
+
+    tp_start = time.time()
+    fn_list = [os.path.join(eval_dir, "eval." + args.format) for eval_dir in args.eval_dirs]
+    comparison = CampaignComparison(fn_list, campaign_list=args.campaigns, baseline=args.baseline,
+                                    rmse_p_th=args.rmse_p_th, rmse_q_th=args.rmse_q_th,
+                                    num_resamples=args.bootstrap, confidence=args.confidence, cache=args.cache)
+    df_delta = comparison.compute_deltas()
+
+    fn_stats = os.path.join(args.result_dir, "campaign_statistics.csv")
+    fn_delta = os.path.join(args.result_dir, "campaign_deltas.csv")
+    EstimatorReport.save_data_frame(comparison.df_stats, fn_stats, fmt=list(comparison.df_stats.columns))
+    EstimatorReport.save_data_frame(df_delta, fn_delta, fmt=list(df_delta.columns))
+
+    print(CampaignComparison.pivot(df_delta, comparison.campaign_list, value=args.value, keys=args.by))
+    print("\nCampaignComparison: " + str(len(comparison.campaign_list)) + " campaigns, " +
+          str(len(comparison.df_merged.index)) + " runs, baseline: " + comparison.baseline + ", saved: " + fn_stats +
+          ", " + fn_delta)
+    print("finished after [%s sec]\n" % str(time.time() - tp_start))
@@ -0,0 +1,214 @@
+#!/usr/bin/env python
+# Copyright (C) 2021, Roland Jung, Control of Networked Systems, University of Klagenfurt, Austria.
+#
+# All rights reserved.
+#
+# This software is licensed under the terms of the BSD-2-Clause-License with
+# no commercial use allowed, the full terms of which are made available in the
+# LICENSE file. No license in patents is granted.
+#
+# You can contact the author at <roland.jung@aau.at>
+#
+# Requirements:
+# numpy
+########################################################################################################################
+import os
+import numpy as numpy
+
+
+class ErrorSeriesStore:
+    """
+    Error time series of all runs in one memory-mapped array: the errors of a run (see get_metric_names()) over the
+    normalized time t_norm = (t - t_0) / (t_end - t_0) are resampled to `num_samples` equidistant steps in [0, 1]
+    and stored as float32 [run x metric x step] in a .npy file; the keys (attr, lvl, run, est) of the rows are stored
+    as int64 [run x 4] in <fn>_keys.npy. Since the steps are equidistant, the mean of a resampled series is close to
+    the scalar metric (ARMSE, ANEES) of its run.
+
+    Each evaluated bag writes its series next to its report.ini (see save_series()); build() collects them into the
+    store, which is opened read-only (numpy.load(mmap_mode='r')) and aggregated without touching the bag files or the
+    per-run files again (see EvaluationAnalyzer.compute_error_envelopes()).
+    """
+    fn = None
+    keys = None  # numpy array int64 [run x 4]: attr, lvl, run, est
+    series = None  # numpy memmap float32 [run x metric x step]
+
+    def __init__(self, fn):
+        self.fn = fn
+        self.keys = numpy.load(ErrorSeriesStore.get_keys_fn(fn))
+        self.series = numpy.load(fn, mmap_mode='r')
+
+    def __len__(self):
+        return len(self.keys)
+
+    @property
+    def num_samples(self):
+        return self.series.shape[2]
+
+    @staticmethod
+    def get_keys_fn(fn):
+        return os.path.splitext(fn)[0] + '_keys.npy'
+
+    @staticmethod
+    def get_series_fn(result_dir):
+        # the series of a run, next to its report.ini
+        return os.path.join(result_dir, 'error_series.npy')
+
+    @staticmethod
+    def get_metric_names():
+        # position error [m], orientation error [deg] (mean over roll, pitch, yaw), NEES of position and orientation
+        return ['err_p', 'err_q_deg', 'nees_p', 'nees_q']
+
+    @staticmethod
+    def get_time_grid(num_samples):
+        return numpy.linspace(0.0, 1.0, int(num_samples))
+
+    @staticmethod
+    def resample(t_vec, value_list, num_samples):
+        """
+        Input:
+        t_vec -- array [N] (or [N x 1]) of increasing time stamps
+        value_list -- list of arrays [N] (or [N x k], averaged over the k columns), one per metric
+        num_samples -- number of equidistant steps of the normalized time
+
+        Output:
+        series -- numpy array float32 [metric x step]
+        """
+        t_vec = numpy.asarray(t_vec, dtype=float).ravel()
+        duration = t_vec[-1] - t_vec[0] if len(t_vec) else 0.0
+        t_norm = (t_vec - t_vec[0]) / duration if duration > 0 else numpy.zeros(len(t_vec))
+        grid = ErrorSeriesStore.get_time_grid(num_samples)
+        series = numpy.full((len(value_list), len(grid)), numpy.nan, dtype=numpy.float32)
+        if len(t_vec) == 0:
+            return series
+        for i, values in enumerate(value_list):
+            values = numpy.asarray(values, dtype=float).reshape(len(t_vec), -1).mean(axis=1)
+            series[i] = numpy.interp(grid, t_norm, values)
+        return series
+
+    @staticmethod
+    def resample_series(series, num_samples):
+        # a series [metric x step] on another number of steps
+        series = numpy.asarray(series, dtype=numpy.float32)
+        if series.shape[1] == num_samples:
+            return series
+        grid_src = ErrorSeriesStore.get_time_grid(series.shape[1])
+        return ErrorSeriesStore.resample(grid_src, list(series), num_samples)
+
+    @staticmethod
+    def save_series(fn, series):
+        # written to a temporary file and renamed, like the report.ini
+        with open(fn + '.tmp', 'wb') as f:
+            numpy.save(f, numpy.asarray(series, dtype=numpy.float32))
+        os.replace(fn + '.tmp', fn)
+
+    @staticmethod
+    def load_series(fn):
+        # the series of a run or None, if the file does not exist or is invalid
+        try:
+            series = numpy.load(fn)
+        except (OSError, ValueError):
+            return None
+        if series.ndim != 2 or series.shape[0] != len(ErrorSeriesStore.get_metric_names()):
+            return None
+        return series
+
+    @staticmethod
+    def build(fn, key_list, series_fn_list, num_samples):
+        """
+        collects the series of the runs into the store `fn` (rows in the given order); runs without a (valid) series
+        file are skipped, series of another length are resampled.
+
+        Input:
+        key_list -- list of (attr, lvl, run, est)
+        series_fn_list -- list of the series files of the runs (see get_series_fn())
+        num_samples -- number of steps of the store
+
+        Output:
+        store -- ErrorSeriesStore (read-only, memory-mapped)
+        num_missing -- number of runs without series
+        """
+        head = os.path.dirname(os.path.abspath(fn))
+        if not os.path.exists(head):
+            os.makedirs(head)
+        num_metrics = len(ErrorSeriesStore.get_metric_names())
+        fn_tmp = fn + '.tmp'
+        # the rows are written one by one into the memory-mapped file, the store is never held in memory
+        arr = numpy.lib.format.open_memmap(fn_tmp, mode='w+', dtype=numpy.float32,
+                                           shape=(len(key_list), num_metrics, int(num_samples)))
+        keys = numpy.empty((len(key_list), 4), dtype=numpy.int64)
+        num_rows = 0
+        for key, series_fn in zip(key_list, series_fn_list):
+            series = ErrorSeriesStore.load_series(series_fn)
+            if series is None:
+                continue
+            arr[num_rows] = ErrorSeriesStore.resample_series(series, num_samples)
+            keys[num_rows] = [int(v) for v in key]
+            num_rows += 1
+        arr.flush()
+        del arr
+
+        if num_rows < len(key_list):
+            # shrink: the rows are copied through a memory map of the first num_rows
+            src = numpy.load(fn_tmp, mmap_mode='r')
+            dst = numpy.lib.format.open_memmap(fn_tmp + '.tmp', mode='w+', dtype=numpy.float32,
+                                               shape=(num_rows, num_metrics, int(num_samples)))
+            dst[:] = src[:num_rows]
+            dst.flush()
+            del src, dst
+            os.replace(fn_tmp + '.tmp', fn_tmp)
+        os.replace(fn_tmp, fn)
+        with open(ErrorSeriesStore.get_keys_fn(fn) + '.tmp', 'wb') as f:
+            numpy.save(f, keys[:num_rows])
+        os.replace(ErrorSeriesStore.get_keys_fn(fn) + '.tmp', ErrorSeriesStore.get_keys_fn(fn))
+        return ErrorSeriesStore(fn), len(key_list) - num_rows
+
+
+########################################################################################################################
+#################################################### T E S T ###########################################################
+########################################################################################################################
+import unittest
+import tempfile
+
+
+class ErrorSeriesStore_Test(unittest.TestCase):
+    def test_resample(self):
+        t_vec = numpy.linspace(10.0, 30.0, 201)
+        values = numpy.stack([t_vec, 2 * t_vec, 3 * t_vec], axis=1)
+        series = ErrorSeriesStore.resample(t_vec, [t_vec, values, numpy.ones(201), t_vec - 10.0], 11)
+        self.assertEqual(series.shape, (4, 11))
+        self.assertEqual(series.dtype, numpy.float32)
+        self.assertTrue(numpy.allclose(series[0], numpy.linspace(10.0, 30.0, 11)))
+        self.assertTrue(numpy.allclose(series[1], 2 * numpy.linspace(10.0, 30.0, 11)))
+        self.assertTrue(numpy.allclose(ErrorSeriesStore.resample_series(series, 21)[3], numpy.linspace(0, 20, 21)))
+
+    def test_build(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            rng = numpy.random.default_rng(0)
+            key_list = []
+            series_fn_list = []
+            series_list = []
+            for run in range(1, 6):
+                series = rng.random((4, 50)).astype(numpy.float32)
+                series_fn = ErrorSeriesStore.get_series_fn(os.path.join(tmp_dir, 'RUN_{0}'.format(run)))
+                if run != 3:
+                    os.makedirs(os.path.dirname(series_fn))
+                    ErrorSeriesStore.save_series(series_fn, series)
+                    series_list.append(series)
+                key_list.append((1, 1, run, 1))
+                series_fn_list.append(series_fn)
+
+            fn = os.path.join(tmp_dir, 'eval_series.npy')
+            store, num_missing = ErrorSeriesStore.build(fn, key_list, series_fn_list, 50)
+            self.assertEqual(num_missing, 1)
+            self.assertEqual(len(store), 4)
+            self.assertIsInstance(store.series, numpy.memmap)
+            self.assertEqual(store.keys[:, 2].tolist(), [1, 2, 4, 5])
+            self.assertTrue(numpy.array_equal(store.series, numpy.stack(series_list)))
+
+            store, num_missing = ErrorSeriesStore.build(fn, key_list, series_fn_list, 25)
+            self.assertEqual(store.num_samples, 25)
+            self.assertTrue(numpy.allclose(store.series[:, :, 0], numpy.stack(series_list)[:, :, 0]))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -10,22 +10,37 @@
 # You can contact the author at <roland.jung@aau.at>
 #
 # Requirements:
-# pandas, argparse, cnspy_spatial_csv_formats, cnspy_rosbag2csv, cnspy_script_utils, cnspy_trajectory_evaluation
+# pandas, argparse, rosbag, cnspy_spatial_csv_formats, cnspy_rosbag2csv, cnspy_script_utils, cnspy_trajectory_evaluation
 ########################################################################################################################
 import os
 import time
 import argparse
+import multiprocessing
+import heapq
+import marshal
+import cProfile
+import configparser
+import collections
+import concurrent.futures
+import numpy as numpy
+from queue import SimpleQueue
 
 from cnspy_spatial_csv_formats.CSVFormatPose import CSVFormatPose
-from cnspy_rosbag2csv.ROSbag2CSV import ROSbag2CSV
-from cnspy_script_utils.directory_info import get_list_of_dir, get_list_of_files
-from cnspy_script_utils.string_parser import string_to_list
-from cnspy_script_utils.utils import exit_success, exit_failure
-from cnspy_trajectory_evaluation.TrajectoryEvaluation import TrajectoryEvaluation
+from cnspy_script_utils.utils import exit_success
 from cnspy_trajectory_evaluation.EvaluationReport import EvaluationReport
-from cnspy_trajectory_evaluation.TrajectoryAlignmentTypes import TrajectoryAlignmentTypes
 from estimator_evaluation.EstimatorReport import EstimatorReport
 from estimator_evaluation.EvaluationAnalyzer import EvaluationAnalyzer
+from estimator_evaluation.BagDiscovery import BagDiscovery
+from estimator_evaluation.ResultCache import ResultCache
+from estimator_evaluation.EvaluationManifest import EvaluationManifest
+from estimator_evaluation.EvaluationJournal import EvaluationJournal
+from estimator_evaluation.WorkQueue import WorkQueue
+from estimator_evaluation.ROSbag2Trajectory import ROSbag2Trajectory
+from estimator_evaluation.StageTimer import StageTimer
+from estimator_evaluation.SharedGroundTruth import SharedGroundTruth
+from estimator_evaluation.ErrorSeriesStore import ErrorSeriesStore
+from estimator_evaluation.ResultWriter import ResultWriter
+from estimator_evaluation.ProgressReporter import ProgressReporter
 
 
 # folder structure:
@@ -55,116 +70,1192 @@ class EstimatorEvaluation:
     num_est = 0
     topic_list = ["/pose_gt", "/pose_est"]
     fn_list = ["pose-gt.csv", "pose-est-cov.csv"]
-    alignment_type = TrajectoryAlignmentTypes.pos
+    alignment_type = 'pos'  # see TrajectoryAlignmentTypes
     num_aligned_samples = -1
+    keep_csv = False  # write the intermediate CSV files of the evaluation
+    manifest = None  # incremental mode: bags contained in the report (see EvaluationManifest)
+    journal = None  # rows of the evaluated bags, written as soon as a bag is done (see EvaluationJournal)
+    queue = None  # coordinator mode: the bag jobs are evaluated by workers (see WorkQueue)
+    affected_groups = None  # incremental mode: modified (attr, lvl, est) groups, None = all
+    timer = None  # wall/cpu time and peak rss of the stages (see StageTimer)
+    num_profiles = 0  # cProfile outputs of the slowest bags are kept in <eval_dir>/PROFILE
+    shared_gt = True  # the ground truth of a RUN is read once and shared by its estimators (see SharedGroundTruth)
+    num_series_samples = 0  # steps of the error time series of each run (see ErrorSeriesStore), 0 = disabled
+    series_store = None  # ErrorSeriesStore <eval_dir>/eval_series.npy, if the series are enabled
+    prefetch = 2  # serial mode: bags read ahead while the current one is evaluated (see evaluate_serial()), 0 = off
+    batched = False  # opt-in: vectorized evaluation of the estimators of a RUN at once (see evaluate_run()), its
+    # values equal the evaluation one by one up to rounding only
+    progress = None  # ProgressReporter of the crawl: bags/sec, ETA, cached/evaluated/failed bags
+    progress_mode = 'auto'  # see ProgressReporter: auto, bar, log, none
+    progress_interval = 10.0  # [sec] between two progress lines in the 'log' mode
+    verbose = False  # prints a line per bag (check point, extraction), instead of the progress only
 
     def __init__(self, eval_dir=".", redo=False, plot=False, save_plot=False,
-                 alignment_type_=TrajectoryAlignmentTypes.pos, frames_=-1):
-        self.alignment_type = alignment_type_
+                 alignment_type_='pos', frames_=-1, jobs=1, cache_fn=None, cache_size=0,
+                 keep_csv=False, manifest_fn=None, report_fn=None, num_profiles=0, journal_fn=None, queue_fn=None,
+                 shared_gt=True, num_series_samples=0, prefetch=2, batched=False, progress='auto',
+                 progress_interval=10.0, verbose=False, lease_time=600.0):
+        self.est_report = EstimatorReport()
+        self.timer = StageTimer()
+        self.num_profiles = num_profiles
+        self.shared_gt = shared_gt
+        self.num_series_samples = int(num_series_samples)
+        self.series_store = None
+        self.prefetch = int(prefetch)
+        self.batched = batched
+        self.progress = None
+        self.progress_mode = progress
+        self.progress_interval = float(progress_interval)
+        self.verbose = verbose
+        # a string (or TrajectoryAlignmentTypes): the trajectory evaluation is only imported if bags are evaluated
+        self.alignment_type = str(alignment_type_)
         self.num_aligned_samples = frames_
-        self.crawl_through(eval_dir, redo=redo, plot=plot, save_plot=save_plot)
+        self.keep_csv = keep_csv
+        self.affected_groups = None
+        cache = None
+        if cache_fn:
+            cache = ResultCache(fn=cache_fn, max_entries=cache_size)
+        self.manifest = None
+        if manifest_fn:
+            # incremental mode: the existing report is extended by the new/changed bags
+            self.manifest = EvaluationManifest(fn=manifest_fn, params=self.get_evaluation_params())
+            if not redo and self.manifest.entries and report_fn and os.path.exists(report_fn):
+                with self.timer.stage('load_report'):
+                    self.est_report.load(report_fn)
+                self.affected_groups = set()
+            else:
+                self.manifest.entries = dict()
+        self.journal = None
+        if journal_fn:
+            self.journal = EvaluationJournal(fn=journal_fn, params=self.get_evaluation_params())
+            if redo:
+                self.journal.clear()
+        self.queue = None
+        if queue_fn:
+            self.queue = WorkQueue(fn=queue_fn, lease_time=lease_time)
+        try:
+            self.crawl_through(eval_dir, redo=redo, plot=plot, save_plot=save_plot, jobs=jobs, cache=cache,
+                               manifest=self.manifest, journal=self.journal, queue=self.queue)
+            if self.journal is not None:
+                # all bags are done and have their report.ini: the journal is only needed to resume an aborted run
+                self.journal.clear()
+        finally:
+            if self.journal is not None:
+                self.journal.close()
+            if self.queue is not None:
+                self.queue.close()
         pass
 
-    def crawl_through(self, eval_dir, redo=False, plot=False, save_plot=False):
-        print("EVAL: " + str(os.path.abspath(eval_dir)))
-        for ATTR in get_list_of_dir(eval_dir):
-            head, tail = os.path.split(ATTR)
+    def crawl_through(self, eval_dir, redo=False, plot=False, save_plot=False, jobs=1, cache=None, manifest=None,
+                      journal=None, queue=None):
+        with self.timer.stage('discovery'):
+            bag_list = self.find_bag_files(eval_dir)
+        all_bag_list = bag_list
+        redo_list = [redo] * len(bag_list)
+        num_runs = self.est_report.get_run_num()
+        if manifest is not None:
+            with self.timer.stage('manifest'):
+                bag_list, redo_list = self.select_changed_bags(bag_list, manifest, redo)
 
-            if 'ATTR_' not in ATTR:
-                continue
-            l = string_to_list(ATTR, 'ATTR_{0}')
-            assert (l is not None)
-            attr_val = l[0]
-            print("\t-ATTR: " + str(tail) + ' val:' + str(attr_val))
+        # rows are collected by their position in the bag list, thus the resulting table does not depend on the
+        # number of processes or on which bags were found in the cache.
+        row_list = [None] * len(bag_list)
+        key_list = [None] * len(bag_list)
+        idx_list = []
+        num_journaled = 0
+        with self.timer.stage('cache'):
+            for idx, bag_fn in enumerate(bag_list):
+                if journal is not None and not redo_list[idx]:
+                    # evaluated by a previous (e.g. aborted) run; a removed RESULTS folder requests a new evaluation
+                    row_list[idx] = journal.get_row(bag_fn)
+                    if row_list[idx] is not None and not os.path.exists(
+                            os.path.join(EstimatorEvaluation.get_result_dir(bag_fn), 'report.ini')):
+                        row_list[idx] = None
+                    if row_list[idx] is not None:
+                        num_journaled += 1
+                        continue
+                if cache is not None:
+                    key_list[idx] = ResultCache.get_key(bag_fn, self.get_evaluation_params())
+                    metrics = None if redo else cache.get(key_list[idx])
+                    if metrics is not None:
+                        row_list[idx] = tuple(EstimatorEvaluation.parse_bag_fn(bag_fn)) + tuple(metrics)
+                        continue
+                idx_list.append(idx)
 
-            for LVL in get_list_of_dir(ATTR):
-                head, tail = os.path.split(LVL)
-                if 'LVL_' not in LVL:
-                    continue
-                l = string_to_list(LVL, 'LVL_{0}')
-                assert (l is not None)
-                lvl_val = l[0]
+        if cache is not None:
+            # the cache decides what is stale: existing report.ini files are not trusted
+            redo = True
+            print("EVAL: cache hits: " + str(len(bag_list) - len(idx_list) - num_journaled) + ", stale: " +
+                  str(len(idx_list)))
+        if journal is not None:
+            print("EVAL: journaled bags: " + str(num_journaled) + ", to evaluate: " + str(len(idx_list)))
+
+        # the profiles are not transferred by the work queue
+        profile = self.num_profiles > 0 and queue is None
+        # the last element is the ground truth of the job's RUN (see evaluate_bag_job()), added when it was read
+        job_list = [(bag_list[idx], redo or redo_list[idx], plot, save_plot, self.alignment_type,
+                     self.num_aligned_samples, self.topic_list, self.fn_list, self.keep_csv, profile,
+                     self.num_series_samples, self.batched, self.verbose, None)
+                    for idx in idx_list]
+        # the total is known from the discovery: the bags of the cache and the journal are done up front
+        self.progress = ProgressReporter(total=len(bag_list), mode=self.progress_mode,
+                                         interval=self.progress_interval)
+        self.progress.skip(num_journaled, 'journaled')
+        self.progress.skip(len(bag_list) - len(idx_list) - num_journaled, 'cached')
+        profile_heap = []  # (wall time, idx, stats) of the slowest bags
+        with self.timer.stage('evaluation'):
+            pool = None
+            if queue is not None:
+                print("EVAL: publishing " + str(len(job_list)) + " bag files to " + str(queue.fn) + ", evaluated by " +
+                      str(jobs) + " local and any number of remote workers")
+                result_iter = EstimatorEvaluation.evaluate_distributed(queue, idx_list, job_list, jobs)
+            elif jobs > 1:
+                print("EVAL: evaluating " + str(len(job_list)) + " bag files using " + str(jobs) + " processes")
+                # created before the pool: the workers share its resource tracker
+                store = SharedGroundTruth() if self.shared_gt else None
+                pool = multiprocessing.Pool(processes=jobs)
+                # the results are returned as soon as they are done, together with their position
+                if store is not None:
+                    result_iter = EstimatorEvaluation.evaluate_pooled(pool, store, idx_list, job_list, self.timer,
+                                                                      max_runs=2 * jobs)
+                else:
+                    result_iter = pool.imap_unordered(EstimatorEvaluation.evaluate_indexed_job,
+                                                      zip(idx_list, job_list), chunksize=1)
+            else:
+                result_iter = EstimatorEvaluation.evaluate_serial(idx_list, job_list, self.timer,
+                                                                  shared_gt=self.shared_gt, prefetch=self.prefetch)
+            num_records = len(self.timer.records)
+            extracted = set()  # bags extracted, but not counted yet (the records of a RUN arrive at once)
+            try:
+                for idx, (row, records, stats) in result_iter:
+                    row_list[idx] = row
+                    if journal is not None and row is not None:
+                        journal.append(bag_list[idx], row)
+                    self.timer.merge(records)
+                    # without an extraction, the row was read from the check point (report.ini)
+                    extracted.update(r[0] for r in self.timer.records[num_records:] if r[1] == 'extract')
+                    num_records = len(self.timer.records)
+                    if row is None:
+                        self.progress.update('failed')
+                    elif bag_list[idx] in extracted:
+                        self.progress.update('evaluated')
+                    else:
+                        self.progress.update('checkpoints')
+                    extracted.discard(bag_list[idx])
+                    if stats is not None:
+                        # keep only the profiles of the `num_profiles` slowest bags; the wall time is taken from
+                        # the records of the bag, not from all records of the crawl
+                        item = (StageTimer.sum_wall_time(records, bag_list[idx], 'total'), idx, stats)
+                        if len(profile_heap) < self.num_profiles:
+                            heapq.heappush(profile_heap, item)
+                        else:
+                            heapq.heappushpop(profile_heap, item)
+            finally:
+                if pool is not None:
+                    pool.close()
+                    pool.join()
+                if hasattr(result_iter, 'close'):
+                    # generators: stops the workers of the queue, releases the shared ground truth
+                    result_iter.close()
+                self.progress.close()
+        if profile_heap:
+            self.save_profiles(os.path.join(eval_dir, 'PROFILE'), [(bag_list[idx], stats)
+                                                                   for (wall, idx, stats) in profile_heap])
 
-                print("\t\t-LVL: " + str(tail) + ' val:' + str(lvl_val))
+        if cache is not None:
+            for idx in idx_list:
+                if row_list[idx] is not None:
+                    cache.put(key_list[idx], row_list[idx][4:], bag_fn=bag_list[idx])
+            cache.save()
 
-                for RUN in get_list_of_dir(LVL):
-                    head, tail = os.path.split(RUN)
-                    if 'RUN_' not in RUN:
-                        continue
+        with self.timer.stage('append'):
+            for row in row_list:
+                self.append_metric_row(row)
+
+        if manifest is not None:
+            for bag_fn, row in zip(bag_list, row_list):
+                if row is not None:
+                    manifest.put(bag_fn, row[:4])
+            if self.affected_groups is not None:
+                self.affected_groups.update(EstimatorEvaluation.get_group_key(row) for row in row_list
+                                            if row is not None)
+                # the number of runs defines the number of outliers of every group
+                if self.est_report.get_run_num() != num_runs:
+                    self.affected_groups = None
+
+        if self.num_series_samples > 0:
+            with self.timer.stage('series_store'):
+                self.series_store = self.build_series_store(os.path.join(eval_dir, 'eval_series.npy'),
+                                                            all_bag_list)
+
+    def build_series_store(self, fn, bag_list):
+        # the error series of the bags contained in the report, read from their RESULTS folders
+        report_keys = set(tuple(int(v) for v in key) for key in
+                          self.est_report.data_frame[EstimatorReport.get_column_format()[:4]].values.tolist())
+        key_list = []
+        series_fn_list = []
+        for bag_fn in bag_list:
+            l = EstimatorEvaluation.parse_bag_fn(bag_fn)
+            if l is not None and tuple(int(v) for v in l) in report_keys:
+                key_list.append(l)
+                series_fn_list.append(ErrorSeriesStore.get_series_fn(EstimatorEvaluation.get_result_dir(bag_fn)))
+        store, num_missing = ErrorSeriesStore.build(fn, key_list, series_fn_list, self.num_series_samples)
+        print("EVAL: error series of " + str(len(store)) + " runs saved in " + str(fn) +
+              (", missing: " + str(num_missing) + " (evaluate with --redo)" if num_missing else ""))
+        return store
+
+    def select_changed_bags(self, bag_list, manifest, redo=False):
+        """
+        incremental mode: removes the rows of changed and removed bags from the report and returns the bags that
+        need to be evaluated (new or changed ones) with their redo flags.
+        """
+        changed_list = manifest.get_changed(bag_list)
+        removed_list = manifest.get_removed(bag_list)
+        # changed bags have an outdated report.ini, new bags are evaluated or read from their report.ini
+        redo_list = [redo or manifest.get_key(manifest.get_rel_fn(bag_fn)) is not None for bag_fn in changed_list]
+
+        key_list = [manifest.get_key(rel_fn) for rel_fn in removed_list]
+        for bag_fn in changed_list:
+            l = EstimatorEvaluation.parse_bag_fn(bag_fn)
+            if l is not None:
+                key_list.append(l)
+        for rel_fn in removed_list:
+            manifest.remove(rel_fn)
+
+        self.est_report.remove_rows(key_list)
+        if self.affected_groups is not None:
+            self.affected_groups.update(EstimatorEvaluation.get_group_key(key) for key in key_list)
+
+        print("EVAL: incremental: " + str(len(changed_list)) + " new or changed bags, " + str(len(removed_list)) +
+              " removed bags, " + str(len(bag_list) - len(changed_list)) + " unchanged bags")
+        return changed_list, redo_list
 
-                    l = string_to_list(RUN, 'RUN_{0}')
-                    assert (l is not None)
-                    run_val = l[0]
-                    print("\t\t\t-RUN: " + str(tail) + ' val:' + str(run_val))
-
-                    for bag in get_list_of_files(RUN):
-                        head, tail = os.path.split(bag)
-                        if '.bag' in tail:
-                            l = string_to_list(tail, 'ATTR_{0}_LVL_{1}_RUN_{2}_EST_{3}.bag')
-                            # print(str(l))
-                            assert (l is not None)
-                            print("\t\t\t\t-bag: " + str(tail) + ', values: attr={0},lvl={1},run={2}, est={3}'.format(
-                                l[0], l[1], l[2], l[3]))
-                            self.evaluate_bag_file(bag_fn=bag, redo=redo, plot=plot, save_plot=save_plot)
+    def save_manifest(self):
+        # incremental mode: must be called after the reports were saved
+        if self.manifest is not None:
+            self.manifest.save()
+
+    @staticmethod
+    def get_group_key(row):
+        # (attr, lvl, est) of a row/key (attr, lvl, run, est, ...)
+        return int(row[0]), int(row[1]), int(row[3])
+
+    def get_evaluation_params(self):
+        # parameters that influence the result of an evaluation (used by the ResultCache)
+        params = {'alignment_type': str(self.alignment_type), 'num_aligned_samples': int(self.num_aligned_samples),
+                  'topic_list': list(self.topic_list)}
+        if self.num_series_samples > 0:
+            # the evaluations without series lack the series files
+            params['num_series_samples'] = int(self.num_series_samples)
+        return params
+
+    @staticmethod
+    def parse_bag_fn(bag_fn):
+        # returns [attr, lvl, run, est] or None
+        return BagDiscovery.parse_bag_fn(bag_fn)
+
+    @staticmethod
+    def find_bag_files(eval_dir, verbose=False):
+        return BagDiscovery(eval_dir, verbose=verbose).bag_list
 
     def evaluate_bag_file(self, bag_fn, redo=False, plot=False, save_plot=False):
+        row = EstimatorEvaluation.evaluate_bag(bag_fn=bag_fn, redo=redo, plot=plot, save_plot=save_plot,
+                                               alignment_type=self.alignment_type,
+                                               num_aligned_samples=self.num_aligned_samples,
+                                               topic_list=self.topic_list, fn_list=self.fn_list,
+                                               keep_csv=self.keep_csv, num_series_samples=self.num_series_samples)
+        self.append_metric_row(row)
+
+    def append_metric_row(self, row):
+        # row: (attr, lvl, run, est, armse_p, armse_q, anees_p, anees_q) or None
+        if row is not None:
+            self.est_report.append_row(*row)
+
+    @staticmethod
+    def save_profiles(profile_dir, profile_list):
+        # profile_list: [(bag_fn, marshaled cProfile stats)]; the files can be read by pstats.Stats(fn)
+        if not os.path.exists(profile_dir):
+            os.makedirs(os.path.abspath(profile_dir))
+        for bag_fn, stats in profile_list:
+            fn = os.path.join(profile_dir, os.path.splitext(os.path.basename(bag_fn))[0] + '.prof')
+            with open(fn, 'wb') as f:
+                f.write(stats)
+        print("EVAL: profiles of the " + str(len(profile_list)) + " slowest bags saved in " + str(profile_dir))
+
+    @staticmethod
+    def evaluate_distributed(queue, idx_list, job_list, jobs=1, poll_interval=1.0, worker_timeout=None):
+        """
+        coordinator: publishes the jobs to the work queue and yields (position, (row, records, None)) as the results
+        of the workers are collected; `jobs` local worker processes are started, remote workers may join at any time
+        (see WorkQueue.run_worker()). Failed jobs yield the row None. If no local worker is alive and no job was leased
+        or done for `worker_timeout` seconds (default: the lease time of the queue), e.g. all workers crashed or no
+        remote worker joined, the remaining jobs are failed.
+        """
+        if worker_timeout is None:
+            worker_timeout = queue.lease_time
+        id_list = queue.publish(job_list)
+        idx_dict = dict(zip(id_list, idx_list))
+        process_list = [multiprocessing.Process(target=WorkQueue.run_worker,
+                                                kwargs={'fn': queue.fn, 'lease_time': queue.lease_time,
+                                                        'max_attempts': queue.max_attempts, 'wait': True,
+                                                        'poll_interval': poll_interval})
+                        for i in range(jobs if idx_dict else 0)]
+        for process in process_list:
+            process.start()
+        try:
+            t_active = time.time()
+            while idx_dict:
+                entry_list = queue.collect()
+                for job_id, state, result in entry_list:
+                    idx = idx_dict.pop(job_id, None)
+                    if idx is None:
+                        continue  # e.g. left over by an aborted coordinator
+                    if state == 'done' and result[0] is not None:
+                        yield idx, (tuple(result[0]), result[1], None)
+                    else:
+                        yield idx, (None, [], None)
+                if entry_list:
+                    t_active = time.time()
+                    continue
+                # the local workers wait for jobs: an exited worker crashed
+                for process in [process for process in process_list if not process.is_alive()]:
+                    print("EVAL: WARNING local worker " + str(process.pid) + " exited with code " +
+                          str(process.exitcode))
+                    process_list.remove(process)
+                if process_list or queue.get_num_leased() > 0:
+                    t_active = time.time()
+                elif time.time() - t_active > worker_timeout:
+                    print("EVAL: WARNING no worker alive for " + str(worker_timeout) + " sec, failing the " +
+                          str(len(idx_dict)) + " remaining bag files")
+                    for idx in list(idx_dict.values()):
+                        yield idx, (None, [], None)
+                    idx_dict.clear()
+                    break
+                time.sleep(poll_interval)
+        finally:
+            for process in process_list:
+                process.terminate()
+                process.join()
+
+    @staticmethod
+    def get_result_dir(bag_fn):
+        # RESULTS/EST_<est> next to the bag file or None
+        l = EstimatorEvaluation.parse_bag_fn(bag_fn)
+        if l is None:
+            return None
         head, tail = os.path.split(bag_fn)
-        l = string_to_list(tail, 'ATTR_{0}_LVL_{1}_RUN_{2}_EST_{3}.bag')
+        return head + "/RESULTS/EST_{0}".format(l[3])
+
+    @staticmethod
+    def has_checkpoint(bag_fn, num_series_samples=0):
+        # True, if the bag has a report.ini (and the series, if enabled), see evaluate_bag(); it might still be invalid
+        result_dir = EstimatorEvaluation.get_result_dir(bag_fn)
+        if result_dir is None or not os.path.exists(result_dir + "/report.ini"):
+            return False
+        return num_series_samples <= 0 or os.path.exists(ErrorSeriesStore.get_series_fn(result_dir))
+
+    @staticmethod
+    def group_by_run(idx_list, job_list):
+        """
+        groups the jobs whose bags need to be extracted (redo or no check point) by their RUN directory, since all
+        bags of a RUN hold the same ground truth.
+
+        Output:
+        run_list -- [(RUN directory, [(position, job), ...]), ...] of the RUNs having at least two such jobs
+        single_list -- [(position, job), ...] of all other jobs
+        """
+        dict_runs = dict()
+        single_list = []
+        for idx, job in zip(idx_list, job_list):
+            bag_fn, redo, num_series_samples = job[0], job[1], job[10]
+            if EstimatorEvaluation.parse_bag_fn(bag_fn) is not None and \
+                    (redo or not EstimatorEvaluation.has_checkpoint(bag_fn, num_series_samples)):
+                dict_runs.setdefault(os.path.dirname(os.path.abspath(bag_fn)), []).append((idx, job))
+            else:
+                single_list.append((idx, job))
+        run_list = []
+        for run_dir, item_list in dict_runs.items():
+            if len(item_list) > 1:
+                run_list.append((run_dir, item_list))
+            else:
+                single_list.extend(item_list)
+        return run_list, single_list
+
+    @staticmethod
+    def evaluate_serial(idx_list, job_list, timer, shared_gt=True, prefetch=0):
+        """
+        evaluates the jobs in their order and yields (position, result of evaluate_bag_job()); the ground truth of a
+        RUN is read once (see group_by_run()) and kept until its last estimator is evaluated.
+
+        With `prefetch` > 0, the jobs are pipelined: up to `prefetch` upcoming bags (and the ground truth of their
+        RUNs) are read by as many threads (see read_bag_job()) while the current one is evaluated, and the result
+        files are written asynchronously (see ResultWriter). At most `prefetch` bags are held besides the evaluated
+        one and the writer queue is bounded, thus the memory stays bounded; all files are written, when the generator
+        is exhausted or closed. A result is yielded not before the files of its bag are written (see yield_written()),
+        thus a journaled bag has its report.ini and error series; if an evaluation fails, the results evaluated before
+        are yielded, before the exception is raised.
+
+        The estimators of a RUN are evaluated at once (see evaluate_run_jobs()), if their jobs are batched (see
+        can_batch()): the remaining estimators of the RUN are read, when its first one is due.
+        """
+        run_list, single_list = EstimatorEvaluation.group_by_run(idx_list, job_list) if shared_gt else ([], [])
+        run_dict = dict()  # position -> RUN directory
+        num_remaining = dict()  # RUN directory -> number of estimators not evaluated yet
+        num_unread = dict()  # RUN directory -> number of estimators not read (submitted) yet
+        for run_dir, item_list in run_list:
+            num_remaining[run_dir] = len(item_list)
+            num_unread[run_dir] = len(item_list)
+            for idx, job in item_list:
+                run_dict[idx] = run_dir
+
+        executor = None
+        writer = None
+        if prefetch > 0:
+            executor = concurrent.futures.ThreadPoolExecutor(max_workers=prefetch,
+                                                             thread_name_prefix='EstimatorEvaluation')
+            writer = ResultWriter(max_pending=16 * prefetch)
+        gt_dict = dict()  # RUN directory -> Future of load_ground_truth_job()
+        arr_dict = dict()  # RUN directory -> ground truth
+        pending = collections.deque()  # (position, job, RUN directory, Future of read_bag_job()) in their order
+        written = collections.deque()  # (position, result, Future of ResultWriter.mark()) not yielded yet
+        item_iter = iter(zip(idx_list, job_list))
+        try:
+            while True:
+                # read ahead: without prefetch, the next bag is read when it is evaluated
+                for idx, job in item_iter:
+                    EstimatorEvaluation.read_ahead(executor, pending, gt_dict, num_unread, idx, job,
+                                                   run_dict.get(idx))
+                    if len(pending) > prefetch:
+                        break
+                if not pending:
+                    break
+
+                idx, job, run_dir, future = pending.popleft()
+                if run_dir is not None and run_dir not in arr_dict and EstimatorEvaluation.can_batch(job):
+                    # all estimators of the RUN at once
+                    while num_unread[run_dir] > 0:
+                        idx_next, job_next = next(item_iter)
+                        EstimatorEvaluation.read_ahead(executor, pending, gt_dict, num_unread, idx_next, job_next,
+                                                       run_dict.get(idx_next))
+                    group = [(idx, job, future)] + [(item[0], item[1], item[3]) for item in pending
+                                                    if item[2] == run_dir]
+                    pending = collections.deque(item for item in pending if item[2] != run_dir)
+                    for item in EstimatorEvaluation.evaluate_run_jobs(run_dir, group, gt_dict.pop(run_dir), timer,
+                                                                      writer):
+                        yield from EstimatorEvaluation.yield_written(written, writer, item)
+                    continue
+
+                prefetched, records = future.result()
+                timer.merge(records)
+                if run_dir is not None:
+                    if run_dir not in arr_dict:
+                        arr_gt, records = gt_dict[run_dir].result()
+                        timer.merge(records)
+                        arr_dict[run_dir] = arr_gt
+                    job = tuple(job[:-1]) + (arr_dict[run_dir],)
+                    if arr_dict[run_dir] is None:
+                        # without a ground truth, the bag is read completely
+                        prefetched = None
+                result = EstimatorEvaluation.evaluate_bag_job(job, prefetched=prefetched, writer=writer)
+                yield from EstimatorEvaluation.yield_written(written, writer, (idx, result))
+                if run_dir is not None:
+                    num_remaining[run_dir] -= 1
+                    if num_remaining[run_dir] == 0:
+                        del arr_dict[run_dir]
+                        del gt_dict[run_dir]
+            yield from EstimatorEvaluation.yield_written(written, writer, wait=True)
+        except Exception:
+            # e.g. a failed extraction: the bags evaluated before are journaled
+            yield from EstimatorEvaluation.yield_written(written, writer, wait=True)
+            raise
+        finally:
+            if executor is not None:
+                executor.shutdown(wait=True, cancel_futures=True)
+            if writer is not None:
+                writer.close()
+
+    @staticmethod
+    def yield_written(written, writer, item=None, wait=False):
+        """
+        appends the result `item` (position, result) to `written` and yields the results in their order, as soon as
+        the files of their bags are written: the writer executes its operations in order, thus a mark() submitted after
+        the evaluation of a bag is done, when all its files are written. Without writer, the files are written already.
+        With `wait`, all results are yielded (waiting for the writer).
+        """
+        if item is not None:
+            written.append((item, writer.mark() if writer is not None else None))
+        while written and (wait or written[0][1] is None or written[0][1].done()):
+            item, future = written.popleft()
+            if future is not None:
+                writer.raise_error()
+                future.result()
+            yield item
+
+    @staticmethod
+    def read_ahead(executor, pending, gt_dict, num_unread, idx, job, run_dir=None):
+        # submits the reading of a job (and of the ground truth of its RUN, if shared) and appends it to `pending`
+        if run_dir is not None:
+            if run_dir not in gt_dict:
+                gt_dict[run_dir] = EstimatorEvaluation.run_async(executor, EstimatorEvaluation.load_ground_truth_job,
+                                                                 job)
+            num_unread[run_dir] -= 1
+        pending.append((idx, job, run_dir, EstimatorEvaluation.run_async(executor, EstimatorEvaluation.read_bag_job,
+                                                                         job, run_dir is not None)))
+
+    @staticmethod
+    def can_batch(job):
+        # batched jobs without plots, intermediate CSV files and profiling are evaluated by evaluate_run(); a profile
+        # needs the cProfile of a single bag (see evaluate_bag_job())
+        plot, save_plot, keep_csv, profile, batched = job[2], job[3], job[8], job[9], job[11]
+        return batched and not (plot or save_plot or keep_csv or profile)
+
+    @staticmethod
+    def evaluate_run_jobs(run_dir, group, gt_future, timer, writer=None):
+        """
+        evaluates the read jobs of a RUN at once (see evaluate_run()) and yields (position, result of
+        evaluate_bag_job()); jobs with a check point or without associated samples, failed extractions and all jobs
+        of a RUN without ground truth are evaluated one by one. The time of the RUN is split evenly across its batched
+        bags, which are returned with a 'total' record each (as by evaluate_bag_job()).
+
+        Input:
+        group -- list of (position, job, Future of read_bag_job())
+        gt_future -- Future of load_ground_truth_job()
+        """
+        arr_gt, records = gt_future.result()
+        timer.merge(records)
+        item_list = []  # (position, job, prefetched)
+        for idx, job, future in group:
+            prefetched, records = future.result()
+            timer.merge(records)
+            item_list.append((idx, job, prefetched))
+
+        batch_list = [(idx, job, prefetched) for idx, job, prefetched in item_list
+                      if arr_gt is not None and prefetched[0] is None and prefetched[1] is not None]
+        report_dict = dict()  # position -> EvaluationReport or None
+        records_dict = dict()  # position -> StageTimer records of the bag
+        if batch_list:
+            job = batch_list[0][1]
+            run_timer = StageTimer()
+            with run_timer.stage('evaluate_run', bag=run_dir):
+                report_list = EstimatorEvaluation.evaluate_run(
+                    arr_gt, [prefetched[1][0] for idx, job_, prefetched in batch_list],
+                    result_dir_list=[EstimatorEvaluation.get_result_dir(job_[0]) for idx, job_, p in batch_list],
+                    alignment_type=job[4], num_aligned_samples=job[5], timer=run_timer, num_series_samples=job[10],
+                    writer=writer, fn_gt=job[0], fn_est_list=[job_[0] for idx, job_, p in batch_list], bag=run_dir)
+            timer.merge(run_timer.records)
+            report_dict = dict(zip([idx for idx, job_, p in batch_list], report_list))
+            wall, cpu, max_rss = run_timer.records[-1][2:]
+            for idx, job_, p in batch_list:
+                records_dict[idx] = [[str(job_[0]), 'total', wall / len(batch_list), cpu / len(batch_list),
+                                      max_rss]]
+
+        for idx, job, prefetched in item_list:
+            report = report_dict.get(idx)
+            if report is not None:
+                row = tuple(EstimatorEvaluation.parse_bag_fn(job[0])) + (report.ARMSE_p, report.ARMSE_q,
+                                                                         report.ANEES_p, report.ANEES_q)
+                yield idx, (row, records_dict[idx], None)
+            else:
+                # without a ground truth, the bag is read completely
+                yield idx, EstimatorEvaluation.evaluate_bag_job(tuple(job[:-1]) + (arr_gt,),
+                                                                prefetched=prefetched if arr_gt is not None else None,
+                                                                writer=writer)
+
+    @staticmethod
+    def evaluate_run(arr_gt, arr_est_list, result_dir_list=None, alignment_type='pos', num_aligned_samples=-1,
+                     timer=None, num_series_samples=0, writer=None, fn_gt='', fn_est_list=None, bag=''):
+        """
+        evaluates the estimates of a RUN against its ground truth at once: the association, the alignments, ARMSE and
+        ANEES of all estimates are computed by stacked array operations (see BatchedTrajectoryEvaluation), the
+        report.ini (and error_series.npy) is written to the result directories, if given.
+
+        Input:
+        arr_gt -- numpy array of the ground truth (columns of CSVFormatPose.PoseWithCov)
+        arr_est_list -- list of numpy arrays of the estimates
+
+        Output:
+        report_list -- EvaluationReport per estimate, None if it has no samples associated with the ground truth
+        """
+        from estimator_evaluation.BatchedTrajectoryEvaluation import BatchedTrajectoryEvaluation
+        e = BatchedTrajectoryEvaluation(arr_gt, arr_est_list, result_dir_list=result_dir_list,
+                                        alignment_type=alignment_type, num_aligned_samples=num_aligned_samples,
+                                        fn_gt=fn_gt, fn_est_list=fn_est_list, timer=timer,
+                                        num_series_samples=num_series_samples, writer=writer, bag=bag)
+        return e.report_list
+
+    @staticmethod
+    def run_async(executor, func, *args):
+        # func(*args) in the executor or, without executor, right now; returns a Future in both cases
+        if executor is not None:
+            return executor.submit(func, *args)
+        future = concurrent.futures.Future()
+        try:
+            future.set_result(func(*args))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+    @staticmethod
+    def evaluate_pooled(pool, store, idx_list, job_list, timer, max_runs=2):
+        """
+        evaluates the jobs in the process pool and yields (position, result of evaluate_bag_job()) as they are done.
+        The ground truth of a RUN (see group_by_run()) is read by one worker, put into shared memory by the coordinator
+        and then the estimators of the RUN are submitted with its descriptor; at most `max_runs` RUNs are in flight,
+        thus the number of shared blocks is bounded. A block is released after the last estimator of its RUN.
+        """
+        run_list, single_list = EstimatorEvaluation.group_by_run(idx_list, job_list)
+        run_dict = dict(run_list)
+        results = SimpleQueue()  # (tag, result), filled by the callbacks of the pool
+        num_pending = 0
+        try:
+            for item in single_list:
+                EstimatorEvaluation.submit(pool, results, ('row', None), EstimatorEvaluation.evaluate_indexed_job,
+                                           item)
+                num_pending += 1
+            num_remaining = dict()  # RUN directory -> number of estimators not evaluated yet
+            next_run = 0
+            while num_pending > 0 or next_run < len(run_list):
+                while next_run < len(run_list) and len(num_remaining) < max_runs:
+                    run_dir, item_list = run_list[next_run]
+                    EstimatorEvaluation.submit(pool, results, ('gt', run_dir),
+                                               EstimatorEvaluation.load_ground_truth_job, item_list[0][1])
+                    num_remaining[run_dir] = len(item_list)
+                    num_pending += 1
+                    next_run += 1
+
+                (tag, run_dir), result = results.get()
+                num_pending -= 1
+                if tag == 'error':
+                    raise result
+                elif tag == 'gt':
+                    arr_gt, records = result
+                    timer.merge(records)
+                    # without a ground truth, each estimator reads its bag completely
+                    descriptor = store.put(run_dir, arr_gt) if arr_gt is not None else None
+                    for idx, job in run_dict[run_dir]:
+                        EstimatorEvaluation.submit(pool, results, ('row', run_dir),
+                                                   EstimatorEvaluation.evaluate_indexed_job,
+                                                   (idx, tuple(job[:-1]) + (descriptor,)))
+                        num_pending += 1
+                else:
+                    if run_dir is not None:
+                        num_remaining[run_dir] -= 1
+                        if num_remaining[run_dir] == 0:
+                            del num_remaining[run_dir]
+                            store.release(run_dir)
+                    yield result
+        finally:
+            store.close()
+
+    @staticmethod
+    def submit(pool, results, tag, func, arg):
+        # the result (or the exception) of func(arg) is put into the queue `results` as (tag, result)
+        pool.apply_async(func, (arg,), callback=lambda result: results.put((tag, result)),
+                         error_callback=lambda e: results.put((('error', None), e)))
+
+    @staticmethod
+    def load_ground_truth_job(job):
+        """
+        reads the ground truth (first topic) of the job's bag file
+
+        Output:
+        arr_gt -- numpy array or None
+        records -- StageTimer records
+        """
+        bag_fn, topic_list, verbose = job[0], job[6], job[12]
+        timer = StageTimer()
+        with timer.stage('extract_gt', bag=bag_fn):
+            array_list = ROSbag2Trajectory.extract(bagfile_name=bag_fn, topic_list=list(topic_list[:1]),
+                                                   fmt=CSVFormatPose.PoseWithCov, verbose=verbose)
+        return (array_list[0] if array_list is not None else None), timer.records
+
+    @staticmethod
+    def evaluate_indexed_job(item):
+        # item: (position in the bag list, job), returns (position, result of evaluate_bag_job())
+        idx, job = item
+        return idx, EstimatorEvaluation.evaluate_bag_job(job)
+
+    @staticmethod
+    def evaluate_bag_job(job, prefetched=None, writer=None):
+        """
+        entry point of the worker processes: unpacks a job tuple created in crawl_through(); its last element is the
+        ground truth of the RUN: None (read from the bag), a numpy array or a SharedGroundTruth descriptor.
+        `prefetched` and `writer` are passed to evaluate_bag().
+
+        Output:
+        row -- see evaluate_bag()
+        records -- StageTimer records of the bag
+        stats -- marshaled cProfile stats if profiling is enabled, else None
+        """
+        bag_fn, redo, plot, save_plot, alignment_type, num_aligned_samples, topic_list, fn_list, keep_csv, \
+            profile, num_series_samples, batched, verbose, gt = job
+        timer = StageTimer()
+        profiler = cProfile.Profile() if profile else None
+        with timer.stage('total', bag=bag_fn):
+            if profiler is not None:
+                profiler.enable()
+            arr_gt = gt
+            if gt is not None and not isinstance(gt, numpy.ndarray):
+                with timer.stage('load_gt', bag=bag_fn):
+                    arr_gt = SharedGroundTruth.load(gt)
+            row = EstimatorEvaluation.evaluate_bag(bag_fn=bag_fn, redo=redo, plot=plot, save_plot=save_plot,
+                                                   alignment_type=alignment_type,
+                                                   num_aligned_samples=num_aligned_samples,
+                                                   topic_list=topic_list, fn_list=fn_list, keep_csv=keep_csv,
+                                                   timer=timer, arr_gt=arr_gt,
+                                                   num_series_samples=num_series_samples,
+                                                   prefetched=prefetched, writer=writer, batched=batched,
+                                                   verbose=verbose)
+            if profiler is not None:
+                profiler.disable()
+        stats = None
+        if profiler is not None:
+            profiler.create_stats()
+            stats = marshal.dumps(profiler.stats)
+        return row, timer.records, stats
+
+    @staticmethod
+    def evaluate_bag(bag_fn, redo=False, plot=False, save_plot=False, alignment_type='pos',
+                     num_aligned_samples=-1, topic_list=None, fn_list=None, keep_csv=False, timer=None, arr_gt=None,
+                     num_series_samples=0, prefetched=None, writer=None, batched=False, verbose=True):
+        """
+        evaluates a single bag file (or reads its checkpoint) and returns the metric row
+        (attr, lvl, run, est, armse_p, armse_q, anees_p, anees_q) or None if the bag could not be evaluated. If the
+        ground truth `arr_gt` (e.g. shared by the RUN) is given, only the estimate is read from the bag file. With
+        `num_series_samples` > 0, the error time series is saved too and a report.ini without it is no check point.
+        `prefetched` is the result of read_bag() (e.g. done in advance by evaluate_serial()); the result files are
+        written by the `writer` (see ResultWriter), if given. If `batched`, the bag is evaluated by evaluate_run(),
+        unless plots or the intermediate CSV files are requested. `verbose` prints the check point decisions.
+        """
+        if fn_list is None:
+            fn_list = EstimatorEvaluation.fn_list
+
+        l = EstimatorEvaluation.parse_bag_fn(bag_fn)
         if l is not None:
             attr_val = l[0]
             lvl_val = l[1]
             run_val = l[2]
             est_val = l[3]
-            # check if there is already a report.ini for this estimator
-            # if it does not exist, make a report!
-            result_dir = head + "/RESULTS/EST_{0}".format(est_val)
-            report_file = result_dir + "/report.ini"
-            report = None
-            if not os.path.exists(report_file) or redo:
-                print('\t\t\t\t\t-report does not exist! evaluate: ' + str(tail))
-                if not ROSbag2CSV.extract(bagfile_name=bag_fn, topic_list=self.topic_list, fn_list=self.fn_list,
-                                          fmt=CSVFormatPose.PoseWithCov, result_dir=result_dir, verbose=True):
-                    print("\t\t\t\t\tproblem extracting bag file!")
-                    return
-
-                fn_gt = os.path.join(result_dir, self.fn_list[0])
-                fn_est = os.path.join(result_dir, self.fn_list[1])
-                e = TrajectoryEvaluation(fn_gt=fn_gt, fn_est=fn_est,
-                                         result_dir=result_dir, alignment_type=self.alignment_type,
-                                         num_aligned_samples=self.num_aligned_samples, plot=plot, save_plot=save_plot)
-                report = e.report
-            else:
-                print('\t\t\t\t\t-report does exist! read from : ' + str(report_file))
-                report = EvaluationReport()
-                report.load(fn=report_file)
+            if prefetched is None:
+                prefetched = EstimatorEvaluation.read_bag(bag_fn, redo=redo, topic_list=topic_list, timer=timer,
+                                                          gt_shared=arr_gt is not None,
+                                                          num_series_samples=num_series_samples, verbose=verbose)
+            report, array_list = prefetched
+            if report is None:
+                if array_list is None:
+                    print("\t\t\t\t\tproblem extracting bag file: " + str(bag_fn))
+                    return None
+                if arr_gt is not None:
+                    array_list = [arr_gt] + list(array_list)
+
+                if batched and not (plot or save_plot or keep_csv):
+                    report = EstimatorEvaluation.evaluate_run(
+                        array_list[0], [array_list[1]], result_dir_list=[EstimatorEvaluation.get_result_dir(bag_fn)],
+                        alignment_type=alignment_type, num_aligned_samples=num_aligned_samples, timer=timer,
+                        num_series_samples=num_series_samples, writer=writer, fn_gt=bag_fn, fn_est_list=[bag_fn],
+                        bag=bag_fn)[0]
+                if report is None:
+                    # plots, intermediate CSV files or no associated samples
+                    from estimator_evaluation.InMemoryTrajectoryEvaluation import InMemoryTrajectoryEvaluation
+                    e = InMemoryTrajectoryEvaluation(arr_gt=array_list[0], arr_est=array_list[1],
+                                                     result_dir=EstimatorEvaluation.get_result_dir(bag_fn),
+                                                     alignment_type=alignment_type,
+                                                     num_aligned_samples=num_aligned_samples, plot=plot,
+                                                     save_plot=save_plot, keep_csv=keep_csv, fn_gt=bag_fn,
+                                                     fn_est=bag_fn, fn_list=fn_list, timer=timer,
+                                                     num_series_samples=num_series_samples, writer=writer)
+                    report = e.report
 
             if report is not None:
-                self.est_report.append_row(attr_val=attr_val, lvl_val=lvl_val, run_val=run_val, est_val=est_val,
-                                           armse_p=report.ARMSE_p, armse_q=report.ARMSE_q, anees_p=report.ANEES_p,
-                                           anees_q=report.ANEES_q)
+                return (attr_val, lvl_val, run_val, est_val, report.ARMSE_p, report.ARMSE_q, report.ANEES_p,
+                        report.ANEES_q)
+        return None
+
+    @staticmethod
+    def read_bag(bag_fn, redo=False, topic_list=None, timer=None, gt_shared=False, num_series_samples=0,
+                 verbose=True):
+        """
+        the I/O part of evaluate_bag(): reads the check point (report.ini) of the bag or, if there is no valid one,
+        extracts the trajectories from the bag file; the ground truth is skipped if it is shared (`gt_shared`).
+        If `verbose`, the decision is printed.
+
+        Output:
+        report -- EvaluationReport of the check point or None
+        array_list -- list of numpy arrays, one per extracted topic, or None (check point or extraction failed)
+        """
+        if timer is None:
+            timer = StageTimer()
+        if topic_list is None:
+            topic_list = EstimatorEvaluation.topic_list
+        result_dir = EstimatorEvaluation.get_result_dir(bag_fn)
+        if result_dir is None:
+            return None, None
+
+        # check if there is already a report.ini for this estimator
+        # if it does not exist, make a report!
+        tail = os.path.basename(bag_fn)
+        report_file = result_dir + "/report.ini"
+        report = None
+        if num_series_samples > 0 and not os.path.exists(ErrorSeriesStore.get_series_fn(result_dir)):
+            if verbose:
+                print('\t\t\t\t\t-error series does not exist! evaluate: ' + str(tail))
+        elif os.path.exists(report_file) and not redo:
+            if verbose:
+                print('\t\t\t\t\t-report does exist! read from : ' + str(report_file))
+            with timer.stage('load_checkpoint', bag=bag_fn):
+                report = EstimatorEvaluation.load_checkpoint(report_file)
+            if report is None and verbose:
+                print('\t\t\t\t\t-report is invalid! evaluate: ' + str(tail))
+        else:
+            if verbose:
+                print('\t\t\t\t\t-report does not exist! evaluate: ' + str(tail))
+        if report is not None:
+            return report, None
+
+        # the messages are converted directly into numpy arrays, CSV files are only written on demand
+        with timer.stage('extract', bag=bag_fn):
+            array_list = ROSbag2Trajectory.extract(bagfile_name=bag_fn,
+                                                   topic_list=list(topic_list[1:] if gt_shared else topic_list),
+                                                   fmt=CSVFormatPose.PoseWithCov, verbose=verbose)
+        return None, array_list
+
+    @staticmethod
+    def read_bag_job(job, gt_shared=False):
+        """
+        prefetch stage of evaluate_serial(): read_bag() of a job tuple (see evaluate_bag_job())
+
+        Output:
+        prefetched -- (report, array_list), see read_bag()
+        records -- StageTimer records
+        """
+        bag_fn, redo, topic_list, num_series_samples, verbose = job[0], job[1], job[6], job[10], job[12]
+        timer = StageTimer()
+        prefetched = EstimatorEvaluation.read_bag(bag_fn, redo=redo, topic_list=topic_list, timer=timer,
+                                                  gt_shared=gt_shared, num_series_samples=num_series_samples,
+                                                  verbose=verbose)
+        return prefetched, timer.records
+
+    @staticmethod
+    def load_checkpoint(report_file):
+        # returns the EvaluationReport of a report.ini or None if the file is incomplete (e.g. written by a crashed run)
+        report = EvaluationReport()
+        try:
+            report.load(fn=report_file)
+            for name in ['ARMSE_p', 'ARMSE_q', 'ANEES_p', 'ANEES_q']:
+                setattr(report, name, float(getattr(report, name)))
+        except (KeyError, ValueError, configparser.Error):
+            return None
+        return report
 
 
 ########################################################################################################################
 #################################################### T E S T ###########################################################
 ########################################################################################################################
-# import unittest
-# import time
-#
-#
-# class EstimatorEvaluation_Test(unittest.TestCase):
-#     start_time = None
-#
-#     def start(self):
-#         self.start_time = time.time()
-#
-#     def stop(self, info="Process time"):
-#         print(str(info) + " took : " + str((time.time() - self.start_time)) + " [sec]")
-#
-#     def test_init(self):
-#         self.start()
-#         est_eval = EstimatorEvaluation("./sample_data/EVAL")
-#         self.stop('Loading + ATE')
-#         est_eval.est_report.save(fn="./sample_data/EVAL/eval.csv", save_index=False)
+import unittest
+import subprocess
+import sys
+import tempfile
+import threading
+import contextlib
+from unittest import mock
+from estimator_evaluation.BagDiscovery import BagDiscovery_Test
+
+
+class EstimatorEvaluation_Test(unittest.TestCase):
+    # the CLI imports plotting, rosbag and the trajectory evaluation only on the code paths that use them
+    lazy_modules = ['matplotlib', 'scipy', 'rosbag', 'cnspy_trajectory',
+                    'cnspy_trajectory_evaluation.TrajectoryAlignmentTypes',
+                    'estimator_evaluation.InMemoryTrajectoryEvaluation']
+
+    def test_cold_start(self):
+        # the time of the import is measured by the Benchmark ('cold_start')
+        code = str('import sys\n' +
+                   'import estimator_evaluation.EstimatorEvaluation\n' +
+                   'import estimator_evaluation.EvaluationAnalyzer\n' +
+                   'print([m for m in ' + repr(EstimatorEvaluation_Test.lazy_modules) + ' if m in sys.modules])\n')
+        env = dict(os.environ)
+        root_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        env['PYTHONPATH'] = os.pathsep.join([root_dir] + [p for p in [env.get('PYTHONPATH')] if p])
+        out = subprocess.run([sys.executable, '-c', code], env=env, capture_output=True, text=True, check=True)
+        self.assertEqual(out.stdout.strip().split('\n')[-1], '[]')
+
+    @staticmethod
+    @contextlib.contextmanager
+    def synthetic_tree(tmp_dir, num_attr, num_lvl, num_run, num_est, extract=None):
+        # the EVAL tree of empty bag files of BagDiscovery_Test.create_tree() in `tmp_dir`, yields its eval_dir while
+        # ROSbag2Trajectory.extract() is replaced by `extract` (default: extract_trajectories())
+        eval_dir = os.path.join(tmp_dir, 'EVAL')
+        BagDiscovery_Test.create_tree(eval_dir, num_attr, num_lvl, num_run, num_est)
+        if extract is None:
+            extract = EstimatorEvaluation_Test.extract_trajectories
+        with mock.patch.object(ROSbag2Trajectory, 'extract', side_effect=extract):
+            yield eval_dir
+
+    @staticmethod
+    def extract_trajectories(bagfile_name, topic_list, fmt=None, verbose=False):
+        # stand-in of ROSbag2Trajectory.extract(): the ground truth is seeded by the RUN, the estimate by the bag name
+        from estimator_evaluation import InMemoryTrajectoryEvaluation as in_memory
+        key = BagDiscovery.parse_bag_fn(bagfile_name)
+        arr_gt, arr_est = in_memory.InMemoryTrajectoryEvaluation_Test.create_trajectories(
+            num_gt=100, seed=int(''.join(key[:3])), seed_est=int(''.join(key)))
+        dict_arr = {EstimatorEvaluation.topic_list[0]: arr_gt, EstimatorEvaluation.topic_list[1]: arr_est}
+        return [dict_arr[topic] for topic in topic_list]
+
+    def test_resume(self):
+        # a run aborted after 6 of 12 bags is resumed from the journal
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            calls = []
+            crashed = []
+
+            def extract(bagfile_name, topic_list, fmt=None, verbose=False):
+                if EstimatorEvaluation.topic_list[1] not in topic_list:
+                    # the ground truth shared by the estimators of a RUN
+                    return EstimatorEvaluation_Test.extract_trajectories(bagfile_name, topic_list)
+                calls.append(bagfile_name)
+                if bagfile_name == bag_list[6] and not crashed:
+                    crashed.append(bagfile_name)
+                    raise RuntimeError("preempted")
+                return EstimatorEvaluation_Test.extract_trajectories(bagfile_name, topic_list)
+
+            with EstimatorEvaluation_Test.synthetic_tree(tmp_dir, 2, 1, 3, 2, extract=extract) as eval_dir:
+                journal_fn = os.path.join(eval_dir, 'eval_journal.jsonl')
+                # the 7th bag of the listing: the upcoming bags are read ahead by threads (see evaluate_serial())
+                bag_list = EstimatorEvaluation.find_bag_files(eval_dir)
+                with self.assertRaises(RuntimeError):
+                    EstimatorEvaluation(eval_dir, alignment_type_='se3', journal_fn=journal_fn)
+                self.assertEqual(len(EvaluationJournal(journal_fn)), 6)
+
+                # a journaled bag without report.ini (its RESULTS were removed) is evaluated again, a half written
+                # report.ini is no check point
+                journaled_bag = calls[0]
+                os.remove(os.path.join(os.path.dirname(journaled_bag), 'RESULTS', 'EST_' +
+                                       BagDiscovery.parse_bag_fn(journaled_bag)[3], 'report.ini'))
+                cut_bag = crashed[0]
+                cut_report = os.path.join(os.path.dirname(cut_bag), 'RESULTS', 'EST_' +
+                                          BagDiscovery.parse_bag_fn(cut_bag)[3], 'report.ini')
+                os.makedirs(os.path.dirname(cut_report), exist_ok=True)
+                with open(cut_report, 'w') as f:
+                    f.write('[EvaluationReport]\nanees_p = 1.2\narmse_')
+
+                calls.clear()
+                est_eval = EstimatorEvaluation(eval_dir, alignment_type_='se3', journal_fn=journal_fn)
+                self.assertEqual(sorted(calls), sorted([journaled_bag] + bag_list[6:]))
+                self.assertEqual(est_eval.progress.counts, {'evaluated': 7, 'checkpoints': 0, 'cached': 0,
+                                                            'journaled': 5, 'failed': 0})
+                # the campaign is complete: the journal is cleared, later runs use the report.ini check points
+                self.assertEqual(len(EvaluationJournal(journal_fn)), 0)
+                os.remove(os.path.join(os.path.dirname(bag_list[0]), 'RESULTS', 'EST_' +
+                                       BagDiscovery.parse_bag_fn(bag_list[0])[3], 'report.ini'))
+                calls.clear()
+                EstimatorEvaluation(eval_dir, alignment_type_='se3', journal_fn=journal_fn)
+                self.assertEqual(calls, [bag_list[0]])
+
+                calls.clear()
+                est_eval_ref = EstimatorEvaluation(eval_dir, redo=True, alignment_type_='se3')
+                self.assertEqual(len(calls), 12)
+
+        df = est_eval.est_report.data_frame.sort_values(by=['attr', 'lvl', 'run', 'est'])
+        df_ref = est_eval_ref.est_report.data_frame.sort_values(by=['attr', 'lvl', 'run', 'est'])
+        self.assertTrue(numpy.array_equal(df.values, df_ref.values))
+
+    def test_shared_ground_truth(self):
+        # the ground truth is read once per RUN, serial and in a pool, the results equal reading it from every bag
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            calls = []
+
+            def extract(bagfile_name, topic_list, fmt=None, verbose=False):
+                calls.append(tuple(topic_list))
+                return EstimatorEvaluation_Test.extract_trajectories(bagfile_name, topic_list)
+
+            with EstimatorEvaluation_Test.synthetic_tree(tmp_dir, 2, 1, 3, 4, extract=extract) as eval_dir:
+                # a check point: its RUN has 3 bags left to extract
+                bag_fn = os.path.join(eval_dir, 'ATTR_1', 'LVL_1', 'RUN_1', 'EVAL_ATTR_1_LVL_1_RUN_1_EST_1.bag')
+                os.makedirs(os.path.join(os.path.dirname(bag_fn), 'RESULTS', 'EST_1'))
+                with open(os.path.join(os.path.dirname(bag_fn), 'RESULTS', 'EST_1', 'report.ini'), 'w') as f:
+                    f.write('[EvaluationReport]\nanees_p = 1.0\nanees_q = 2.0\narmse_p = 3.0\narmse_q = 4.0\n')
+                est_eval = EstimatorEvaluation(eval_dir, alignment_type_='se3')
+                self.assertEqual(calls.count(tuple(EstimatorEvaluation.topic_list[:1])), 6)
+                self.assertEqual(calls.count(tuple(EstimatorEvaluation.topic_list[1:])), 23)
+                self.assertEqual(len(calls), 29)
+                self.assertEqual(est_eval.progress.num_done, 24)
+                self.assertEqual(est_eval.progress.counts['checkpoints'], 1)
+                calls.clear()
+                est_eval_ref = EstimatorEvaluation(eval_dir, redo=True, alignment_type_='se3', shared_gt=False)
+                self.assertEqual(calls.count(tuple(EstimatorEvaluation.topic_list)), 24)
+                keys = ['attr', 'lvl', 'run', 'est']
+                values = est_eval.est_report.data_frame.sort_values(by=keys).values
+                values_ref = est_eval_ref.est_report.data_frame.sort_values(by=keys).values
+                self.assertEqual(values[0].tolist(), [1, 1, 1, 1, 3.0, 4.0, 1.0, 2.0])
+                self.assertEqual(values[1:].tolist(), values_ref[1:].tolist())
+
+                # the pool workers evaluate the estimators with the ground truth from shared memory, the rows equal
+                # the serial evaluation
+                est_eval_pool = EstimatorEvaluation(eval_dir, redo=True, alignment_type_='se3', jobs=2)
+                est_eval_ref = EstimatorEvaluation(eval_dir, redo=True, alignment_type_='se3', jobs=1)
+            timings = est_eval_pool.timer.summary()
+            self.assertEqual(timings.loc['extract_gt', 'count'], 6)
+            self.assertEqual(timings.loc['load_gt', 'count'], 24)
+            self.assertEqual(est_eval_ref.progress.counts['evaluated'], 24)  # no check points
+        self.assertEqual(est_eval_pool.est_report.data_frame.values.tolist(),
+                         est_eval_ref.est_report.data_frame.values.tolist())
+
+    def test_batched(self):
+        # the estimators of a RUN are evaluated at once, the rows equal the evaluation one by one
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            with EstimatorEvaluation_Test.synthetic_tree(tmp_dir, 2, 1, 2, 4) as eval_dir:
+                est_eval = EstimatorEvaluation(eval_dir, alignment_type_='se3', num_series_samples=20, batched=True)
+                est_eval_ref = EstimatorEvaluation(eval_dir, redo=True, alignment_type_='se3', num_series_samples=20)
+            self.assertEqual(est_eval.timer.summary().loc['evaluate_run', 'count'], 4)
+            self.assertNotIn('evaluate_run', est_eval_ref.timer.summary().index)
+            self.assertEqual(len(est_eval.series_store), 16)
+        values = est_eval.est_report.data_frame.values
+        values_ref = est_eval_ref.est_report.data_frame.values
+        self.assertTrue(numpy.array_equal(values[:, :4], values_ref[:, :4]))
+        self.assertTrue(numpy.allclose(values, values_ref, rtol=1e-9, atol=0))
+
+    def test_journal_after_write(self):
+        # a bag is journaled after its report.ini and error series are written by the (slow) asynchronous writer
+        from estimator_evaluation.InMemoryTrajectoryEvaluation import InMemoryTrajectoryEvaluation
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            save_report = InMemoryTrajectoryEvaluation.save_report
+            journal_append = EvaluationJournal.append
+            journaled = []
+
+            def save_report_slow(report, fn_report):
+                time.sleep(0.05)
+                save_report(report, fn_report)
+
+            def append(journal, bag_fn, row):
+                result_dir = EstimatorEvaluation.get_result_dir(bag_fn)
+                self.assertTrue(os.path.exists(os.path.join(result_dir, 'report.ini')))
+                self.assertTrue(os.path.exists(ErrorSeriesStore.get_series_fn(result_dir)))
+                journaled.append(bag_fn)
+                journal_append(journal, bag_fn, row)
+
+            with EstimatorEvaluation_Test.synthetic_tree(tmp_dir, 1, 1, 2, 3) as eval_dir, \
+                    mock.patch.object(InMemoryTrajectoryEvaluation, 'save_report', side_effect=save_report_slow), \
+                    mock.patch.object(EvaluationJournal, 'append', autospec=True, side_effect=append):
+                journal_fn = os.path.join(eval_dir, 'eval_journal.jsonl')
+                for batched in [True, False]:
+                    journaled.clear()
+                    EstimatorEvaluation(eval_dir, redo=True, alignment_type_='se3', journal_fn=journal_fn,
+                                        num_series_samples=20, batched=batched, prefetch=2)
+                    self.assertEqual(len(journaled), 6)
+
+    def test_profile(self):
+        # profiling bypasses the batched evaluation, the batched bags have a 'total' time each
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            with EstimatorEvaluation_Test.synthetic_tree(tmp_dir, 1, 1, 2, 3) as eval_dir:
+                est_eval = EstimatorEvaluation(eval_dir, alignment_type_='se3', num_profiles=2, batched=True)
+                self.assertEqual(len(os.listdir(os.path.join(eval_dir, 'PROFILE'))), 2)
+                self.assertTrue(all(fn.endswith('.prof') for fn in os.listdir(os.path.join(eval_dir, 'PROFILE'))))
+                self.assertNotIn('evaluate_run', est_eval.timer.summary().index)
+
+                est_eval = EstimatorEvaluation(eval_dir, redo=True, alignment_type_='se3', batched=True)
+            timings = est_eval.timer.summary()
+            self.assertEqual(timings.loc['evaluate_run', 'count'], 2)
+            self.assertEqual(timings.loc['total', 'count'], 6)
+            self.assertAlmostEqual(timings.loc['total', 'wall'], timings.loc['evaluate_run', 'wall'])
+
+    def test_prefetch(self):
+        # the pipelined serial mode reads at most `prefetch` bags ahead and writes the same results
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            evaluate_bag = EstimatorEvaluation.evaluate_bag
+            started = []
+            read_ahead = []
+
+            def evaluate(bag_fn, **kwargs):
+                started.append(bag_fn)
+                return evaluate_bag(bag_fn, **kwargs)
+
+            def extract(bagfile_name, topic_list, fmt=None, verbose=False):
+                if EstimatorEvaluation.topic_list[1] in topic_list:
+                    read_ahead.append(bag_list.index(bagfile_name) - len(started))
+                return EstimatorEvaluation_Test.extract_trajectories(bagfile_name, topic_list)
+
+            with EstimatorEvaluation_Test.synthetic_tree(tmp_dir, 2, 2, 2, 3, extract=extract) as eval_dir, \
+                    mock.patch.object(EstimatorEvaluation, 'evaluate_bag', side_effect=evaluate):
+                bag_list = EstimatorEvaluation.find_bag_files(eval_dir)
+                est_eval = EstimatorEvaluation(eval_dir, alignment_type_='se3', keep_csv=True, num_series_samples=20,
+                                               prefetch=3)
+                self.assertEqual(len(read_ahead), 24)
+                self.assertLessEqual(max(read_ahead), 3)
+                est_eval_ref = EstimatorEvaluation(eval_dir, redo=True, alignment_type_='se3', keep_csv=True,
+                                                   num_series_samples=20, prefetch=0)
+            # all files of the asynchronous writer are done
+            for bag_fn in bag_list:
+                result_dir = EstimatorEvaluation.get_result_dir(bag_fn)
+                self.assertTrue(os.path.exists(os.path.join(result_dir, 'nees_matched_aligned.csv')))
+                self.assertIsNotNone(EstimatorEvaluation.load_checkpoint(os.path.join(result_dir, 'report.ini')))
+            self.assertEqual(len(est_eval.series_store), 24)
+        self.assertEqual(est_eval.est_report.data_frame.values.tolist(),
+                         est_eval_ref.est_report.data_frame.values.tolist())
+
+    def test_error_series(self):
+        # the series of the runs are collected into the store, also from the check points
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            with EstimatorEvaluation_Test.synthetic_tree(tmp_dir, 2, 1, 3, 2) as eval_dir:
+                EstimatorEvaluation(eval_dir, alignment_type_='se3')
+                # the check points lack the series: evaluated again
+                est_eval = EstimatorEvaluation(eval_dir, alignment_type_='se3', num_series_samples=50, jobs=2)
+            self.assertEqual(est_eval.timer.summary().loc['series', 'count'], 12)
+            est_eval_cp = EstimatorEvaluation(eval_dir, alignment_type_='se3', num_series_samples=50)
+            self.assertNotIn('extract', est_eval_cp.timer.summary().index)
+
+            store = est_eval_cp.series_store
+            self.assertEqual(len(store), 12)
+            self.assertEqual(store.series.shape, (12, 4, 50))
+            df = est_eval_cp.est_report.data_frame
+            for key, series in zip(store.keys, store.series):
+                row = df[(df[['attr', 'lvl', 'run', 'est']].values == key).all(axis=1)]
+                self.assertAlmostEqual(series[0].mean() / row['armse_p'].values[0], 1.0, delta=0.05)
+            df_env = EvaluationAnalyzer.compute_error_envelopes(store)
+            self.assertEqual(len(df_env.index), 2 * 2 * 4 * 50)
+            self.assertTrue((df_env['runs'] == 3).all())
+
+    def test_distributed(self):
+        # a coordinator and 3 worker processes sharing the work queue
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            with EstimatorEvaluation_Test.synthetic_tree(tmp_dir, 2, 2, 3, 2) as eval_dir:
+                queue_fn = os.path.join(eval_dir, 'eval_queue')
+                est_eval = EstimatorEvaluation(eval_dir, alignment_type_='se3', jobs=3, queue_fn=queue_fn,
+                                               lease_time=30.0)
+                est_eval_ref = EstimatorEvaluation(eval_dir, redo=True, alignment_type_='se3')
+            self.assertEqual(est_eval.queue.lease_time, 30.0)
+            queue = WorkQueue(queue_fn)
+            self.assertEqual(queue.get_counts(), {'done': 24})
+            self.assertLessEqual(len(queue.get_owners()), 3)
+            queue.close()
+        self.assertEqual(est_eval.est_report.data_frame.values.tolist(),
+                         est_eval_ref.est_report.data_frame.values.tolist())
+
+    def test_distributed_no_worker(self):
+        # the coordinator does not wait forever if the local workers crash or no remote worker joins
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            queue = WorkQueue(os.path.join(tmp_dir, 'eval_queue'), lease_time=60.0)
+            job_list = [(os.path.join(tmp_dir, 'EVAL_1_1_{0}_1.bag'.format(i)), False) for i in range(3)]
+            with mock.patch.object(WorkQueue, 'run_worker', side_effect=SystemExit(3)):
+                results = list(EstimatorEvaluation.evaluate_distributed(queue, [0, 1, 2], job_list, jobs=2,
+                                                                        poll_interval=0.01, worker_timeout=0.1))
+            self.assertEqual(sorted(results), [(idx, (None, [], None)) for idx in range(3)])
+            results = list(EstimatorEvaluation.evaluate_distributed(queue, [0, 1, 2], job_list, jobs=0,
+                                                                    poll_interval=0.01, worker_timeout=0.1))
+            self.assertEqual(len(results), 3)
+
+            # a job leased by a remote worker is waited for, the other jobs fail after its result
+            queue_remote = WorkQueue(queue.fn, lease_time=60.0)
+            job_list = [(job[0], True) for job in job_list]
+            id_list = queue_remote.publish(job_list)
+            job_id, job = queue_remote.claim('remote')
+            timer = threading.Timer(0.5, queue_remote.complete, args=(job_id, 'remote', [[1, 1, 0, 1], []]))
+            timer.start()
+            results = list(EstimatorEvaluation.evaluate_distributed(queue, [0, 1, 2], job_list, jobs=0,
+                                                                    poll_interval=0.01, worker_timeout=0.1))
+            timer.join()
+            self.assertEqual(job_id, id_list[0])
+            self.assertEqual(results[0], (0, ((1, 1, 0, 1), [], None)))
+            self.assertEqual(sorted(results[1:]), [(1, (None, [], None)), (2, (None, [], None))])
+            queue.close()
 
 
 ########################################################################################################################
@@ -179,7 +1270,9 @@ if __name__ == "__main__":
                         'EVAL_<ATTR_*>_<LVL_*>_<RUN_*>_<EST_*>.bag \n\t\t\t\t - RESULTS/  (will be created by ' +
                         'EstimatorEvaluation) \n\t\t\t\t\t - EST_*/\n\t\t\t\t\t\t - report.ini (check point) ' +
                         ' \n\t\t\t\t\t\t - *.csv  \n\t\t\t\t\t\t - *.png \n - eval.csv (final result)' +
-                        ' \n - eval_analyzed.csv (final result)'))
+                        ' \n - eval_analyzed.csv (final result) \n - eval_journal.jsonl (check points) ' +
+                        '\n - eval_series.npy, eval_envelopes.csv (optional)' +
+                        '\n - eval_timings.csv \n - BOXPLOTS/ (optional)'))
 
     parser.add_argument('--eval_dir', help='root directory of evaluation', default="not specified", required=True)
     parser.add_argument('--redo', help='redo the entire evaluation (ignoring check points)', action='store_true',
@@ -188,22 +1281,103 @@ if __name__ == "__main__":
                         default=False)
     parser.add_argument('--save_plot', help='store the different plots of TrajectoryEvaluation()', action='store_true',
                         default=False)
-    parser.add_argument('--alignment_type', default='se3', help='alignment types are: None, se3, sim3, posyaw, pos')
+    parser.add_argument('--alignment_type', default='se3', help='alignment types are: none, se3, sim3, posyaw, pos',
+                        choices=['none', 'se3', 'sim3', 'posyaw', 'pos'])
     parser.add_argument('--thresholds', nargs='+', type=float,
                         help='position and orientation ARMSE thresholds (<float>[m] <float>[deg]) for estimators judging',
                         required=True)
     parser.add_argument('--frames', type=int, help='# of frames for trajectory alignment, -1 = all', default=-1)
+    parser.add_argument('--jobs', type=int, help='# of parallel processes evaluating the bag files', default=1)
+    parser.add_argument('--keep_csv', help='write the intermediate CSV files of the evaluation (e.g. pose-gt.csv, '
+                                           'pose-est-cov.csv) into the RESULTS folders', action='store_true',
+                        default=False)
+    parser.add_argument('--cache', help='use a result cache (eval_cache.json) keyed on the bag files and the evaluation '
+                                        'parameters instead of the report.ini check points', action='store_true',
+                        default=False)
+    parser.add_argument('--cache_size', type=int, help='max. # of entries in the result cache, 0 = unbounded',
+                        default=0)
+    parser.add_argument('--format', help='file format of the reports: csv (default) or npz (binary, fast loading)',
+                        choices=['csv', 'npz'], default='csv')
+    parser.add_argument('--boxplots', help='renders the boxplots of all attribute/level combinations into BOXPLOTS/ '
+                                           '(headless, using --jobs processes)', action='store_true', default=False)
+    parser.add_argument('--bootstrap', type=int, help='# of bootstrap resamples for confidence intervals of the means '
+                                                      'in eval_analyzed, 0 = none', default=0)
+    parser.add_argument('--confidence', type=float, help='confidence level of the bootstrap intervals',
+                        default=0.95)
+    parser.add_argument('--profile', type=int, help='keeps the cProfile output of the N slowest bags in PROFILE/',
+                        default=0)
+    parser.add_argument('--incremental', help='only evaluates new or changed bag files (see eval_manifest.json) and '
+                                              'extends the existing reports', action='store_true', default=False)
+    parser.add_argument('--queue', help='coordinator mode: publishes the bag jobs to the work queue '
+                                        'eval_queue, evaluated by --jobs local workers and by remote workers '
+                                        '(python3 -m estimator_evaluation.WorkQueue --queue <EVAL>/eval_queue)',
+                        action='store_true', default=False)
+    parser.add_argument('--lease', type=float, help='lease time of a bag job of --queue [sec], renewed while a worker '
+                                                    'evaluates the bag; jobs of dead workers are claimed again after '
+                                                    'it', default=600.0)
+    parser.add_argument('--no_journal', help='disables the journal (eval_journal.jsonl) of the evaluated bags, which '
+                                             'lets an aborted run resume', action='store_true', default=False)
+    parser.add_argument('--series', type=int, help='keeps the error time series of each run, resampled to N steps of '
+                                                   'the normalized time, in eval_series.npy and computes their '
+                                                   'envelopes per attribute/level/estimator, 0 = none', default=0)
+    parser.add_argument('--no_shared_gt', help='reads the ground truth from every bag file, instead of once per RUN '
+                                               '(required if the bags of a RUN hold different ground truths)',
+                        action='store_true', default=False)
+    parser.add_argument('--prefetch', help='serial mode (--jobs 1): number of bag files read ahead by background '
+                                           'threads while the current one is evaluated, the result files are written '
+                                           'asynchronously (0 = off)', default=2, type=int)
+    parser.add_argument('--batch', help='evaluates all estimators of a RUN at once by vectorized operations, instead '
+                                        'of one by one (equal up to rounding, about 1e-12 relative)',
+                        action='store_true', default=False)
+    parser.add_argument('--progress', help='progress of the evaluation (bags/sec, ETA, cached/evaluated/failed bags): '
+                                           'bar (live), log (structured lines), none or auto (bar on a terminal, '
+                                           'else log)', choices=['auto', 'bar', 'log', 'none'], default='auto')
+    parser.add_argument('--progress_interval', help='seconds between two progress lines of --progress log',
+                        type=float, default=10.0)
+    parser.add_argument('--verbose', help='prints a line per bag file (check point, extraction)', action='store_true',
+                        default=False)
     args = parser.parse_args()
 
-    alignment_type = TrajectoryAlignmentTypes(str(args.alignment_type))
+    alignment_type = str(args.alignment_type)
+    fn_report = os.path.join(args.eval_dir, "eval." + args.format)
+    fn_analyzed = os.path.join(args.eval_dir, "eval_analyzed." + args.format)
     tp_start = time.time()
     est_eval = EstimatorEvaluation(eval_dir=args.eval_dir, redo=args.redo, plot=args.plot, save_plot=args.save_plot,
-                                   alignment_type_=alignment_type, frames_=args.frames)
-    est_eval.est_report.save(fn=os.path.join(args.eval_dir, "eval.csv"), save_index=False)
+                                   alignment_type_=alignment_type, frames_=args.frames, jobs=args.jobs,
+                                   cache_fn=os.path.join(args.eval_dir, "eval_cache.json") if args.cache else None,
+                                   cache_size=args.cache_size, keep_csv=args.keep_csv,
+                                   manifest_fn=os.path.join(args.eval_dir, "eval_manifest.json") if args.incremental
+                                   else None, report_fn=fn_report, num_profiles=args.profile,
+                                   journal_fn=None if args.no_journal else os.path.join(args.eval_dir,
+                                                                                        "eval_journal.jsonl"),
+                                   queue_fn=os.path.join(args.eval_dir, "eval_queue") if args.queue else None,
+                                   shared_gt=not args.no_shared_gt, num_series_samples=args.series,
+                                   prefetch=args.prefetch, batched=args.batch, progress=args.progress,
+                                   progress_interval=args.progress_interval, verbose=args.verbose,
+                                   lease_time=args.lease)
+    timer = est_eval.timer
+    with timer.stage('save_report'):
+        est_eval.est_report.save(fn=fn_report, save_index=False)
+
+    with timer.stage('statistics'):
+        eval_analyzer = EvaluationAnalyzer(fn=fn_report, rmse_p_th=args.thresholds[0], rmse_q_th=args.thresholds[1],
+                                           fn_analyzed=fn_analyzed if args.incremental else None,
+                                           groups=est_eval.affected_groups, num_resamples=args.bootstrap,
+                                           confidence=args.confidence)
+    with timer.stage('save_statistics'):
+        eval_analyzer.save(fn=fn_analyzed, save_index=True)
+    est_eval.save_manifest()
+    if est_eval.series_store is not None:
+        with timer.stage('envelopes'):
+            df_env = EvaluationAnalyzer.compute_error_envelopes(est_eval.series_store)
+            EstimatorReport.save_data_frame(df_env, os.path.join(args.eval_dir, "eval_envelopes." + args.format),
+                                            fmt=list(df_env.columns))
+    if args.boxplots:
+        with timer.stage('boxplots'):
+            eval_analyzer.render_boxplots(result_dir=os.path.join(args.eval_dir, "BOXPLOTS"), jobs=args.jobs)
 
-    eval_analyzer = EvaluationAnalyzer(fn=os.path.join(args.eval_dir, "eval.csv"), rmse_p_th=args.thresholds[0],
-                                       rmse_q_th=args.thresholds[1])
-    eval_analyzer.save(fn=os.path.join(args.eval_dir, "eval_analyzed.csv"), save_index=True)
+    timer.save(os.path.join(args.eval_dir, "eval_timings.csv"))
+    print(timer.summary())
 
     print("\nfinished after [%s sec]\n" % str(time.time() - tp_start))
     exit_success()
@@ -16,21 +16,95 @@ import os
 import pandas as pandas
 import numpy as numpy
 import copy
-from sys import version_info
 
 
 class EstimatorReport:
-    data_frame = None
+    # the rows are stored in typed column buffers (one numpy array per column) that grow geometrically; the
+    # pandas.DataFrame is only created on demand (see data_frame) and cached until the next modification.
+    columns = None  # dict: column name -> numpy array of length `capacity`
+    num_rows = 0
+    capacity = 0
+    data_frame_cache = None
+    min_capacity = 64
 
     def __init__(self):
-        self.data_frame = pandas.DataFrame(columns=EstimatorReport.get_column_format())
+        self.clear()
         pass
 
+    def clear(self):
+        self.columns = dict()
+        for name, dtype in zip(EstimatorReport.get_column_format(), EstimatorReport.get_column_dtypes()):
+            self.columns[name] = numpy.empty(0, dtype=dtype)
+        self.num_rows = 0
+        self.capacity = 0
+        self.data_frame_cache = None
+
+    def reserve(self, capacity):
+        if capacity <= self.capacity:
+            return
+        for name in EstimatorReport.get_column_format():
+            buffer = numpy.empty(capacity, dtype=self.columns[name].dtype)
+            buffer[:self.num_rows] = self.columns[name][:self.num_rows]
+            self.columns[name] = buffer
+        self.capacity = capacity
+
     def append_row(self, attr_val, lvl_val, run_val, est_val, armse_p, armse_q, anees_p, anees_q):
-        df = pandas.DataFrame([[attr_val, lvl_val, run_val, est_val, armse_p, armse_q, anees_p, anees_q]],
-                              columns=EstimatorReport.get_column_format())
-        # print(df)
-        self.data_frame = self.data_frame.append(df)
+        if self.num_rows == self.capacity:
+            # grow geometrically: amortized O(1) per appended row
+            self.reserve(max(2 * self.capacity, EstimatorReport.min_capacity))
+
+        idx = self.num_rows
+        self.columns['attr'][idx] = int(attr_val)
+        self.columns['lvl'][idx] = int(lvl_val)
+        self.columns['run'][idx] = int(run_val)
+        self.columns['est'][idx] = int(est_val)
+        self.columns['armse_p'][idx] = float(armse_p)
+        self.columns['armse_q'][idx] = float(armse_q)
+        self.columns['anees_p'][idx] = float(anees_p)
+        self.columns['anees_q'][idx] = float(anees_q)
+        self.num_rows += 1
+        self.data_frame_cache = None
+
+    def remove_rows(self, key_list):
+        """
+        removes the rows matching the given keys [(attr, lvl, run, est), ...]; the order of the remaining rows is kept.
+
+        Output:
+        num_removed -- number of removed rows
+        """
+        if not key_list or self.num_rows == 0:
+            return 0
+        keys = EstimatorReport.get_column_format()[:4]
+        index = pandas.MultiIndex.from_arrays([self.columns[name][:self.num_rows] for name in keys])
+        keep = ~index.isin([tuple(int(v) for v in key) for key in key_list])
+        num_rows = int(numpy.count_nonzero(keep))
+        if num_rows == self.num_rows:
+            return 0
+        for name in EstimatorReport.get_column_format():
+            self.columns[name][:num_rows] = self.columns[name][:self.num_rows][keep]
+        num_removed = self.num_rows - num_rows
+        self.num_rows = num_rows
+        self.data_frame_cache = None
+        return num_removed
+
+    @property
+    def data_frame(self):
+        if self.data_frame_cache is None:
+            fmt = EstimatorReport.get_column_format()
+            self.data_frame_cache = pandas.DataFrame({name: self.columns[name][:self.num_rows] for name in fmt},
+                                                     columns=fmt)
+        return self.data_frame_cache
+
+    @data_frame.setter
+    def data_frame(self, df):
+        self.clear()
+        if df is None:
+            return
+        num_rows = len(df.index)
+        self.reserve(num_rows)
+        for name in EstimatorReport.get_column_format():
+            self.columns[name][:num_rows] = df[name].to_numpy()
+        self.num_rows = num_rows
 
     def save(self, fn, save_index=False):
         EstimatorReport.save_data_frame(data_frame=self.data_frame, fn=fn,
@@ -64,15 +138,7 @@ class EstimatorReport:
         return self.get_unique_values('est')
 
     def get_unique_values(self, column):
-        if self.data_frame is not None:
-            df_attr = self.data_frame.get([column])
-            if version_info[0] < 3:
-                return numpy.unique(df_attr.values)
-            else:
-                return numpy.unique(df_attr.to_numpy())
-
-        else:
-            return []
+        return numpy.unique(self.columns[column][:self.num_rows])
 
     def get_num(self, column):
         return self.get_unique_values(column).size
@@ -81,34 +147,132 @@ class EstimatorReport:
     def get_column_format():
         return ['attr', 'lvl', 'run', 'est', 'armse_p', 'armse_q', 'anees_p', 'anees_q']
 
+    @staticmethod
+    def get_column_dtypes():
+        return [numpy.int64, numpy.int64, numpy.int64, numpy.int64, numpy.float64, numpy.float64, numpy.float64,
+                numpy.float64]
+
+    @staticmethod
+    def is_binary_format(fn):
+        # the file format is chosen by the file extension: '.npz' -> binary columnar format, otherwise CSV
+        return str(fn).lower().endswith('.npz')
+
+    @staticmethod
+    def read_header(fn):
+        # the column names stored in the file (without the index column)
+        if EstimatorReport.is_binary_format(fn):
+            with numpy.load(fn, allow_pickle=False) as data:
+                return list(data.files)
+        with open(fn, 'r') as f:
+            header = [name.strip() for name in f.readline().lstrip('#').split(',')]
+        if header and header[0] == 'idx':
+            header = header[1:]
+        return header
+
     @staticmethod
     def load_data_frame(fn, fmt):
+        if EstimatorReport.is_binary_format(fn):
+            return EstimatorReport.load_binary(fn, fmt)
+
         header = fmt
 
         data = pandas.read_csv(fn, sep='\s+|\,', comment='#', header=None, names=header,
                                engine='python')
         return data
 
+    @staticmethod
+    def merge(fn_list, campaign_list=None, cache=False):
+        """
+        combines many reports into one pandas.DataFrame having a leading 'campaign' column. A CSV report is read from
+        its binary equivalent (same name, '.npz') if that one is not older; with `cache` the binary equivalent of a
+        parsed CSV report is written, thus the next merge needs no parsing.
+
+        Input:
+        fn_list -- list of report file names (eval.csv or eval.npz)
+        campaign_list -- list of unique campaign keys (one per report), default: the directory of the report relative
+                         to the common directory of all reports (e.g. 'v1.2/EVAL')
+
+        Output:
+        df -- pandas.DataFrame: columns campaign, attr, lvl, run, est, armse_p, armse_q, anees_p, anees_q
+        """
+        if campaign_list is None:
+            dir_list = [os.path.dirname(os.path.abspath(fn)) for fn in fn_list]
+            if len(dir_list) > 1:
+                common_dir = os.path.commonpath(dir_list)
+                campaign_list = [os.path.relpath(dir_name, common_dir) for dir_name in dir_list]
+            else:
+                campaign_list = [os.path.basename(dir_name) for dir_name in dir_list]
+        campaign_list = [str(campaign) for campaign in campaign_list]
+        if len(campaign_list) != len(fn_list):
+            raise ValueError("EstimatorReport: one campaign key per report is needed")
+        if len(set(campaign_list)) != len(campaign_list):
+            raise ValueError("EstimatorReport: the campaign keys are not unique: " + str(campaign_list))
+
+        fmt = EstimatorReport.get_column_format()
+        df_list = []
+        for fn in fn_list:
+            fn_bin = os.path.splitext(fn)[0] + '.npz'
+            if EstimatorReport.is_binary_format(fn) or \
+                    (os.path.exists(fn_bin) and os.path.getmtime(fn_bin) >= os.path.getmtime(fn)):
+                df = EstimatorReport.load_binary(fn_bin, fmt)
+            else:
+                df = EstimatorReport.load_data_frame(fn, fmt)
+                if cache:
+                    EstimatorReport.save_data_frame(df, fn_bin, fmt)
+            df_list.append(df)
+
+        sizes = [len(df.index) for df in df_list]
+        dict_columns = {'campaign': numpy.repeat(numpy.array(campaign_list, dtype=object), sizes)}
+        for name, dtype in zip(fmt, EstimatorReport.get_column_dtypes()):
+            dict_columns[name] = numpy.concatenate([df[name].to_numpy(dtype=dtype) for df in df_list]) \
+                if df_list else numpy.empty(0, dtype=dtype)
+        return pandas.DataFrame(dict_columns, columns=['campaign'] + fmt)
+
     @staticmethod
     def save_data_frame(data_frame, fn, fmt, save_index=False):
         head = os.path.dirname(os.path.abspath(fn))
         if not os.path.exists(head):
             os.makedirs(head)
+        # written to a temporary file and renamed: an aborted run never leaves a half written report
+        fn_tmp = fn + '.tmp'
+        if EstimatorReport.is_binary_format(fn):
+            EstimatorReport.save_binary(data_frame, fn_tmp, fmt)
+            os.replace(fn_tmp, fn)
+            return
         # list.copy() does not exist prior python 3.3
         header = copy.deepcopy(fmt)
         if not save_index:
             header[0] = '#' + header[0]  # add comment
 
         df = data_frame.reset_index()
-        df.to_csv(fn, sep=',', index=save_index, index_label='#idx',
+        df.to_csv(fn_tmp, sep=',', index=save_index, index_label='#idx',
                   header=header, columns=fmt)
-        pass
+        os.replace(fn_tmp, fn)
+
+    @staticmethod
+    def load_binary(fn, fmt):
+        # one typed array per column, no parsing needed
+        with numpy.load(fn, allow_pickle=False) as data:
+            return pandas.DataFrame({name: data[name] for name in fmt}, columns=list(fmt))
+
+    @staticmethod
+    def save_binary(data_frame, fn, fmt):
+        dict_columns = dict()
+        for name in fmt:
+            values = data_frame[name].to_numpy()
+            if values.dtype == object:
+                values = values.astype(str)  # e.g. the 'failure' column of the EvaluationAnalyzer
+            dict_columns[name] = values
+        # numpy.savez appends '.npz' to the file name if it is missing, thus a file handle is used
+        with open(fn, 'wb') as f:
+            numpy.savez(f, **dict_columns)
 
 
 ########################################################################################################################
 #################################################### T E S T ###########################################################
 ########################################################################################################################
 import unittest
+import tempfile
 
 
 class EstimatorReport_Test(unittest.TestCase):
@@ -136,6 +300,70 @@ class EstimatorReport_Test(unittest.TestCase):
         print("run: \n\t" + str(report.get_run_values()))
         print("estimators: \n\t" + str(report.get_est_values()))
 
+    def test_append_row(self):
+        # the rows are buffered (see Benchmark for the time of appending 1e6 rows)
+        report = EstimatorReport()
+        for i in range(20000):
+            report.append_row(attr_val=i % 3, lvl_val=i % 5, run_val=i, est_val=i % 7, armse_p=0.1 * i,
+                              armse_q=0.2 * i, anees_p=0.3 * i, anees_q=0.4 * i)
+            if i == 9999:
+                self.assertEqual(len(report.data_frame.index), 10000)
+        self.assertEqual(len(report.data_frame.index), 20000)
+        self.assertEqual(report.get_run_num(), 20000)
+        self.assertEqual(report.get_est_num(), 7)
+        self.assertAlmostEqual(report.data_frame['anees_q'].values[-1], 0.4 * 19999)
+
+    def test_remove_rows(self):
+        report = EstimatorReport()
+        for i in range(10):
+            report.append_row(1, 1, i, i % 2, i, 0, 0, 0)
+        self.assertEqual(report.remove_rows([(1, 1, 2, 0), (1, 1, 3, 1), (1, 1, 3, 0)]), 2)
+        self.assertEqual(list(report.data_frame['run']), [0, 1, 4, 5, 6, 7, 8, 9])
+        self.assertEqual(list(report.data_frame['armse_p']), [0, 1, 4, 5, 6, 7, 8, 9])
+        self.assertEqual(report.remove_rows([]), 0)
+
+    def test_load_binary(self):
+        # the binary report holds the same table as the CSV report (see Benchmark for the load times of 1e6 rows)
+        rng = numpy.random.default_rng(0)
+        num_rows = 10000
+        report = EstimatorReport()
+        report.data_frame = pandas.DataFrame({'attr': rng.integers(1, 10, num_rows),
+                                              'lvl': rng.integers(1, 10, num_rows),
+                                              'run': numpy.arange(num_rows), 'est': rng.integers(1, 10, num_rows),
+                                              'armse_p': rng.random(num_rows), 'armse_q': rng.random(num_rows),
+                                              'anees_p': rng.random(num_rows), 'anees_q': rng.random(num_rows)})
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            report.save(os.path.join(tmp_dir, 'eval.csv'))
+            report.save(os.path.join(tmp_dir, 'eval.npz'))
+            report_csv = EstimatorReport()
+            report_csv.load(os.path.join(tmp_dir, 'eval.csv'))
+            report_npz = EstimatorReport()
+            report_npz.load(os.path.join(tmp_dir, 'eval.npz'))
+        self.assertTrue(report_npz.data_frame.equals(report.data_frame))
+        self.assertTrue(numpy.allclose(report_csv.data_frame.values, report.data_frame.values))
+
+    def test_merge(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            report = EstimatorReport()
+            report.load("./sample_data/EVAL/eval.csv")
+            fn_list = []
+            for release in ['v1', 'v2']:
+                fn = os.path.join(tmp_dir, release, 'eval.csv')
+                report.save(fn)
+                fn_list.append(fn)
+
+            df = EstimatorReport.merge(fn_list, cache=True)
+            self.assertEqual(list(df.columns), ['campaign'] + EstimatorReport.get_column_format())
+            self.assertEqual(list(df['campaign'].unique()), ['v1', 'v2'])
+            df_v2 = df[df['campaign'] == 'v2'].drop(columns='campaign').reset_index(drop=True)
+            self.assertTrue(numpy.allclose(df_v2.values, report.data_frame.values))
+            # the second merge reads the cached binary reports
+            self.assertTrue(os.path.exists(os.path.join(tmp_dir, 'v1', 'eval.npz')))
+            self.assertTrue(EstimatorReport.merge(fn_list, ['a', 'b']).drop(columns='campaign').equals(
+                df.drop(columns='campaign')))
+            with self.assertRaises(ValueError):
+                EstimatorReport.merge(fn_list, ['a', 'a'])
+
 
 if __name__ == "__main__":
     unittest.main()
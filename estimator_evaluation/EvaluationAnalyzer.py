@@ -17,11 +17,10 @@ import time
 import pandas as pandas
 import numpy as numpy
 import argparse
-from cnspy_numpy_utils.numpy_statistics import numpy_statistics
-from sys import version_info
-import matplotlib.pyplot as plt
+import multiprocessing
 
 from estimator_evaluation.EstimatorReport import EstimatorReport
+from estimator_evaluation.ErrorSeriesStore import ErrorSeriesStore
 
 
 class AnalyzerPlotConfig:
@@ -45,6 +44,7 @@ class AnalyzerPlotConfig:
 
     @staticmethod
     def show_save_figure(cfg, fig):
+        import matplotlib.pyplot as plt
         plt.draw()
         plt.pause(0.001)
         if cfg.save_fn:
@@ -66,23 +66,60 @@ class EvaluationAnalyzer:
     rmse_p_th = 0
     rmse_q_th = 0
 
-    def __init__(self, fn, rmse_p_th=0, rmse_q_th=0):
+    # bootstrap confidence intervals of the means (see compute_bootstrap_intervals()), disabled if 0 resamples
+    num_resamples = 0
+    confidence = 0.95
+
+    # private data member: row positions of the groups (attr, lvl) and (attr, lvl, est) in est_report.data_frame
+    group_index = None
+    group_index_df = None  # the data frame the index was built for
+
+    def __init__(self, fn, rmse_p_th=0, rmse_q_th=0, fn_analyzed=None, groups=None, num_resamples=0,
+                 confidence=0.95):
+        self.est_report = EstimatorReport()
         self.est_report.load(fn)
-        self.data_frame_analyzer = pandas.DataFrame(columns=EvaluationAnalyzer.get_column_format())
+        self.invalidate_index()
         self.rmse_p_th = rmse_p_th
         self.rmse_q_th = rmse_q_th
-        self.data_frame_analyzer = self.compute_statistics()
+        self.num_resamples = int(num_resamples)
+        self.confidence = confidence
+        self.data_frame_analyzer = pandas.DataFrame(columns=self.get_result_format())
+        incremental = False
+        if fn_analyzed and groups is not None and os.path.exists(fn_analyzed):
+            # incremental: only the statistics of the given groups are computed again (if the columns still match)
+            self.load(fn_analyzed)
+            incremental = list(self.data_frame_analyzer.columns) == self.get_result_format()
+        if incremental:
+            self.data_frame_analyzer = self.update_statistics(groups)
+        else:
+            self.data_frame_analyzer = self.compute_statistics()
+
+    def invalidate_index(self):
+        self.group_index = None
+        self.group_index_df = None
+
+    def get_group_index(self):
+        """
+        returns a dict mapping the keys (attr, lvl) and (attr, lvl, est) to the row positions of these groups in
+        est_report.data_frame. The index is built once and rebuilt if the report changed (e.g. it was reloaded).
+        """
+        df = self.est_report.data_frame
+        if self.group_index is None or self.group_index_df is not df:
+            self.group_index = dict()
+            if not df.empty:
+                self.group_index.update(df.groupby(['attr', 'lvl'], sort=False).indices)
+                self.group_index.update(df.groupby(['attr', 'lvl', 'est'], sort=False).indices)
+            self.group_index_df = df
+        return self.group_index
 
     def get_dataframe_at(self, attr, lvl, est=None):
         if est is None:
-            df = self.est_report.data_frame
-            df = df.loc[df['attr'] == attr]
-            return df.loc[df['lvl'] == lvl]
+            key = (attr, lvl)
         else:
-            df = self.est_report.data_frame
-            df = df.loc[df['attr'] == attr]
-            df = df.loc[df['lvl'] == lvl]
-            return df.loc[df['est'] == est]
+            key = (attr, lvl, est)
+        group_index = self.get_group_index()
+        df = self.est_report.data_frame
+        return df.iloc[group_index.get(key, numpy.empty(0, dtype=numpy.int64))]
 
     # def boxplot_at(self, attr, lvl, est=None):
     #     df = self.get_dataframe_at(attr, lvl, est)
@@ -92,6 +129,7 @@ class EvaluationAnalyzer:
 
     def boxplot_at(self, attr, lvl, fig=None, cfg=AnalyzerPlotConfig()):
         if fig is None:
+            import matplotlib.pyplot as plt
             fig = plt.figure(figsize=(20, 15), dpi=int(cfg.dpi))
 
         df = self.get_dataframe_at(attr, lvl)
@@ -105,6 +143,72 @@ class EvaluationAnalyzer:
             fig.suptitle(cfg.title, fontsize=16)
             AnalyzerPlotConfig.show_save_figure(cfg, fig)
 
+    def render_boxplots(self, result_dir, jobs=1, cfg=AnalyzerPlotConfig(), fmt='png'):
+        """
+        renders the boxplots of all (attr, lvl) combinations without a display (Agg canvas, no pyplot state) into
+        `result_dir`, one file per figure, using `jobs` processes.
+
+        Output:
+        fn_list -- list of the written files, sorted by (attr, lvl)
+        """
+        if not os.path.exists(result_dir):
+            os.makedirs(os.path.abspath(result_dir))
+
+        job_list = []
+        df = self.est_report.data_frame
+        for (attr, lvl), df_ in df.groupby(['attr', 'lvl'], sort=True):
+            est_values = []
+            data = dict()
+            for metric in EvaluationAnalyzer.get_metric_columns():
+                data[metric] = []
+            for est, df_est in df_.groupby('est', sort=True):
+                est_values.append(est)
+                for metric in EvaluationAnalyzer.get_metric_columns():
+                    data[metric].append(df_est[metric].to_numpy(dtype=float))
+            fn = os.path.join(result_dir, "boxplot_attr_{0}_lvl_{1}.{2}".format(attr, lvl, fmt))
+            job_list.append((attr, lvl, est_values, data, fn, cfg.dpi))
+
+        if jobs > 1 and len(job_list) > 1:
+            with multiprocessing.Pool(processes=min(jobs, len(job_list))) as pool:
+                fn_list = list(pool.imap(EvaluationAnalyzer.render_boxplot_job, job_list, chunksize=1))
+        else:
+            fn_list = [EvaluationAnalyzer.render_boxplot_job(job) for job in job_list]
+        print("EvaluationAnalyzer: rendered " + str(len(fn_list)) + " boxplots into " + str(result_dir))
+        return fn_list
+
+    @staticmethod
+    def render_boxplot_job(job):
+        return EvaluationAnalyzer.render_boxplot(*job)
+
+    @staticmethod
+    def render_boxplot(attr, lvl, est_values, data, fn, dpi=200):
+        """
+        draws the same boxplot as boxplot_at() on an object-oriented figure with an Agg canvas; the figure is not
+        registered in pyplot and is released after saving.
+
+        Input:
+        est_values -- list of estimator ids
+        data -- dict: metric -> list of arrays (one per estimator)
+        fn -- file name of the figure
+        """
+        from matplotlib.figure import Figure
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+        fig = Figure(figsize=(20, 15), dpi=int(dpi))
+        FigureCanvasAgg(fig)
+        for i, metric in enumerate(EvaluationAnalyzer.get_metric_columns()):
+            ax = fig.add_subplot(2, 2, i + 1)
+            ax.boxplot(data[metric], showmeans=True, meanline=True)
+            ax.set_xticks(range(1, len(est_values) + 1))
+            ax.set_xticklabels([str(e) for e in est_values])
+            ax.set_title(metric)
+            ax.set_xlabel('est')
+            ax.grid(True)
+        fig.suptitle("Attr:{0}, Lvl:{1}".format(attr, lvl), fontsize=16)
+        fig.savefig(fn, dpi=int(dpi))
+        fig.clear()
+        return fn
+
     # TODO: do what ever here!
     def compute_average_over_runs(self, attr, lvl, est):
         df = self.get_dataframe_at(attr, lvl, est)
@@ -122,89 +226,281 @@ class EvaluationAnalyzer:
         if df.empty:
             return pandas.DataFrame()
 
-        dict_ale = {'attr': attr, 'lvl': lvl, 'est': est}
-        df_ale = pandas.DataFrame.from_dict(dict_ale, orient='index').T
-        # print(df_ale)
-
-        # get normalized dataframe
-        armse_p_norm = {'armse_p': df['armse_p'].values / numpy.max(df['armse_p'].values)}
-        df_armse_p_norm = pandas.DataFrame.from_dict(armse_p_norm, orient='index').T
-        armse_q_norm = {'armse_q': df['armse_q'].values / numpy.max(df['armse_q'].values)}
-        df_armse_q_norm = pandas.DataFrame.from_dict(armse_q_norm, orient='index').T
-        anees_p_norm = {'anees_p': df['anees_p'].values / numpy.max(df['anees_p'].values)}
-        df_anees_p_norm = pandas.DataFrame.from_dict(anees_p_norm, orient='index').T
-        anees_q_norm = {'anees_q': df['anees_q'].values / numpy.max(df['anees_q'].values)}
-        df_anees_q_norm = pandas.DataFrame.from_dict(anees_q_norm, orient='index').T
-        df_norm = pandas.concat([df_armse_p_norm, df_armse_q_norm, df_anees_p_norm, df_anees_q_norm], axis=1)
-        # print df_norm
-
-        # sum up the columns of the normalized dataframe and append to it
-        df_norm.insert(len(df_norm.columns), 'norm_sum', df_norm.sum(axis=1, skipna=True).values)
-        # reindex normailized dataframe
-        df_norm.index = df.index
-        # print df_norm
-
-        # remove outliers removing always the 10% of the worse runs if numbers of run smaller than 10 just remove
-        # the worse run. The worse run is defined as the one for which the normalized sum of the armse_p, armse_q,
-        # anees_p, annes_q is maximum
-        num_runs = self.est_report.get_run_num()
-        num_rm = num_runs / 10
-        if int(num_rm) > 0:
-            for i in range(0, int(num_rm)):
-                # to make it works iteratively i first need to drop elements from df and then drop the same element
-                # from df_norm such that the next iteration it finds the next maximum
-                df.drop(df.loc[df_norm['norm_sum'] == df_norm['norm_sum'].max()].index, inplace=True)
-                df_norm.drop(df_norm.loc[df_norm['norm_sum'] == df_norm['norm_sum'].max()].index, inplace=True)
-        else:
-            if num_runs > 1:
-                df.drop(df.loc[df_norm['norm_sum'] == df_norm['norm_sum'].max()].index, inplace=True)
-
-        # numpy statistics automatically computes rmse, mean, median, std, min, max, ...
-        stat_armes_p = numpy_statistics(df['armse_p'].values, 'armse_p')
-        df_stat_armes_p = pandas.DataFrame.from_dict(stat_armes_p, orient='index').T
-        stat_armes_q = numpy_statistics(df['armse_q'].values, 'armse_q')
-        df_stat_armes_q = pandas.DataFrame.from_dict(stat_armes_q, orient='index').T
-        stat_anees_p = numpy_statistics(df['anees_p'].values, 'anees_p')
-        # normalize anees given the state dimension (=3)
-        stat_anees_p['anees_p.mean'] = stat_anees_p['anees_p.mean'] / 3
-        df_stat_anees_p = pandas.DataFrame.from_dict(stat_anees_p, orient='index').T
-        stat_anees_q = numpy_statistics(df['anees_q'].values, 'anees_q')
-        # normalize anees given the state dimension (=3)
-        stat_anees_q['anees_q.mean'] = stat_anees_q['anees_q.mean'] / 3
-        df_stat_anees_q = pandas.DataFrame.from_dict(stat_anees_q, orient='index').T
-        df_res = pandas.concat([df_ale, df_stat_armes_p, df_stat_armes_q, df_stat_anees_p, df_stat_anees_q], axis=1)
-        # print df_res
+        df_res = EvaluationAnalyzer.compute_group_statistics(df, num_runs=self.est_report.get_run_num(),
+                                                            num_resamples=self.num_resamples,
+                                                            confidence=self.confidence)
+        EvaluationAnalyzer.judge(df_res, self.rmse_p_th, self.rmse_q_th)
+        return df_res[self.get_result_format()]
 
-        # estimator judging based on the given thresholds
-        if ((df_res['armse_p.mean'].values > self.rmse_p_th) | (df_res['armse_q.mean'].values > self.rmse_q_th)):
-            df_res.insert(len(df_res.columns), 'failure', "True")
-        else:
-            df_res.insert(len(df_res.columns), 'failure', "False")
+    def compute_average(self):
+        # only existing (attr, lvl, est) groups, in the order of the sorted unique values
+        keys = sorted(key for key in self.get_group_index().keys() if len(key) == 3)
+        df_list = [self.compute_average_over_runs(a, l, e) for (a, l, e) in keys]
+        if not df_list:
+            return pandas.DataFrame()
+        return pandas.concat(df_list).reset_index(drop=True)
 
-        return df_res
+    def compute_statistics(self):
+        df_res = EvaluationAnalyzer.compute_group_statistics(self.est_report.data_frame,
+                                                            num_runs=self.est_report.get_run_num(),
+                                                            num_resamples=self.num_resamples,
+                                                            confidence=self.confidence)
+        EvaluationAnalyzer.judge(df_res, self.rmse_p_th, self.rmse_q_th)
+        return df_res[self.get_result_format()]
+
+    def update_statistics(self, groups):
+        """
+        recomputes the statistics of the given (attr, lvl, est) groups and keeps the ones of all other groups in
+        data_frame_analyzer. Requires that the number of runs did not change, since it defines the number of outliers.
+        """
+        keys = EvaluationAnalyzer.get_group_keys()
+        fmt = self.get_result_format()
+        groups = [tuple(int(v) for v in group) for group in groups]
+
+        df_old = self.data_frame_analyzer.reset_index(drop=True)
+        in_groups = pandas.MultiIndex.from_frame(df_old[keys]).isin(groups)
+        df_list = [df_old.loc[~in_groups, [col for col in fmt if col != 'failure']]]
+
+        group_index = self.get_group_index()
+        pos_list = [group_index[group] for group in groups if group in group_index]
+        if pos_list:
+            df = self.est_report.data_frame.iloc[numpy.sort(numpy.concatenate(pos_list))]
+            df_list.append(EvaluationAnalyzer.compute_group_statistics(df, num_runs=self.est_report.get_run_num(),
+                                                                        keys=keys, num_resamples=self.num_resamples,
+                                                                        confidence=self.confidence))
+
+        df_res = pandas.concat(df_list).sort_values(by=keys).reset_index(drop=True)
+        for key in keys:
+            df_res[key] = df_res[key].astype(numpy.int64)
+        EvaluationAnalyzer.judge(df_res, self.rmse_p_th, self.rmse_q_th)
+        return df_res[fmt]
 
-    def compute_average(self):
-        df = pandas.DataFrame()
-        for a in self.est_report.get_attr_values():
-            for l in self.est_report.get_lvl_values():
-                for e in self.est_report.get_est_values():
-                    df_ = self.compute_average_over_runs(a, l, e)
-                    if not df_.empty:
-                        df = df.append(df_)
+    @staticmethod
+    def get_num_outliers(num_runs):
+        # remove always the 10% of the worse runs if numbers of run smaller than 10 just remove the worse run.
+        num_rm = int(num_runs / 10)
+        if num_rm > 0:
+            return num_rm
+        elif num_runs > 1:
+            return 1
+        return 0
 
-        return df.reset_index(drop=True)
+    @staticmethod
+    def get_outlier_mask(df, num_rm, keys=None):
+        """
+        marks the outliers of each group in a single pass: the worse run is defined as the one for which the
+        normalized sum (normalized by the maximum of the group) of the armse_p, armse_q, anees_p, annes_q is maximum.
+        Iteratively removing the `num_rm` worst runs (including ties) is equal to removing all runs having one of the
+        `num_rm` largest normalized sums (dense rank).
+
+        Input:
+        df -- pandas.DataFrame holding the EstimatorReport columns
+        num_rm -- number of outliers to be removed per group, or an array holding it per row (e.g. per campaign)
+        keys -- list of columns defining a group, default: ['attr', 'lvl', 'est']
+
+        Output:
+        mask -- numpy boolean array, True for outliers
+        """
+        if keys is None:
+            keys = EvaluationAnalyzer.get_group_keys()
+        if numpy.all(numpy.asarray(num_rm) < 1) or df.empty:
+            return numpy.zeros(len(df.index), dtype=bool)
+
+        metrics = EvaluationAnalyzer.get_metric_columns()
+        values = df[metrics].to_numpy(dtype=float)
+        group_ids = df.groupby(keys, sort=False).ngroup().to_numpy()
+        max_values = numpy.full((group_ids.max() + 1, len(metrics)), -numpy.inf)
+        numpy.maximum.at(max_values, group_ids, values)
+
+        with numpy.errstate(divide='ignore', invalid='ignore'):
+            norm_sum = numpy.nansum(values / max_values[group_ids], axis=1)
+
+        rank = pandas.Series(norm_sum).groupby(group_ids).rank(method='dense', ascending=False).to_numpy()
+        return rank <= num_rm
 
-    def compute_statistics(self):
-        df = pandas.DataFrame()
-        for a in self.est_report.get_attr_values():
-            for l in self.est_report.get_lvl_values():
-                for e in self.est_report.get_est_values():
+    @staticmethod
+    def compute_group_statistics(df, num_runs, keys=None, num_resamples=0, confidence=0.95, seed=0):
+        """
+        computes the statistics (see numpy_statistics) of the metrics per group after removing the outliers. The
+        mean of the ANEES is normalized by the state dimension (=3).
+
+        Input:
+        df -- pandas.DataFrame holding the EstimatorReport columns
+        num_runs -- number of runs, defines the number of outliers (see get_num_outliers()), or an array holding the
+                    number of runs per row, if the groups stem from reports of different sizes (e.g. campaigns)
+        keys -- list of columns defining a group, default: ['attr', 'lvl', 'est']
+        num_resamples -- if > 0, bootstrap confidence intervals of the means are added (see get_interval_columns())
+        confidence -- confidence level of the intervals
+        seed -- seed of the bootstrap resampling
+
+        Output:
+        df_res -- pandas.DataFrame: one row per group, sorted by the keys
+        """
+        if keys is None:
+            keys = EvaluationAnalyzer.get_group_keys()
+
+        # keep groups that lose all their runs (their statistics become NaN)
+        group_index = df.groupby(keys, sort=True).size().index
+        if numpy.ndim(num_runs) > 0:
+            runs_values, runs_inverse = numpy.unique(numpy.asarray(num_runs), return_inverse=True)
+            num_rm = numpy.array([EvaluationAnalyzer.get_num_outliers(n) for n in runs_values],
+                                 dtype=numpy.int64)[runs_inverse]
+        else:
+            num_rm = EvaluationAnalyzer.get_num_outliers(num_runs)
+        outliers = EvaluationAnalyzer.get_outlier_mask(df, num_rm, keys)
+        df = df.loc[~outliers]
+
+        grouped = df.groupby(keys, sort=True)
+        dict_res = dict()
+        for metric in EvaluationAnalyzer.get_metric_columns():
+            values = df[metric].astype(float)
+            count = grouped[metric].count()
+            std = grouped[metric].std(ddof=0)
+            dict_res[metric + '.pairs'] = count.astype(float)
+            dict_res[metric + '.rmse'] = numpy.sqrt((values * values).groupby([df[k] for k in keys]).sum() / count)
+            dict_res[metric + '.mean'] = grouped[metric].mean()
+            dict_res[metric + '.median'] = grouped[metric].median()
+            dict_res[metric + '.std'] = std
+            dict_res[metric + '.var'] = numpy.square(std)
+            dict_res[metric + '.min'] = grouped[metric].min().astype(float)
+            dict_res[metric + '.max'] = grouped[metric].max().astype(float)
+
+        df_res = pandas.DataFrame(dict_res).reindex(group_index)
+        for metric in EvaluationAnalyzer.get_metric_columns():
+            df_res[metric + '.pairs'] = df_res[metric + '.pairs'].fillna(0.0)
+
+        if num_resamples > 0:
+            df_ci = EvaluationAnalyzer.compute_bootstrap_intervals(df, keys, num_resamples=num_resamples,
+                                                                   confidence=confidence, seed=seed)
+            df_res = df_res.join(df_ci.reindex(group_index))
 
-                    df_ = self.compute_statistics_over_runs(a, l, e)
-                    if not df_.empty:
-                        df = df.append(df_)
+        # normalize anees given the state dimension (=3)
+        for col in ['anees_p.mean', 'anees_q.mean'] + (['anees_p.ci_low', 'anees_p.ci_high', 'anees_q.ci_low',
+                                                        'anees_q.ci_high'] if num_resamples > 0 else []):
+            df_res[col] = df_res[col] / 3
+        return df_res.reset_index()
 
-        return df.reset_index(drop=True)
+    @staticmethod
+    def compute_bootstrap_intervals(df, keys, num_resamples=1000, confidence=0.95, seed=0, chunk_size=262144):
+        """
+        percentile bootstrap confidence intervals of the mean of each metric per group. All groups are resampled
+        at once: the rows are sorted by group and, for a chunk of resamples, a matrix of random row indices (within
+        the group of each row) is drawn. The indices are turned into draw counts per row (numpy.bincount), and the
+        resampled means are the segment sums (numpy.add.reduceat) of counts * values divided by the group sizes. A
+        chunk holds about `chunk_size` resampled rows (small chunks stay in the cache).
+
+        Output:
+        df_ci -- pandas.DataFrame indexed by the keys: columns <metric>.ci_low, <metric>.ci_high
+        """
+        metrics = EvaluationAnalyzer.get_metric_columns()
+        grouped = df.groupby(keys, sort=True)
+        group_ids = grouped.ngroup().to_numpy()
+        order = numpy.argsort(group_ids, kind='stable')
+        values = df[metrics].to_numpy(dtype=float)[order].T.copy()  # [metric x row]
+        sizes = numpy.bincount(group_ids)
+        starts = numpy.concatenate(([0], numpy.cumsum(sizes)[:-1]))
+        # first row and size of the group of each (sorted) row
+        row_start = numpy.repeat(starts, sizes)
+        row_size = numpy.repeat(sizes, sizes)
+
+        rng = numpy.random.default_rng(seed)
+        num_rows = len(group_ids)
+        num_chunk = max(1, chunk_size // max(1, num_rows))
+        offsets = numpy.arange(num_chunk)[:, None] * num_rows
+        means = numpy.empty((num_resamples, len(sizes), len(metrics)))
+        for i in range(0, num_resamples, num_chunk):
+            n = min(num_chunk, num_resamples - i)
+            idx = row_start + (rng.random((n, num_rows)) * row_size).astype(numpy.int64) + offsets[:n]
+            counts = numpy.bincount(idx.ravel(), minlength=n * num_rows).reshape(n, num_rows)
+            for j in range(len(metrics)):
+                means[i:i + n, :, j] = numpy.add.reduceat(counts * values[j], starts, axis=1) / sizes
+
+        alpha = 100.0 * (1.0 - confidence) / 2.0
+        low, high = numpy.percentile(means, [alpha, 100.0 - alpha], axis=0)
+        dict_ci = dict()
+        for j, metric in enumerate(metrics):
+            dict_ci[metric + '.ci_low'] = low[:, j]
+            dict_ci[metric + '.ci_high'] = high[:, j]
+        return pandas.DataFrame(dict_ci, index=grouped.size().index)
+
+    @staticmethod
+    def compute_error_envelopes(store, keys=None, percentiles=(5, 50, 95), chunk_size=16777216):
+        """
+        error envelopes over the runs of each group at each step of the normalized time: the series of the store
+        (see ErrorSeriesStore) are sorted by group and copied, a chunk of groups at a time, into a NaN padded block
+        [group x run x metric x step]; the mean and the percentiles (linear interpolation, as numpy.nanpercentile) are
+        taken over the run axis of the block at once.
+
+        Input:
+        store -- ErrorSeriesStore
+        keys -- list of columns defining a group, default: ['attr', 'lvl', 'est']
+        percentiles -- percentiles in [0, 100]
+        chunk_size -- max. # of elements of a block
+
+        Output:
+        df_env -- pandas.DataFrame: one row per group, metric and step, sorted by the keys, columns: <keys>, metric,
+                  step, t_norm, runs, mean, p<percentile>...
+        """
+        if keys is None:
+            keys = EvaluationAnalyzer.get_group_keys()
+        metrics = ErrorSeriesStore.get_metric_names()
+        num_samples = store.num_samples
+        percentiles = [float(q) for q in percentiles]
+        pct_columns = ['p{0:g}'.format(q) for q in percentiles]
+
+        df_keys = pandas.DataFrame(store.keys, columns=EstimatorReport.get_column_format()[:4])
+        grouped = df_keys.groupby(keys, sort=True)
+        group_ids = grouped.ngroup().to_numpy()
+        order = numpy.argsort(group_ids, kind='stable')
+        sizes = numpy.bincount(group_ids) if len(group_ids) else numpy.zeros(0, dtype=numpy.int64)
+        starts = numpy.concatenate(([0], numpy.cumsum(sizes)[:-1])).astype(numpy.int64)
+        num_groups = len(sizes)
+        max_size = int(sizes.max()) if num_groups else 0
+
+        mean = numpy.empty((num_groups, len(metrics), num_samples))
+        pct = numpy.empty((len(percentiles), num_groups, len(metrics), num_samples))
+        num_chunk = max(1, chunk_size // max(1, max_size * len(metrics) * num_samples))
+        for g0 in range(0, num_groups, num_chunk):
+            g1 = min(num_groups, g0 + num_chunk)
+            rows = order[starts[g0]:starts[g1 - 1] + sizes[g1 - 1]]
+            block = numpy.full((g1 - g0, max_size, len(metrics), num_samples), numpy.nan)
+            block_group = group_ids[rows] - g0
+            block_run = numpy.arange(len(rows)) - (starts[group_ids[rows]] - starts[g0])
+            # the rows are read in file order from the memory map
+            rows_sorted = numpy.argsort(rows, kind='stable')
+            block[block_group[rows_sorted], block_run[rows_sorted]] = store.series[rows[rows_sorted]]
+
+            with numpy.errstate(invalid='ignore', divide='ignore'):
+                count = numpy.count_nonzero(~numpy.isnan(block), axis=1)
+                mean[g0:g1] = numpy.nansum(block, axis=1) / count
+                block.sort(axis=1)  # NaN last: the valid values of each slice come first
+                for i, q in enumerate(percentiles):
+                    pos = (count - 1) * (q / 100.0)
+                    idx_low = numpy.clip(numpy.floor(pos).astype(numpy.int64), 0, max(0, max_size - 1))
+                    idx_high = numpy.clip(numpy.minimum(idx_low + 1, count - 1), 0, max(0, max_size - 1))
+                    v_low = numpy.take_along_axis(block, idx_low[:, None], axis=1)[:, 0]
+                    v_high = numpy.take_along_axis(block, idx_high[:, None], axis=1)[:, 0]
+                    pct[i, g0:g1] = numpy.where(count > 0, v_low + (v_high - v_low) * (pos - idx_low), numpy.nan)
+
+        num_rows = num_groups * len(metrics) * num_samples
+        df_group = grouped.size().index.to_frame(index=False)
+        df_env = df_group.loc[numpy.repeat(numpy.arange(num_groups), len(metrics) * num_samples)].reset_index(
+            drop=True)
+        df_env['metric'] = numpy.tile(numpy.repeat(numpy.array(metrics, dtype=object), num_samples), num_groups)
+        df_env['step'] = numpy.tile(numpy.arange(num_samples), num_groups * len(metrics))
+        df_env['t_norm'] = ErrorSeriesStore.get_time_grid(num_samples)[df_env['step'].to_numpy()]
+        df_env['runs'] = numpy.repeat(sizes, len(metrics) * num_samples)
+        df_env['mean'] = mean.reshape(num_rows)
+        for i, col in enumerate(pct_columns):
+            df_env[col] = pct[i].reshape(num_rows)
+        return df_env
+
+    @staticmethod
+    def judge(df_res, rmse_p_th, rmse_q_th):
+        # estimator judging based on the given thresholds
+        failure = (df_res['armse_p.mean'].values > rmse_p_th) | (df_res['armse_q.mean'].values > rmse_q_th)
+        df_res['failure'] = numpy.where(failure, "True", "False")
+        return df_res
 
     def save(self, fn, save_index=False):
 
@@ -213,27 +509,59 @@ class EvaluationAnalyzer:
                                         save_index=save_index)
 
     def load(self, fn):
-        self.data_frame_analyzer = EstimatorReport.load_data_frame(fn=fn, fmt=EvaluationAnalyzer.get_column_format())
+        self.data_frame_analyzer = EvaluationAnalyzer.load_statistics(fn)
+
+    @staticmethod
+    def load_statistics(fn):
+        # the confidence intervals are optional columns
+        intervals = EvaluationAnalyzer.get_interval_columns()[0] in EstimatorReport.read_header(fn)
+        return EstimatorReport.load_data_frame(fn=fn, fmt=EvaluationAnalyzer.get_column_format(intervals=intervals))
+
+    def get_result_format(self):
+        return EvaluationAnalyzer.get_column_format(intervals=self.num_resamples > 0)
+
+    @staticmethod
+    def get_group_keys():
+        return ['attr', 'lvl', 'est']
 
     @staticmethod
-    def get_column_format():
-        return ['attr', 'est', 'lvl', 'armse_p.max', 'armse_p.min', 'armse_p.pairs', 'armse_p.var', 'armse_p.rmse',
-                'armse_p.median', 'armse_p.mean', 'armse_p.std', 'armse_q.mean', 'armse_q.pairs', 'armse_q.rmse',
-                'armse_q.min', 'armse_q.max', 'armse_q.var', 'armse_q.median', 'armse_q.std', 'anees_p.max',
-                'anees_p.rmse', 'anees_p.std', 'anees_p.median', 'anees_p.var', 'anees_p.mean', 'anees_p.pairs',
-                'anees_p.min', 'anees_q.median', 'anees_q.mean', 'anees_q.var', 'anees_q.std', 'anees_q.pairs',
-                'anees_q.min', 'anees_q.rmse', 'anees_q.max']
+    def get_metric_columns():
+        return ['armse_p', 'armse_q', 'anees_p', 'anees_q']
+
+    @staticmethod
+    def get_statistic_names():
+        # same order as numpy_statistics()
+        return ['pairs', 'rmse', 'mean', 'median', 'std', 'var', 'min', 'max']
+
+    @staticmethod
+    def get_interval_columns():
+        fmt = []
+        for metric in EvaluationAnalyzer.get_metric_columns():
+            fmt = fmt + [metric + '.ci_low', metric + '.ci_high']
+        return fmt
+
+    @staticmethod
+    def get_column_format(intervals=False):
+        fmt = EvaluationAnalyzer.get_group_keys()
+        for metric in EvaluationAnalyzer.get_metric_columns():
+            fmt = fmt + [metric + '.' + stat for stat in EvaluationAnalyzer.get_statistic_names()]
+        fmt = fmt + ['failure']
+        if intervals:
+            fmt = fmt + EvaluationAnalyzer.get_interval_columns()
+        return fmt
 
 
 ########################################################################################################################
 #################################################### T E S T ###########################################################
 ########################################################################################################################
 import unittest
+import tempfile
 
 
 class EvaluationAnalyzer_Test(unittest.TestCase):
 
     def test_init(self):
+        import matplotlib.pyplot as plt
         analyzer = EvaluationAnalyzer(fn="./sample_data/EVAL/eval.csv")
 
         cfg = AnalyzerPlotConfig()
@@ -260,6 +588,225 @@ class EvaluationAnalyzer_Test(unittest.TestCase):
         analyzer.load(fn="./sample_data/EVAL/eval_analized.csv")
         print(analyzer.data_frame_analyzer)
 
+    def test_compute_statistics(self):
+        # the grouped statistics must match the reference results
+        analyzer = EvaluationAnalyzer(fn="./sample_data/EVAL/eval.csv", rmse_p_th=0.5, rmse_q_th=5)
+        df_ref = pandas.read_csv("./sample_data/EVAL/eval_analized.csv")
+        df_ref.columns = ['idx'] + EvaluationAnalyzer.get_column_format()
+        df_res = analyzer.data_frame_analyzer
+        self.assertEqual(list(df_res.columns), EvaluationAnalyzer.get_column_format())
+        self.assertEqual(len(df_res.index), len(df_ref.index))
+        for col in EvaluationAnalyzer.get_column_format()[:-1]:
+            self.assertTrue(numpy.allclose(df_res[col].values.astype(float), df_ref[col].values, rtol=1e-9), col)
+
+        # compute_statistics_over_runs() is a view on a single group
+        df_ale = analyzer.compute_statistics_over_runs(2, 1, 3)
+        self.assertTrue(numpy.allclose(df_ale['armse_p.mean'].values, df_ref['armse_p.mean'].values[10]))
+
+    def test_update_statistics(self):
+        # statistics of modified groups are recomputed, all others are taken from the saved results
+        analyzer = EvaluationAnalyzer(fn="./sample_data/EVAL/eval.csv", rmse_p_th=0.5, rmse_q_th=5)
+        df_ref = analyzer.data_frame_analyzer
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            fn = os.path.join(tmp_dir, "eval.csv")
+            fn_analyzed = os.path.join(tmp_dir, "eval_analyzed.csv")
+            analyzer.save(fn=fn_analyzed, save_index=True)
+
+            df = analyzer.est_report.data_frame.copy()
+            sel = (df['attr'] == 2) & (df['lvl'] == 1) & (df['est'] == 3)
+            df.loc[sel, 'armse_p'] = df.loc[sel, 'armse_p'] * 10
+            EstimatorReport.save_data_frame(df, fn, EstimatorReport.get_column_format())
+
+            analyzer = EvaluationAnalyzer(fn=fn, rmse_p_th=0.5, rmse_q_th=5, fn_analyzed=fn_analyzed,
+                                          groups=[(2, 1, 3)])
+            df_inc = analyzer.data_frame_analyzer
+            df_full = analyzer.compute_statistics()
+        self.assertEqual(list(df_inc.columns), EvaluationAnalyzer.get_column_format())
+        for col in EvaluationAnalyzer.get_column_format()[:-1]:
+            self.assertTrue(numpy.allclose(df_inc[col].values, df_full[col].values, rtol=1e-12, equal_nan=True),
+                            col)
+        self.assertTrue((df_inc['failure'].values == df_full['failure'].values).all())
+        self.assertFalse(numpy.allclose(df_inc['armse_p.mean'].values, df_ref['armse_p.mean'].values))
+
+    def test_bootstrap_intervals(self):
+        rng = numpy.random.default_rng(0)
+        num_rows = 400
+        df = pandas.DataFrame({'attr': numpy.repeat([1, 2], num_rows // 2), 'lvl': 1, 'run': numpy.arange(num_rows),
+                               'est': 1, 'armse_p': numpy.concatenate((numpy.full(num_rows // 2, 0.5),
+                                                                       rng.random(num_rows // 2))),
+                               'armse_q': rng.random(num_rows), 'anees_p': rng.random(num_rows) * 3,
+                               'anees_q': rng.random(num_rows) * 3})
+        df_ci = EvaluationAnalyzer.compute_bootstrap_intervals(df, ['attr', 'lvl', 'est'], num_resamples=2000)
+        self.assertEqual(list(df_ci.columns), EvaluationAnalyzer.get_interval_columns())
+        # constant values: no uncertainty
+        self.assertAlmostEqual(df_ci['armse_p.ci_low'].values[0], 0.5)
+        self.assertAlmostEqual(df_ci['armse_p.ci_high'].values[0], 0.5)
+        # close to the normal approximation: mean +- 1.96 * std / sqrt(n)
+        values = df['armse_p'].values[num_rows // 2:]
+        half_width = 1.96 * values.std() / numpy.sqrt(len(values))
+        self.assertAlmostEqual(df_ci['armse_p.ci_low'].values[1], values.mean() - half_width, delta=0.1 * half_width)
+        self.assertAlmostEqual(df_ci['armse_p.ci_high'].values[1], values.mean() + half_width, delta=0.1 * half_width)
+
+        # the intervals are added to the statistics, the anees normalized as its mean
+        analyzer = EvaluationAnalyzer(fn="./sample_data/EVAL/eval.csv", rmse_p_th=0.5, rmse_q_th=5,
+                                      num_resamples=500)
+        df_res = analyzer.data_frame_analyzer
+        self.assertEqual(list(df_res.columns), EvaluationAnalyzer.get_column_format(intervals=True))
+        valid = df_res['armse_p.pairs'].values > 0
+        for metric in EvaluationAnalyzer.get_metric_columns():
+            self.assertTrue((df_res[metric + '.ci_low'].values[valid] <= df_res[metric + '.mean'].values[valid]).all())
+            self.assertTrue((df_res[metric + '.ci_high'].values[valid] >= df_res[metric + '.mean'].values[valid]).all())
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            analyzer.save(fn=os.path.join(tmp_dir, "eval_analyzed.csv"), save_index=True)
+            analyzer.load(fn=os.path.join(tmp_dir, "eval_analyzed.csv"))
+        self.assertEqual(list(analyzer.data_frame_analyzer.columns), list(df_res.columns))
+        self.assertTrue(numpy.allclose(analyzer.data_frame_analyzer['anees_q.ci_high'].values,
+                                       df_res['anees_q.ci_high'].values, equal_nan=True))
+
+    def test_bootstrap_intervals_speed(self):
+        num_rows = 100000
+        rng = numpy.random.default_rng(0)
+        df = pandas.DataFrame({'attr': rng.integers(1, 6, num_rows), 'lvl': rng.integers(1, 11, num_rows),
+                               'run': numpy.arange(num_rows) % 100, 'est': rng.integers(1, 13, num_rows),
+                               'armse_p': rng.random(num_rows), 'armse_q': rng.random(num_rows),
+                               'anees_p': rng.random(num_rows), 'anees_q': rng.random(num_rows)})
+        t_start = time.time()
+        df_ci = EvaluationAnalyzer.compute_bootstrap_intervals(df, ['attr', 'lvl', 'est'], num_resamples=1000)
+        t_ci = time.time() - t_start
+        print("compute_bootstrap_intervals() of " + str(num_rows) + " rows and 1000 resamples took: " + str(t_ci) +
+              " [sec]")
+        self.assertEqual(len(df_ci.index), 5 * 10 * 12)
+        self.assertLess(t_ci, 20.0)
+
+    def test_save_load_binary(self):
+        analyzer = EvaluationAnalyzer(fn="./sample_data/EVAL/eval.csv", rmse_p_th=0.5, rmse_q_th=5)
+        df_res = analyzer.data_frame_analyzer
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            analyzer.save(fn=os.path.join(tmp_dir, "eval_analyzed.npz"))
+            analyzer.load(fn=os.path.join(tmp_dir, "eval_analyzed.npz"))
+        self.assertTrue(analyzer.data_frame_analyzer.equals(df_res))
+
+    def test_get_dataframe_at(self):
+        analyzer = EvaluationAnalyzer(fn="./sample_data/EVAL/eval.csv")
+        df = analyzer.est_report.data_frame
+        for (attr, lvl, est), df_ref in df.groupby(['attr', 'lvl', 'est']):
+            self.assertTrue(analyzer.get_dataframe_at(attr, lvl, est).equals(df_ref))
+        df_ref = df.loc[(df['attr'] == 1) & (df['lvl'] == 1)]
+        self.assertTrue(analyzer.get_dataframe_at(1, 1).equals(df_ref))
+        self.assertTrue(analyzer.get_dataframe_at(99, 1).empty)
+        self.assertEqual(list(analyzer.get_dataframe_at(99, 1, 1).columns), list(df.columns))
+
+        # reloading the report invalidates the index
+        group_index = analyzer.get_group_index()
+        self.assertIs(analyzer.get_group_index(), group_index)
+        analyzer.est_report.append_row(99, 1, 1, 1, 1.0, 2.0, 3.0, 4.0)
+        self.assertIsNot(analyzer.get_group_index(), group_index)
+        self.assertEqual(len(analyzer.get_dataframe_at(99, 1).index), 1)
+
+    def test_get_dataframe_at_speed(self):
+        num_rows = 100000
+        rng = numpy.random.default_rng(0)
+        analyzer = EvaluationAnalyzer(fn="./sample_data/EVAL/eval.csv")
+        analyzer.est_report.data_frame = pandas.DataFrame(
+            {'attr': rng.integers(1, 6, num_rows), 'lvl': rng.integers(1, 11, num_rows),
+             'run': numpy.arange(num_rows) % 100, 'est': rng.integers(1, 13, num_rows),
+             'armse_p': rng.random(num_rows), 'armse_q': rng.random(num_rows),
+             'anees_p': rng.random(num_rows), 'anees_q': rng.random(num_rows)})
+        t_start = time.time()
+        for a in range(1, 6):
+            for l in range(1, 11):
+                for e in range(1, 13):
+                    analyzer.get_dataframe_at(a, l, e)
+        t_lookup = time.time() - t_start
+        print("600 x get_dataframe_at() of " + str(num_rows) + " rows took: " + str(t_lookup) + " [sec]")
+        self.assertLess(t_lookup, 2.0)
+
+    def test_render_boxplots(self):
+        import matplotlib.pyplot as plt
+        analyzer = EvaluationAnalyzer(fn="./sample_data/EVAL/eval.csv")
+        num_figures = len(analyzer.est_report.data_frame.groupby(['attr', 'lvl']))
+        num_open = len(plt.get_fignums())
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            t_start = time.time()
+            fn_list = analyzer.render_boxplots(result_dir=tmp_dir, jobs=2, cfg=AnalyzerPlotConfig(dpi=50))
+            print("render_boxplots() of " + str(num_figures) + " figures took: " + str(time.time() - t_start) +
+                  " [sec]")
+            self.assertEqual(len(fn_list), num_figures)
+            for fn in fn_list:
+                self.assertTrue(os.path.getsize(fn) > 0)
+        # no figures are left in pyplot
+        self.assertEqual(len(plt.get_fignums()), num_open)
+
+    def test_compute_statistics_speed(self):
+        num_rows = 100000
+        rng = numpy.random.default_rng(0)
+        df = pandas.DataFrame({'attr': rng.integers(1, 6, num_rows), 'lvl': rng.integers(1, 11, num_rows),
+                               'run': numpy.arange(num_rows) % 100, 'est': rng.integers(1, 13, num_rows),
+                               'armse_p': rng.random(num_rows), 'armse_q': rng.random(num_rows),
+                               'anees_p': rng.random(num_rows), 'anees_q': rng.random(num_rows)})
+        t_start = time.time()
+        df_res = EvaluationAnalyzer.compute_group_statistics(df, num_runs=100)
+        EvaluationAnalyzer.judge(df_res, 0.5, 0.5)
+        t_stat = time.time() - t_start
+        print("compute_group_statistics() of " + str(num_rows) + " rows took: " + str(t_stat) + " [sec]")
+        self.assertEqual(len(df_res.index), 5 * 10 * 12)
+        self.assertLess(t_stat, 5.0)
+
+    @staticmethod
+    def create_series_store(tmp_dir, num_runs, num_samples, seed=0):
+        rng = numpy.random.default_rng(seed)
+        key_list = []
+        series_fn_list = []
+        for i in range(num_runs):
+            series = rng.random((4, num_samples)).astype(numpy.float32)
+            series[:, i % num_samples] = numpy.nan if i % 7 == 0 else series[:, i % num_samples]
+            series_fn = os.path.join(tmp_dir, 'run_{0}.npy'.format(i))
+            ErrorSeriesStore.save_series(series_fn, series)
+            key_list.append((rng.integers(1, 3), rng.integers(1, 4), i, rng.integers(1, 5)))
+            series_fn_list.append(series_fn)
+        store, num_missing = ErrorSeriesStore.build(os.path.join(tmp_dir, 'eval_series.npy'), key_list,
+                                                    series_fn_list, num_samples)
+        return store
+
+    def test_compute_error_envelopes(self):
+        # the envelopes must match numpy.nanmean/nanpercentile per group
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            store = EvaluationAnalyzer_Test.create_series_store(tmp_dir, 200, 30)
+            df_env = EvaluationAnalyzer.compute_error_envelopes(store, percentiles=[5, 50, 95], chunk_size=5000)
+            df_keys = pandas.DataFrame(store.keys, columns=['attr', 'lvl', 'run', 'est'])
+            num_groups = len(df_keys.groupby(['attr', 'lvl', 'est']))
+            self.assertEqual(len(df_env.index), num_groups * 4 * 30)
+            for (attr, lvl, est), df_ in df_keys.groupby(['attr', 'lvl', 'est']):
+                series = numpy.asarray(store.series[df_.index.to_numpy()], dtype=float)
+                df_group = df_env[(df_env['attr'] == attr) & (df_env['lvl'] == lvl) & (df_env['est'] == est)]
+                for m, metric in enumerate(ErrorSeriesStore.get_metric_names()):
+                    df_metric = df_group[df_group['metric'] == metric]
+                    self.assertTrue((df_metric['runs'] == len(df_.index)).all())
+                    self.assertTrue(numpy.allclose(df_metric['mean'], numpy.nanmean(series[:, m], axis=0)))
+                    for q in [5, 50, 95]:
+                        self.assertTrue(numpy.allclose(df_metric['p' + str(q)],
+                                                       numpy.nanpercentile(series[:, m], q, axis=0)))
+
+    def test_compute_error_envelopes_speed(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            rng = numpy.random.default_rng(0)
+            num_runs = 20000
+            fn = os.path.join(tmp_dir, 'eval_series.npy')
+            arr = numpy.lib.format.open_memmap(fn, mode='w+', dtype=numpy.float32, shape=(num_runs, 4, 100))
+            arr[:] = rng.random((num_runs, 4, 100))
+            del arr
+            numpy.save(ErrorSeriesStore.get_keys_fn(fn), numpy.stack([rng.integers(1, 6, num_runs),
+                                                                       rng.integers(1, 11, num_runs),
+                                                                       numpy.arange(num_runs),
+                                                                       rng.integers(1, 5, num_runs)], axis=1))
+            store = ErrorSeriesStore(fn)
+            t_start = time.time()
+            df_env = EvaluationAnalyzer.compute_error_envelopes(store)
+            t_env = time.time() - t_start
+        print("compute_error_envelopes() of " + str(num_runs) + " runs took: " + str(t_env) + " [sec]")
+        self.assertEqual(len(df_env.index), 5 * 10 * 4 * 4 * 100)
+        self.assertLess(t_env, 10.0)
+
 
 if __name__ == "__main__":
     unittest.main()
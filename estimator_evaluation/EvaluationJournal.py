@@ -0,0 +1,191 @@
+#!/usr/bin/env python
+# Copyright (C) 2021, Roland Jung, Control of Networked Systems, University of Klagenfurt, Austria.
+#
+# All rights reserved.
+#
+# This software is licensed under the terms of the BSD-2-Clause-License with
+# no commercial use allowed, the full terms of which are made available in the
+# LICENSE file. No license in patents is granted.
+#
+# You can contact the author at <roland.jung@aau.at>
+#
+# Requirements:
+# json
+########################################################################################################################
+import os
+import json
+
+
+class EvaluationJournal:
+    """
+    Append-only journal (JSON lines) of the evaluated bag files: as soon as a bag is evaluated, its metric row
+    (attr, lvl, run, est, armse_p, armse_q, anees_p, anees_q) is appended as a single line by one write() and
+    flushed to the disk (fsync). If a campaign dies, a restart takes the rows of the journaled bags from the journal
+    (no report.ini is parsed) and evaluates only the missing ones. The journal is meant for the recovery of aborted
+    campaigns: EstimatorEvaluation uses an entry only while the report.ini of its bag exists and clears the journal
+    once all bags are done.
+
+    The first line holds the evaluation parameters; a journal of other parameters is started anew. An entry is only
+    used as long as its bag file is unchanged (size, mtime). A line cut by a crash is dropped when the journal is
+    loaded. The bag files are stored relative to the directory of the journal.
+    """
+    fn = None
+    root_dir = None
+    params = None
+    entries = None  # dict: relative bag file name -> {'size': int, 'mtime_ns': int, 'row': [...]}
+    fd = None  # file descriptor of the journal, opened for appending
+
+    def __init__(self, fn, params=None):
+        self.fn = fn
+        self.root_dir = os.path.dirname(os.path.abspath(fn))
+        self.params = params
+        self.entries = dict()
+        self.fd = None
+        if os.path.exists(fn):
+            self.load(fn)
+        else:
+            self.clear()
+
+    def get_rel_fn(self, bag_fn):
+        return os.path.relpath(os.path.abspath(bag_fn), self.root_dir)
+
+    def get_row(self, bag_fn):
+        # the journaled row of an unchanged bag file or None
+        entry = self.entries.get(self.get_rel_fn(bag_fn))
+        if entry is None:
+            return None
+        stat = os.stat(bag_fn)
+        if entry['size'] != stat.st_size or entry['mtime_ns'] != stat.st_mtime_ns:
+            return None
+        return tuple(entry['row'])
+
+    def append(self, bag_fn, row):
+        stat = os.stat(bag_fn)
+        rel_fn = self.get_rel_fn(bag_fn)
+        entry = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns,
+                 'row': [int(v) for v in row[:4]] + [float(v) for v in row[4:]]}
+        line = json.dumps({'bag': rel_fn, 'size': entry['size'], 'mtime_ns': entry['mtime_ns'], 'row': entry['row']})
+        if self.fd is None:
+            self.fd = os.open(self.fn, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        data = (line + '\n').encode('utf-8')
+        # a single write of the whole line: a crash leaves at most the last line incomplete
+        num_written = os.write(self.fd, data)
+        while num_written < len(data):
+            num_written += os.write(self.fd, data[num_written:])
+        os.fsync(self.fd)
+        self.entries[rel_fn] = entry
+
+    def close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+    def clear(self):
+        # starts a new journal holding only the parameters
+        self.entries = dict()
+        self.rewrite()
+
+    def load(self, fn):
+        with open(fn, 'r') as f:
+            lines = f.read().split('\n')
+        # the last element is empty for a complete journal, otherwise it is a line cut by a crash
+        num_cut = 1 if lines[-1] else 0
+        entries = dict()
+        params = None
+        num_invalid = num_cut
+        for i, line in enumerate(lines[:-1]):
+            try:
+                content = json.loads(line)
+            except ValueError:
+                num_invalid += 1
+                continue
+            if i == 0:
+                params = content.get('params')
+            elif 'bag' in content:
+                entries[content['bag']] = {'size': content['size'], 'mtime_ns': content['mtime_ns'],
+                                           'row': content['row']}
+
+        if self.params is not None and params != self.params:
+            print("EvaluationJournal: evaluation parameters changed, the journal is started anew")
+            self.clear()
+            return
+        self.entries = entries
+        if num_invalid or len(entries) + 1 < len(lines) - 1:
+            # remove the cut lines and the replaced entries before appending
+            print("EvaluationJournal: " + str(num_invalid) + " incomplete lines dropped")
+            self.rewrite()
+
+    def rewrite(self):
+        # writes the journal to a temporary file and renames it: the journal is never left half written
+        self.close()
+        head = os.path.dirname(os.path.abspath(self.fn))
+        if not os.path.exists(head):
+            os.makedirs(head)
+        fn_tmp = self.fn + '.tmp'
+        with open(fn_tmp, 'w') as f:
+            f.write(json.dumps({'params': self.params}) + '\n')
+            for rel_fn, entry in self.entries.items():
+                f.write(json.dumps({'bag': rel_fn, 'size': entry['size'], 'mtime_ns': entry['mtime_ns'],
+                                    'row': entry['row']}) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(fn_tmp, self.fn)
+
+    def __len__(self):
+        return len(self.entries)
+
+
+########################################################################################################################
+#################################################### T E S T ###########################################################
+########################################################################################################################
+import unittest
+import tempfile
+
+
+class EvaluationJournal_Test(unittest.TestCase):
+    def test_append_load(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            fn = os.path.join(tmp_dir, 'eval_journal.jsonl')
+            params = {'alignment_type': 'se3', 'num_aligned_samples': -1, 'topic_list': ['/pose_gt', '/pose_est']}
+            bag_list = []
+            for est in range(1, 4):
+                bag_fn = os.path.join(tmp_dir, 'ATTR_1_LVL_1_RUN_1_EST_{0}.bag'.format(est))
+                with open(bag_fn, 'wb') as f:
+                    f.write(b'bag')
+                bag_list.append(bag_fn)
+
+            journal = EvaluationJournal(fn, params)
+            self.assertEqual(len(journal), 0)
+            journal.append(bag_list[0], ('1', '1', '1', '1', '0.1', 0.2, 0.3, 0.4))
+            journal.append(bag_list[1], (1, 1, 1, 2, 1.1, 1.2, 1.3, 1.4))
+            journal.append(bag_list[1], (1, 1, 1, 2, 2.1, 2.2, 2.3, 2.4))
+            journal.close()
+
+            # a crash while writing the next line
+            with open(fn, 'a') as f:
+                f.write('{"bag": "ATTR_1_LVL_1_RUN_1_EST_3.bag", "si')
+
+            journal = EvaluationJournal(fn, params)
+            self.assertEqual(journal.get_row(bag_list[0]), (1, 1, 1, 1, 0.1, 0.2, 0.3, 0.4))
+            self.assertEqual(journal.get_row(bag_list[1]), (1, 1, 1, 2, 2.1, 2.2, 2.3, 2.4))
+            self.assertIsNone(journal.get_row(bag_list[2]))
+            journal.append(bag_list[2], (1, 1, 1, 3, 3.1, 3.2, 3.3, 3.4))
+            journal.close()
+            with open(fn, 'r') as f:
+                self.assertEqual(len(f.readlines()), 4)
+
+            journal = EvaluationJournal(fn, params)
+            self.assertEqual(len(journal), 3)
+            # changed bags are not taken from the journal
+            with open(bag_list[0], 'ab') as f:
+                f.write(b'more')
+            self.assertIsNone(journal.get_row(bag_list[0]))
+
+            # other parameters invalidate the journal
+            journal = EvaluationJournal(fn, dict(params, alignment_type='sim3'))
+            self.assertEqual(len(journal), 0)
+            self.assertIsNone(journal.get_row(bag_list[2]))
+
+
+if __name__ == "__main__":
+    unittest.main()
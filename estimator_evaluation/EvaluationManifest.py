@@ -0,0 +1,136 @@
+#!/usr/bin/env python
+# Copyright (C) 2021, Roland Jung, Control of Networked Systems, University of Klagenfurt, Austria.
+#
+# All rights reserved.
+#
+# This software is licensed under the terms of the BSD-2-Clause-License with
+# no commercial use allowed, the full terms of which are made available in the
+# LICENSE file. No license in patents is granted.
+#
+# You can contact the author at <roland.jung@aau.at>
+#
+# Requirements:
+# json
+########################################################################################################################
+import os
+import json
+
+
+class EvaluationManifest:
+    """
+    Records which bag files are contained in an existing evaluation report (eval.csv) and the state (size, mtime) of
+    these files when they were evaluated. Used by the incremental mode of EstimatorEvaluation to find the bags that
+    are new, changed or removed since the last run; all other rows of the report are reused as they are.
+
+    The bag files are stored relative to the directory of the manifest, thus the EVAL folder can be moved. If the
+    evaluation parameters differ from the recorded ones, all entries are dropped.
+    """
+    fn = None
+    root_dir = None
+    params = None
+    entries = None  # dict: relative bag file name -> {'size': int, 'mtime_ns': int, 'key': [attr, lvl, run, est]}
+
+    def __init__(self, fn, params=None):
+        self.fn = fn
+        self.root_dir = os.path.dirname(os.path.abspath(fn))
+        self.params = params
+        self.entries = dict()
+        if fn and os.path.exists(fn):
+            self.load(fn)
+
+    def get_rel_fn(self, bag_fn):
+        return os.path.relpath(os.path.abspath(bag_fn), self.root_dir)
+
+    def is_current(self, bag_fn):
+        entry = self.entries.get(self.get_rel_fn(bag_fn))
+        if entry is None:
+            return False
+        stat = os.stat(bag_fn)
+        return entry['size'] == stat.st_size and entry['mtime_ns'] == stat.st_mtime_ns
+
+    def get_changed(self, bag_list):
+        # bags that are new or were modified since they were evaluated
+        return [bag_fn for bag_fn in bag_list if not self.is_current(bag_fn)]
+
+    def get_removed(self, bag_list):
+        # entries whose bag file does not exist anymore
+        rel_fns = set(self.get_rel_fn(bag_fn) for bag_fn in bag_list)
+        return [rel_fn for rel_fn in self.entries.keys() if rel_fn not in rel_fns]
+
+    def get_key(self, rel_fn):
+        entry = self.entries.get(rel_fn)
+        if entry is None:
+            return None
+        return entry['key']
+
+    def put(self, bag_fn, key):
+        stat = os.stat(bag_fn)
+        self.entries[self.get_rel_fn(bag_fn)] = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns,
+                                                 'key': [int(v) for v in key]}
+
+    def remove(self, rel_fn):
+        self.entries.pop(rel_fn, None)
+
+    def load(self, fn):
+        with open(fn, 'r') as f:
+            content = json.load(f)
+        if self.params is not None and content.get('params') != self.params:
+            print("EvaluationManifest: evaluation parameters changed, all bags are evaluated again")
+            self.entries = dict()
+        else:
+            self.entries = content.get('entries', dict())
+
+    def save(self, fn=None):
+        if fn is None:
+            fn = self.fn
+        head = os.path.dirname(os.path.abspath(fn))
+        if not os.path.exists(head):
+            os.makedirs(head)
+        # write to a temporary file and rename it: the manifest is never left half written
+        fn_tmp = fn + '.tmp'
+        with open(fn_tmp, 'w') as f:
+            json.dump({'params': self.params, 'entries': self.entries}, f)
+        os.replace(fn_tmp, fn)
+
+
+########################################################################################################################
+#################################################### T E S T ###########################################################
+########################################################################################################################
+import unittest
+import tempfile
+
+
+class EvaluationManifest_Test(unittest.TestCase):
+    def test_changed(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            fn = os.path.join(tmp_dir, 'eval_manifest.json')
+            params = {'alignment_type': 'se3', 'num_aligned_samples': -1, 'topic_list': ['/pose_gt', '/pose_est']}
+            bag_list = []
+            for est in range(1, 4):
+                bag_fn = os.path.join(tmp_dir, 'ATTR_1_LVL_1_RUN_1_EST_{0}.bag'.format(est))
+                with open(bag_fn, 'wb') as f:
+                    f.write(b'bag')
+                bag_list.append(bag_fn)
+
+            manifest = EvaluationManifest(fn, params)
+            self.assertEqual(manifest.get_changed(bag_list), bag_list)
+            for est, bag_fn in enumerate(bag_list[:2]):
+                manifest.put(bag_fn, [1, 1, 1, est + 1])
+            manifest.save()
+
+            manifest = EvaluationManifest(fn, params)
+            self.assertEqual(manifest.get_changed(bag_list), bag_list[2:])
+            with open(bag_list[0], 'ab') as f:
+                f.write(b'more')
+            self.assertEqual(manifest.get_changed(bag_list), [bag_list[0], bag_list[2]])
+            self.assertEqual(manifest.get_removed(bag_list[2:]), [manifest.get_rel_fn(bag_list[0]),
+                                                                  manifest.get_rel_fn(bag_list[1])])
+            self.assertEqual(manifest.get_key(manifest.get_rel_fn(bag_list[1])), [1, 1, 1, 2])
+
+            # other parameters invalidate the manifest
+            manifest = EvaluationManifest(fn, dict(params, alignment_type='sim3'))
+            self.assertEqual(manifest.get_changed(bag_list), bag_list)
+
+
+if __name__ == "__main__":
+    unittest.main()
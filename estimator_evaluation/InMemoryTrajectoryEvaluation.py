@@ -0,0 +1,239 @@
+#!/usr/bin/env python
+# Copyright (C) 2021, Roland Jung, Control of Networked Systems, University of Klagenfurt, Austria.
+#
+# All rights reserved.
+#
+# This software is licensed under the terms of the BSD-2-Clause-License with
+# no commercial use allowed, the full terms of which are made available in the
+# LICENSE file. No license in patents is granted.
+#
+# You can contact the author at <roland.jung@aau.at>
+#
+# Requirements:
+# numpy, pandas, cnspy_spatial_csv_formats, cnspy_csv2dataframe, cnspy_timestamp_association, cnspy_trajectory,
+# cnspy_trajectory_evaluation
+########################################################################################################################
+import os
+import pandas as pandas
+
+from cnspy_spatial_csv_formats.CSVFormatPose import CSVFormatPose
+from cnspy_csv2dataframe.CSV2DataFrame import CSV2DataFrame
+from cnspy_timestamp_association.TimestampAssociation import TimestampAssociation
+from cnspy_trajectory.Trajectory import Trajectory
+from cnspy_trajectory.TrajectoryEstimated import TrajectoryEstimated
+from cnspy_trajectory_evaluation.TrajectoryAlignmentTypes import TrajectoryAlignmentTypes
+from cnspy_trajectory_evaluation.AbsoluteTrajectoryError import AbsoluteTrajectoryError
+from cnspy_trajectory_evaluation.TrajectoryNEES import TrajectoryNEES
+from cnspy_trajectory_evaluation.EvaluationReport import EvaluationReport
+from estimator_evaluation.StageTimer import StageTimer
+from estimator_evaluation.ErrorSeriesStore import ErrorSeriesStore
+
+
+class InMemoryTrajectoryEvaluation:
+    """
+    Performs the same steps as cnspy_trajectory_evaluation.TrajectoryEvaluation (association, alignment, ATE, NEES)
+    on trajectories held in numpy arrays (columns as in CSVFormatPose.get_format(CSVFormatPose.PoseWithCov)), e.g.
+    from ROSbag2Trajectory, instead of reading CSV files. Only the report.ini is written to `result_dir`; the
+    intermediate CSV files are written if `keep_csv` is set. The stages are timed by `timer` (see StageTimer).
+    With `num_series_samples` > 0, the error time series resampled on the normalized time (see ErrorSeriesStore)
+    is kept in `error_series` and saved to error_series.npy. If a `writer` (see ResultWriter) is given, the files
+    are written asynchronously by it, in the same order.
+    """
+    report = None
+    error_series = None  # numpy array float32 [metric x step], see ErrorSeriesStore.get_metric_names()
+    fn_list = ["pose-gt.csv", "pose-est-cov.csv"]
+
+    def __init__(self, arr_gt, arr_est, result_dir=None, prefix=None, alignment_type=TrajectoryAlignmentTypes.se3,
+                 num_aligned_samples=-1, plot=False, save_plot=False, keep_csv=False, fn_gt='', fn_est='',
+                 fn_list=None, timer=None, num_series_samples=0, writer=None):
+        if timer is None:
+            timer = StageTimer()
+        write = writer.submit if writer is not None else InMemoryTrajectoryEvaluation.write
+        bag = fn_est
+        if not result_dir:
+            result_dir = '.'
+        if not prefix:
+            prefix = ''
+        if not os.path.exists(result_dir):
+            os.makedirs(os.path.abspath(result_dir))
+
+        fmt = CSVFormatPose.PoseWithCov
+        df_gt = pandas.DataFrame(arr_gt, columns=CSVFormatPose.get_format(fmt))
+        df_est = pandas.DataFrame(arr_est, columns=CSVFormatPose.get_format(fmt))
+        if keep_csv:
+            if not fn_list:
+                fn_list = self.fn_list
+            fn_gt = os.path.join(result_dir, fn_list[0])
+            fn_est = os.path.join(result_dir, fn_list[1])
+            write(CSV2DataFrame.save_CSV, df_gt, fn_gt, fmt)
+            write(CSV2DataFrame.save_CSV, df_est, fn_est, fmt)
+
+        self.report = EvaluationReport(directory=os.path.abspath(result_dir), fn_gt=fn_gt, fn_est=fn_est,
+                                       alignment=str(alignment_type), num_aligned_samples=num_aligned_samples)
+
+        # association (see AssociatedTrajectories)
+        with timer.stage('association', bag=bag):
+            idx_est, idx_gt, t_est_matched, t_gt_matched = TimestampAssociation.associate_timestamps(
+                df_est[['t']].to_numpy(), df_gt[['t']].to_numpy())
+            df_est_matched = df_est.loc[idx_est, :]
+            df_gt_matched = df_gt.loc[idx_gt, :]
+        if keep_csv:
+            write(CSV2DataFrame.save_CSV, df_est_matched, os.path.join(result_dir, prefix + "est_matched.csv"), fmt)
+            write(CSV2DataFrame.save_CSV, df_gt_matched, os.path.join(result_dir, prefix + "gt_matched.csv"), fmt)
+
+        # alignment (see AlignedTrajectories)
+        with timer.stage('alignment', bag=bag):
+            traj_est_matched_aligned = TrajectoryEstimated(df=df_est_matched)
+            traj_gt_matched = Trajectory(df=df_gt_matched)
+            s, R, t = TrajectoryAlignmentTypes.trajectory_aligment(traj_est_matched_aligned, traj_gt_matched,
+                                                                   method=alignment_type,
+                                                                   num_frames=num_aligned_samples)
+            traj_est_matched_aligned.transform(scale=s, t=t, R=R)
+        if keep_csv:
+            write(traj_est_matched_aligned.save_to_CSV, os.path.join(result_dir, prefix + 'est_matched_aligned.csv'))
+            write(traj_gt_matched.save_to_CSV, os.path.join(result_dir, prefix + 'gt_matched_aligned.csv'))
+
+        with timer.stage('ate', bag=bag):
+            ATE = AbsoluteTrajectoryError(traj_est=traj_est_matched_aligned, traj_gt=traj_gt_matched)
+        self.report.ARMSE_p = ATE.ARMSE_p
+        self.report.ARMSE_q = ATE.ARMSE_q_deg
+
+        with timer.stage('nees', bag=bag):
+            NEES = TrajectoryNEES(traj_est=traj_est_matched_aligned, traj_err=ATE.traj_err)
+        self.report.ANEES_p = NEES.ANEES_p
+        self.report.ANEES_q = NEES.ANEES_q
+        if keep_csv:
+            write(ATE.traj_err.save_to_CSV, os.path.join(result_dir, prefix + 'err_matched_aligned.csv'))
+            write(NEES.save_to_CSV, os.path.join(result_dir, prefix + 'nees_matched_aligned.csv'))
+
+        if num_series_samples > 0:
+            # before the report.ini: a check point always has its series
+            with timer.stage('series', bag=bag):
+                self.error_series = ErrorSeriesStore.resample(ATE.t_vec, [ATE.rmse_p_vec, ATE.rmse_q_deg_vec,
+                                                                          NEES.NEES_p_vec, NEES.NEES_q_vec],
+                                                              num_series_samples)
+            write(ErrorSeriesStore.save_series, os.path.join(result_dir, prefix + 'error_series.npy'),
+                  self.error_series)
+
+        # the report.ini is the check point: written to a temporary file and renamed, it is never left half written
+        write(InMemoryTrajectoryEvaluation.save_report, self.report, os.path.join(result_dir, prefix + 'report.ini'))
+
+        if plot or save_plot:
+            with timer.stage('plot', bag=bag):
+                InMemoryTrajectoryEvaluation.plot(traj_est_matched=TrajectoryEstimated(df=df_est_matched),
+                                                  traj_gt_matched=traj_gt_matched,
+                                                  traj_est_matched_aligned=traj_est_matched_aligned, ATE=ATE,
+                                                  NEES=NEES, result_dir=result_dir, prefix=prefix,
+                                                  save_plot=save_plot)
+
+    @staticmethod
+    def write(func, *args):
+        # synchronous counterpart of ResultWriter.submit()
+        func(*args)
+
+    @staticmethod
+    def save_report(report, fn_report):
+        report.save(fn_report + '.tmp')
+        os.replace(fn_report + '.tmp', fn_report)
+
+    @staticmethod
+    def plot(traj_est_matched, traj_gt_matched, traj_est_matched_aligned, ATE, NEES, result_dir, prefix,
+             save_plot=False):
+        from cnspy_trajectory.TrajectoryPlotter import TrajectoryPlotter
+        from cnspy_trajectory.TrajectoryPlotConfig import TrajectoryPlotConfig
+        from cnspy_trajectory.TrajectoryPlotTypes import TrajectoryPlotTypes
+
+        fn_ATE = ""
+        fn_NEES = ""
+        fn_Multi = ""
+        show = True
+        if save_plot:
+            fn_NEES = os.path.join(result_dir, prefix + 'NEES.jpg')
+            fn_ATE = os.path.join(result_dir, prefix + 'ATE.jpg')
+            fn_Multi = os.path.join(result_dir, prefix + 'traj3D.jpg')
+            show = False
+
+        plot_gt = TrajectoryPlotter(traj_obj=traj_gt_matched)
+        plot_est = TrajectoryPlotter(traj_obj=traj_est_matched)
+        plot_est_aligned = TrajectoryPlotter(traj_obj=traj_est_matched_aligned)
+
+        TrajectoryPlotter.multi_plot_3D(traj_plotter_list=[plot_gt, plot_est, plot_est_aligned],
+                                        cfg=TrajectoryPlotConfig(show=show, close_figure=True, save_fn=fn_Multi),
+                                        name_list=['gt_matched', 'est_matched', 'est_matched_aligned'])
+        ATE.plot_pose_err(cfg=TrajectoryPlotConfig(show=show, close_figure=True, radians=False,
+                                                   plot_type=TrajectoryPlotTypes.plot_2D_over_t,
+                                                   save_fn=fn_ATE), angles=True)
+        NEES.plot(cfg=TrajectoryPlotConfig(show=show, close_figure=True, radians=False, save_fn=fn_NEES,
+                                           plot_type=TrajectoryPlotTypes.plot_2D_over_t))
+
+
+########################################################################################################################
+#################################################### T E S T ###########################################################
+########################################################################################################################
+import unittest
+import tempfile
+import numpy as numpy
+
+
+class InMemoryTrajectoryEvaluation_Test(unittest.TestCase):
+    @staticmethod
+    def create_trajectories(num_gt=400, seed=0, seed_est=None):
+        # ground truth at 20 Hz, estimate at 10 Hz with noise (seeded by `seed_est`, if given) and a covariance
+        rng = numpy.random.default_rng(seed)
+        num_elem = CSVFormatPose.get_num_elem(CSVFormatPose.PoseWithCov)
+        arr_gt = numpy.zeros((num_gt, num_elem))
+        arr_gt[:, 0] = numpy.arange(num_gt) * 0.05
+        arr_gt[:, 1:4] = numpy.cumsum(rng.normal(size=(num_gt, 3)) * 0.1, axis=0)
+        q = rng.normal(size=(num_gt, 4)) * 0.05 + numpy.array([0, 0, 0, 1])
+        arr_gt[:, 4:8] = q / numpy.linalg.norm(q, axis=1)[:, None]
+
+        if seed_est is not None:
+            rng = numpy.random.default_rng(seed_est)
+        arr_est = arr_gt[::2].copy()
+        arr_est[:, 0] += 0.001
+        arr_est[:, 1:4] += rng.normal(size=(len(arr_est), 3)) * 0.05
+        q = arr_est[:, 4:8] + rng.normal(size=(len(arr_est), 4)) * 0.01
+        arr_est[:, 4:8] = q / numpy.linalg.norm(q, axis=1)[:, None]
+        arr_est[:, [8, 11, 13]] = 0.01  # pxx, pyy, pzz
+        arr_est[:, [14, 17, 19]] = 0.001  # qrr, qpp, qyy
+        return arr_gt, arr_est
+
+    def test_compare_with_TrajectoryEvaluation(self):
+        from cnspy_trajectory_evaluation.TrajectoryEvaluation import TrajectoryEvaluation
+        arr_gt, arr_est = InMemoryTrajectoryEvaluation_Test.create_trajectories()
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            e = InMemoryTrajectoryEvaluation(arr_gt, arr_est, result_dir=os.path.join(tmp_dir, 'mem'),
+                                             alignment_type=TrajectoryAlignmentTypes.se3, keep_csv=True)
+            self.assertTrue(os.path.exists(os.path.join(tmp_dir, 'mem', 'report.ini')))
+
+            # the CSV based evaluation of the very same trajectories
+            csv_dir = os.path.join(tmp_dir, 'mem')
+            e_ref = TrajectoryEvaluation(fn_gt=os.path.join(csv_dir, 'pose-gt.csv'),
+                                         fn_est=os.path.join(csv_dir, 'pose-est-cov.csv'),
+                                         result_dir=os.path.join(tmp_dir, 'csv'),
+                                         alignment_type=TrajectoryAlignmentTypes.se3)
+
+            for name in ['ARMSE_p', 'ARMSE_q', 'ANEES_p', 'ANEES_q']:
+                print(name + ": " + str(getattr(e.report, name)) + " == " + str(getattr(e_ref.report, name)))
+                self.assertAlmostEqual(getattr(e.report, name), getattr(e_ref.report, name), places=9)
+
+            e_no_csv = InMemoryTrajectoryEvaluation(arr_gt, arr_est, result_dir=os.path.join(tmp_dir, 'no_csv'))
+            self.assertEqual(os.listdir(os.path.join(tmp_dir, 'no_csv')), ['report.ini'])
+            self.assertAlmostEqual(e_no_csv.report.ARMSE_p, e.report.ARMSE_p)
+
+    def test_error_series(self):
+        # the estimate is sampled uniformly: the mean of the resampled series is close to the scalar metrics
+        arr_gt, arr_est = InMemoryTrajectoryEvaluation_Test.create_trajectories()
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            e = InMemoryTrajectoryEvaluation(arr_gt, arr_est, result_dir=tmp_dir, num_series_samples=400,
+                                             alignment_type=TrajectoryAlignmentTypes.se3)
+            series = ErrorSeriesStore.load_series(ErrorSeriesStore.get_series_fn(tmp_dir))
+        self.assertTrue(numpy.array_equal(series, e.error_series))
+        self.assertEqual(series.shape, (4, 400))
+        for i, name in enumerate(['ARMSE_p', 'ARMSE_q', 'ANEES_p', 'ANEES_q']):
+            self.assertAlmostEqual(series[i].mean() / getattr(e.report, name), 1.0, delta=0.02)
+
+
+if __name__ == "__main__":
+    unittest.main()
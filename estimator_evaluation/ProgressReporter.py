@@ -0,0 +1,235 @@
+#!/usr/bin/env python
+# Copyright (C) 2021, Roland Jung, Control of Networked Systems, University of Klagenfurt, Austria.
+#
+# All rights reserved.
+#
+# This software is licensed under the terms of the BSD-2-Clause-License with
+# no commercial use allowed, the full terms of which are made available in the
+# LICENSE file. No license in patents is granted.
+#
+# You can contact the author at <roland.jung@aau.at>
+#
+# Requirements:
+# tqdm (optional, for the progress bar)
+########################################################################################################################
+import sys
+import time
+import threading
+
+
+class ProgressReporter:
+    """
+    Progress of a crawl over a known number of bags: each finished bag is counted by its kind (see get_kinds()); the
+    throughput (bags/sec) and the ETA refer to the bags done in this session, bags that are known up front (cache
+    hits, journaled bags) are counted by skip() and do not bias the rate. The progress is shown as
+
+    - 'bar': a live tqdm progress bar with the counts as postfix,
+    - 'log': structured log lines every `interval` seconds, also if no bag finished (a stall shows as growing `idle`):
+        EVAL progress: done=120/2000 percent=6.0 evaluated=100 checkpoints=3 cached=15 journaled=2 failed=0
+        rate=3.21/s eta=0:09:45 elapsed=0:00:32 idle=1.2s
+    - 'none': no output,
+    - 'auto': 'bar' if the stream is a terminal and tqdm is available, else 'log'.
+
+    close() prints a summary line (except for 'none'). The clock `time_fn` (default time.time) can be replaced, e.g. by
+    tests.
+    """
+    total = 0
+    counts = None  # dict: kind -> number of bags
+    mode = 'log'
+    interval = 10.0  # [sec] between two log lines
+    name = 'EVAL'
+    stream = None
+    t_start = None
+    t_last = None  # time of the last finished bag
+    num_skipped = 0
+    bar = None  # tqdm instance in 'bar' mode
+    lock = None
+    heartbeat = None  # thread emitting the log lines
+    stopped = None  # threading.Event
+    time_fn = None  # clock [sec]
+
+    def __init__(self, total, mode='auto', interval=10.0, name='EVAL', stream=None, time_fn=time.time):
+        self.total = int(total)
+        self.counts = dict((kind, 0) for kind in ProgressReporter.get_kinds())
+        self.interval = float(interval)
+        self.name = name
+        self.stream = stream if stream is not None else sys.stderr
+        self.time_fn = time_fn
+        self.t_start = self.time_fn()
+        self.t_last = self.t_start
+        self.num_skipped = 0
+        self.lock = threading.Lock()
+        self.bar = None
+        self.heartbeat = None
+        self.stopped = threading.Event()
+        self.mode = ProgressReporter.get_mode(mode, self.stream)
+        if self.mode == 'bar':
+            from tqdm import tqdm
+            self.bar = tqdm(total=self.total, unit='bag', file=self.stream, dynamic_ncols=True, desc=self.name)
+        elif self.mode == 'log' and self.interval > 0:
+            self.heartbeat = threading.Thread(target=self.run_heartbeat, name='ProgressReporter', daemon=True)
+            self.heartbeat.start()
+
+    @staticmethod
+    def get_kinds():
+        # evaluated: extracted and evaluated, checkpoints: read from a report.ini, cached: from the ResultCache,
+        # journaled: from the EvaluationJournal, failed: no row
+        return ['evaluated', 'checkpoints', 'cached', 'journaled', 'failed']
+
+    @staticmethod
+    def get_mode(mode, stream):
+        if mode != 'auto':
+            if mode not in ['bar', 'log', 'none']:
+                raise ValueError("ProgressReporter: unknown mode: " + str(mode))
+            return mode
+        try:
+            import tqdm
+        except ImportError:
+            return 'log'
+        return 'bar' if hasattr(stream, 'isatty') and stream.isatty() else 'log'
+
+    @property
+    def num_done(self):
+        return sum(self.counts.values())
+
+    def skip(self, num, kind='cached'):
+        # bags known up front, e.g. cache hits
+        if num <= 0:
+            return
+        with self.lock:
+            self.counts[kind] += int(num)
+            self.num_skipped += int(num)
+            if self.bar is not None:
+                self.bar.update(int(num))
+                self.bar.reset(total=self.total)  # the rate and ETA of tqdm start after the skipped bags
+                self.bar.update(self.num_skipped)
+                self.bar.set_postfix(self.get_postfix(), refresh=False)
+
+    def update(self, kind='evaluated', num=1):
+        with self.lock:
+            self.counts[kind] += int(num)
+            self.t_last = self.time_fn()
+            if self.bar is not None:
+                self.bar.set_postfix(self.get_postfix(), refresh=False)
+                self.bar.update(int(num))
+
+    def get_postfix(self):
+        return dict((kind[:4], self.counts[kind]) for kind in ProgressReporter.get_kinds() if self.counts[kind])
+
+    def get_rate(self, t_now=None):
+        # bags/sec of this session
+        if t_now is None:
+            t_now = self.time_fn()
+        elapsed = t_now - self.t_start
+        num = self.num_done - self.num_skipped
+        return num / elapsed if elapsed > 0 and num > 0 else 0.0
+
+    def get_eta(self, t_now=None):
+        # seconds until all bags are done or None if unknown
+        rate = self.get_rate(t_now)
+        if rate <= 0:
+            return None
+        return max(0, self.total - self.num_done) / rate
+
+    @staticmethod
+    def format_duration(sec):
+        if sec is None:
+            return '?'
+        sec = int(round(sec))
+        return '{0}:{1:02d}:{2:02d}'.format(sec // 3600, (sec % 3600) // 60, sec % 60)
+
+    def get_line(self, t_now=None):
+        if t_now is None:
+            t_now = self.time_fn()
+        done = self.num_done
+        percent = 100.0 * done / self.total if self.total > 0 else 100.0
+        return (self.name + ' progress: done={0}/{1} percent={2:.1f} '.format(done, self.total, percent) +
+                ' '.join(kind + '=' + str(self.counts[kind]) for kind in ProgressReporter.get_kinds()) +
+                ' rate={0:.2f}/s eta={1} elapsed={2} idle={3:.1f}s'.format(
+                    self.get_rate(t_now), ProgressReporter.format_duration(self.get_eta(t_now)),
+                    ProgressReporter.format_duration(t_now - self.t_start), t_now - self.t_last))
+
+    def emit(self):
+        with self.lock:
+            line = self.get_line()
+        print(line, file=self.stream, flush=True)
+
+    def run_heartbeat(self):
+        while not self.stopped.wait(self.interval):
+            self.emit()
+
+    def close(self):
+        if self.stopped.is_set():
+            return
+        self.stopped.set()
+        if self.heartbeat is not None:
+            self.heartbeat.join()
+        if self.bar is not None:
+            self.bar.close()
+        if self.mode != 'none':
+            self.emit()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
+
+########################################################################################################################
+#################################################### T E S T ###########################################################
+########################################################################################################################
+import unittest
+import io
+
+
+class ProgressReporter_Test(unittest.TestCase):
+    def test_log(self):
+        clock = [100.0]
+        stream = io.StringIO()
+        with ProgressReporter(total=10, mode='auto', interval=0, stream=stream, time_fn=lambda: clock[0]) as progress:
+            self.assertEqual(progress.mode, 'log')
+            progress.skip(4, 'cached')
+            self.assertIsNone(progress.get_eta())
+            for kind in ['evaluated', 'evaluated', 'checkpoints', 'failed']:
+                clock[0] += 0.5
+                progress.update(kind)
+            clock[0] += 1.0
+            # 4 bags in 3 sec: the skipped bags do not count for the rate
+            self.assertAlmostEqual(progress.get_rate(), 4 / 3.0)
+            self.assertAlmostEqual(progress.get_eta(), 2 / (4 / 3.0))
+        line_list = stream.getvalue().splitlines()
+        self.assertEqual(len(line_list), 1)  # the summary, no heartbeat
+        fields = dict(field.split('=') for field in line_list[-1].split(': ')[1].split(' '))
+        self.assertEqual(fields, {'done': '8/10', 'percent': '80.0', 'evaluated': '2', 'checkpoints': '1',
+                                  'cached': '4', 'journaled': '0', 'failed': '1', 'rate': '1.33/s',
+                                  'eta': '0:00:02', 'elapsed': '0:00:03', 'idle': '1.0s'})
+        self.assertEqual(ProgressReporter.format_duration(3725), '1:02:05')
+
+    def test_heartbeat(self):
+        # the log lines are printed, although no bag is done
+        stream = io.StringIO()
+        with ProgressReporter(total=3, mode='log', interval=0.01, stream=stream) as progress:
+            for i in range(1000):
+                if stream.getvalue():
+                    break
+                time.sleep(0.01)
+        self.assertIn('done=0/3', stream.getvalue())
+
+    def test_bar(self):
+        stream = io.StringIO()
+        with ProgressReporter(total=5, mode='bar', stream=stream) as progress:
+            progress.skip(2, 'journaled')
+            progress.update('evaluated')
+        self.assertIn('3/5', stream.getvalue())
+        self.assertEqual(progress.counts['journaled'], 2)
+
+        with ProgressReporter(total=5, mode='none', stream=stream) as progress:
+            progress.update('evaluated')
+        with self.assertRaises(ValueError):
+            ProgressReporter(total=5, mode='verbose')
+
+
+if __name__ == "__main__":
+    unittest.main()
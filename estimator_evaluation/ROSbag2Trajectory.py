@@ -0,0 +1,84 @@
+#!/usr/bin/env python
+# Copyright (C) 2021, Roland Jung, Control of Networked Systems, University of Klagenfurt, Austria.
+#
+# All rights reserved.
+#
+# This software is licensed under the terms of the BSD-2-Clause-License with
+# no commercial use allowed, the full terms of which are made available in the
+# LICENSE file. No license in patents is granted.
+#
+# You can contact the author at <roland.jung@aau.at>
+#
+# Requirements:
+# numpy, rosbag, cnspy_spatial_csv_formats, cnspy_rosbag2csv
+########################################################################################################################
+import os
+import numpy as numpy
+
+from cnspy_spatial_csv_formats.CSVFormatPose import CSVFormatPose
+from cnspy_rosbag2csv.ROSMsg2CSVLine import ROSMsg2CSVLine
+from cnspy_rosbag2csv.ROSMessageTypes import ROSMessageTypes
+
+
+class ROSbag2Trajectory:
+    """
+    In-memory counterpart of ROSbag2CSV: the messages of the given topics are converted into numpy arrays (one row
+    per message, columns as in CSVFormatPose.get_format(fmt)) instead of being written to CSV files.
+    """
+
+    def __init__(self):
+        pass
+
+    @staticmethod
+    def extract(bagfile_name, topic_list, fmt=CSVFormatPose.PoseWithCov, verbose=False):
+        """
+        Input:
+        bagfile_name -- file name of the rosbag
+        topic_list -- list of topic names, these must start with a "/" (absolute topic name)
+        fmt -- CSVFormatPose, defines the columns of the arrays
+
+        Output:
+        array_list -- list of numpy arrays [N x CSVFormatPose.get_num_elem(fmt)] in the order of topic_list, or None
+        """
+        if not os.path.isfile(bagfile_name):
+            print("ROSbag2Trajectory: could not find file: %s" % bagfile_name)
+            return None
+
+        if len(topic_list) < 1:
+            print("ROSbag2Trajectory: no topics specified!")
+            return None
+
+        # rosbag is only needed if bag files are actually read (not e.g. for the report.ini check points)
+        import rosbag
+        try:
+            bag = rosbag.Bag(bagfile_name)
+        except Exception:
+            if verbose:
+                print("ROSbag2Trajectory: Unexpected error!")
+            return None
+
+        dict_rows = dict()
+        for topicName in topic_list:
+            dict_rows[topicName] = []
+
+        # only the requested topics are read from the bag file
+        for topic, msg, t in bag.read_messages(topics=topic_list):
+            message_type = ROSMessageTypes.get_message_type(msg)
+            if message_type != ROSMessageTypes.NOT_SUPPORTED:
+                # HINT: the same conversion as in ROSbag2CSV is used, thus the values are identical to the CSV files
+                content = ROSMsg2CSVLine.to(fmt, msg, t, message_type)
+                if content is not None:
+                    dict_rows[topic].append([float(v) for v in content])
+        bag.close()
+
+        array_list = []
+        for topicName in topic_list:
+            if not dict_rows[topicName]:
+                print("ROSbag2Trajectory: WARNING topic [" + str(topicName) + "] was not in bag-file")
+                return None
+            array_list.append(numpy.array(dict_rows[topicName], dtype=float))
+
+        if verbose:
+            print("ROSbag2Trajectory: extracted " + str([len(arr) for arr in array_list]) + " messages of " +
+                  str(topic_list))
+        return array_list
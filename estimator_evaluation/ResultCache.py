@@ -0,0 +1,166 @@
+#!/usr/bin/env python
+# Copyright (C) 2021, Roland Jung, Control of Networked Systems, University of Klagenfurt, Austria.
+#
+# All rights reserved.
+#
+# This software is licensed under the terms of the BSD-2-Clause-License with
+# no commercial use allowed, the full terms of which are made available in the
+# LICENSE file. No license in patents is granted.
+#
+# You can contact the author at <roland.jung@aau.at>
+#
+# Requirements:
+# hashlib, json
+########################################################################################################################
+import os
+import time
+import json
+import hashlib
+
+
+class ResultCache:
+    """
+    Content addressed cache of bag file evaluations.
+
+    Each entry is keyed on a fingerprint of the bag file (size, mtime and a hash of sampled chunks) and on the
+    evaluation parameters (e.g. alignment type, number of aligned samples, topics). An entry holds the metrics
+    [armse_p, armse_q, anees_p, anees_q] of the evaluation. If the bag or the parameters change, the key changes and the
+    bag is evaluated again; outdated entries are evicted by the least recently used policy once `max_entries` is
+    exceeded.
+    """
+    fn = None
+    max_entries = 0  # 0 = unbounded
+    entries = None  # dict: key -> {'metrics': [...], 'bag': str, 'atime': float}
+    num_hits = 0
+    num_misses = 0
+
+    sample_size = 65536  # bytes per sampled chunk
+    num_samples = 3  # chunks at the beginning, middle, end of the file
+
+    def __init__(self, fn, max_entries=0):
+        self.fn = fn
+        self.max_entries = int(max_entries)
+        self.entries = dict()
+        self.num_hits = 0
+        self.num_misses = 0
+        if fn and os.path.exists(fn):
+            self.load(fn)
+
+    def get(self, key):
+        entry = self.entries.get(key)
+        if entry is None:
+            self.num_misses += 1
+            return None
+        self.num_hits += 1
+        entry['atime'] = time.time()
+        return entry['metrics']
+
+    def put(self, key, metrics, bag_fn=""):
+        self.entries[key] = {'metrics': [float(v) for v in metrics], 'bag': str(bag_fn), 'atime': time.time()}
+
+    def evict(self):
+        # least recently used entries are removed first
+        if self.max_entries < 1 or len(self.entries) <= self.max_entries:
+            return 0
+        keys = sorted(self.entries.keys(), key=lambda k: self.entries[k]['atime'])
+        num_evict = len(self.entries) - self.max_entries
+        for key in keys[:num_evict]:
+            del self.entries[key]
+        return num_evict
+
+    def load(self, fn):
+        with open(fn, 'r') as f:
+            self.entries = json.load(f)
+
+    def save(self, fn=None):
+        if fn is None:
+            fn = self.fn
+        self.evict()
+        head = os.path.dirname(os.path.abspath(fn))
+        if not os.path.exists(head):
+            os.makedirs(head)
+        # write to a temporary file and rename it: the cache is never left half written
+        fn_tmp = fn + '.tmp'
+        with open(fn_tmp, 'w') as f:
+            json.dump(self.entries, f)
+        os.replace(fn_tmp, fn)
+
+    @staticmethod
+    def fingerprint(fn):
+        """
+        a fast fingerprint of a file: size, mtime and a hash of up to `num_samples` chunks distributed over the file.
+        """
+        stat = os.stat(fn)
+        size = stat.st_size
+        h = hashlib.sha1()
+        with open(fn, 'rb') as f:
+            if size <= ResultCache.sample_size * ResultCache.num_samples:
+                h.update(f.read())
+            else:
+                step = (size - ResultCache.sample_size) // (ResultCache.num_samples - 1)
+                for i in range(ResultCache.num_samples):
+                    f.seek(i * step)
+                    h.update(f.read(ResultCache.sample_size))
+        return [size, stat.st_mtime_ns, h.hexdigest()]
+
+    @staticmethod
+    def get_key(fn, params):
+        """
+        Input:
+        fn -- file name of the bag file
+        params -- dict of evaluation parameters (must be JSON serializable)
+
+        Output:
+        key -- string
+        """
+        content = json.dumps([ResultCache.fingerprint(fn), params], sort_keys=True)
+        return hashlib.sha1(content.encode('utf-8')).hexdigest()
+
+
+########################################################################################################################
+#################################################### T E S T ###########################################################
+########################################################################################################################
+import unittest
+import tempfile
+
+
+class ResultCache_Test(unittest.TestCase):
+    def test_key(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            bag_fn = os.path.join(tmp_dir, 'ATTR_1_LVL_1_RUN_1_EST_1.bag')
+            with open(bag_fn, 'wb') as f:
+                f.write(os.urandom(4 * ResultCache.sample_size))
+            params = {'alignment_type': 'se3', 'num_aligned_samples': -1, 'topic_list': ['/pose_gt', '/pose_est']}
+
+            key = ResultCache.get_key(bag_fn, params)
+            self.assertEqual(key, ResultCache.get_key(bag_fn, dict(params)))
+            self.assertNotEqual(key, ResultCache.get_key(bag_fn, dict(params, alignment_type='sim3')))
+            self.assertNotEqual(key, ResultCache.get_key(bag_fn, dict(params, num_aligned_samples=10)))
+
+            with open(bag_fn, 'r+b') as f:
+                f.seek(10)
+                f.write(b'changed')
+            self.assertNotEqual(key, ResultCache.get_key(bag_fn, params))
+
+    def test_eviction(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            fn = os.path.join(tmp_dir, 'eval_cache.json')
+            cache = ResultCache(fn, max_entries=2)
+            cache.put('a', [1, 2, 3, 4])
+            cache.put('b', [5, 6, 7, 8])
+            cache.put('c', [9, 10, 11, 12])
+            cache.entries['a']['atime'] = 0
+            cache.entries['b']['atime'] = 2
+            cache.entries['c']['atime'] = 1
+            cache.save()
+
+            cache = ResultCache(fn, max_entries=2)
+            self.assertIsNone(cache.get('a'))
+            self.assertEqual(cache.get('b'), [5, 6, 7, 8])
+            self.assertEqual(cache.get('c'), [9, 10, 11, 12])
+            self.assertEqual(cache.num_hits, 2)
+            self.assertEqual(cache.num_misses, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
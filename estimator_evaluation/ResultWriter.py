@@ -0,0 +1,181 @@
+#!/usr/bin/env python
+# Copyright (C) 2021, Roland Jung, Control of Networked Systems, University of Klagenfurt, Austria.
+#
+# All rights reserved.
+#
+# This software is licensed under the terms of the BSD-2-Clause-License with
+# no commercial use allowed, the full terms of which are made available in the
+# LICENSE file. No license in patents is granted.
+#
+# You can contact the author at <roland.jung@aau.at>
+#
+# Requirements:
+# threading, queue, concurrent.futures
+########################################################################################################################
+import queue
+import threading
+import concurrent.futures
+
+
+class ResultWriter:
+    """
+    Asynchronous writer of the result files (report.ini, error series, CSV files): the write operations are queued
+    and executed in their order by a background thread, thus the evaluation goes on while the files are written. The
+    queue holds at most `max_pending` operations; submit() blocks if it is full (backpressure, bounded memory).
+
+    The first exception of a write operation is raised by the next submit() or by close(), which waits until all
+    queued operations are done:
+
+        writer = ResultWriter()
+        writer.submit(report.save, fn)
+        writer.close()
+
+    submit() returns a Future of the operation; mark() returns a Future that is done when all operations submitted
+    before it are done (e.g. all files of a bag), since the operations are executed in order.
+    """
+    tasks = None  # queue.Queue of (func, args, Future) or None (stop)
+    thread = None
+    error = None  # first exception of a write operation, until raised
+    failed = False  # a write operation failed: the remaining ones are dropped
+    num_written = 0
+
+    def __init__(self, max_pending=16):
+        self.tasks = queue.Queue(maxsize=max(1, int(max_pending)))
+        self.error = None
+        self.failed = False
+        self.num_written = 0
+        self.thread = threading.Thread(target=self.run, name='ResultWriter', daemon=True)
+        self.thread.start()
+
+    def run(self):
+        while True:
+            task = self.tasks.get()
+            if task is None:
+                break
+            func, args, future = task
+            if self.failed:
+                # after an error, the remaining operations are dropped
+                future.set_exception(RuntimeError("ResultWriter: dropped after a failed write operation"))
+                continue
+            try:
+                func(*args)
+                self.num_written += 1
+                future.set_result(None)
+            except Exception as e:
+                self.error = e
+                self.failed = True
+                future.set_exception(e)
+
+    def submit(self, func, *args):
+        self.raise_error()
+        if self.thread is None:
+            raise RuntimeError("ResultWriter: already closed")
+        future = concurrent.futures.Future()
+        self.tasks.put((func, args, future))
+        return future
+
+    def mark(self):
+        # a Future, done when the operations submitted so far are done
+        return self.submit(ResultWriter.no_op)
+
+    @staticmethod
+    def no_op():
+        pass
+
+    def raise_error(self):
+        if self.error is not None:
+            error = self.error
+            self.error = None
+            raise error
+
+    def close(self):
+        if self.thread is not None:
+            self.tasks.put(None)
+            self.thread.join()
+            self.thread = None
+        self.raise_error()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            # an exception is pending: the writer is stopped without raising its own error
+            try:
+                self.close()
+            except Exception:
+                pass
+        return False
+
+
+########################################################################################################################
+#################################################### T E S T ###########################################################
+########################################################################################################################
+import unittest
+import time
+
+
+class ResultWriter_Test(unittest.TestCase):
+    def test_order(self):
+        written = []
+
+        def write(i):
+            time.sleep(0.001)
+            written.append(i)
+
+        with ResultWriter(max_pending=2) as writer:
+            for i in range(20):
+                writer.submit(write, i)
+            # backpressure: at most 2 operations wait in the queue (plus the running one)
+            self.assertLessEqual(20 - len(written), 3)
+        self.assertEqual(written, list(range(20)))
+        self.assertEqual(writer.num_written, 20)
+
+    def test_error(self):
+        def fail():
+            raise OSError("disk full")
+
+        writer = ResultWriter()
+        future = writer.submit(fail)
+        with self.assertRaises(OSError):
+            future.result()
+        # the error is raised by the next submit()
+        with self.assertRaises(OSError):
+            writer.submit(print, "not submitted")
+        writer.close()
+        self.assertEqual(writer.num_written, 0)
+
+    def test_dropped(self):
+        # the operations queued after a failed one are dropped, close() raises the error
+        started = threading.Event()
+
+        def fail():
+            started.wait()
+            raise OSError("disk full")
+
+        written = []
+        writer = ResultWriter()
+        future_fail = writer.submit(fail)
+        future_list = [writer.submit(written.append, 1), writer.mark()]
+        started.set()
+        with self.assertRaises(OSError):
+            future_fail.result()
+        for future in future_list:
+            with self.assertRaises(RuntimeError):
+                future.result()
+        with self.assertRaises(OSError):
+            writer.close()
+        self.assertEqual(written, [])
+
+    def test_mark(self):
+        written = []
+        with ResultWriter() as writer:
+            for i in range(5):
+                writer.submit(written.append, i)
+            writer.mark().result()
+            self.assertEqual(written, list(range(5)))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,106 @@
+#!/usr/bin/env python
+# Copyright (C) 2021, Roland Jung, Control of Networked Systems, University of Klagenfurt, Austria.
+#
+# All rights reserved.
+#
+# This software is licensed under the terms of the BSD-2-Clause-License with
+# no commercial use allowed, the full terms of which are made available in the
+# LICENSE file. No license in patents is granted.
+#
+# You can contact the author at <roland.jung@aau.at>
+#
+# Requirements:
+# numpy, multiprocessing.shared_memory (python >= 3.8)
+########################################################################################################################
+import os
+import numpy as numpy
+from multiprocessing import shared_memory
+from multiprocessing import resource_tracker
+
+
+class SharedGroundTruth:
+    """
+    Owner of the ground truth trajectories of the RUN directories in shared memory: the coordinator puts the array of
+    a run once and passes its descriptor (name, shape, dtype) to the pool workers, which copy it out of the shared
+    block by load() instead of reading the ground truth from their bag file. The blocks are released (unlinked) by
+    the owner, as soon as all estimators of a run are evaluated.
+
+    The resource tracker is started before the pool is created, thus the workers share it with the owner and attaching
+    to a block does not make a worker responsible for its cleanup.
+    """
+    blocks = None  # dict: key (e.g. RUN directory) -> SharedMemory
+
+    def __init__(self):
+        self.blocks = dict()
+        if os.name == 'posix':
+            # POSIX shared memory is tracked by the resource tracker, Windows releases its blocks with their handles
+            resource_tracker.ensure_running()
+
+    def put(self, key, arr):
+        """
+        Input:
+        key -- hashable, e.g. the RUN directory
+        arr -- numpy array, copied into a new shared block
+
+        Output:
+        descriptor -- (name, shape, dtype) of the block, see load()
+        """
+        self.release(key)
+        arr = numpy.ascontiguousarray(arr)
+        shm = shared_memory.SharedMemory(create=True, size=max(1, arr.nbytes))
+        numpy.ndarray(arr.shape, dtype=arr.dtype, buffer=shm.buf)[...] = arr
+        self.blocks[key] = shm
+        return shm.name, tuple(arr.shape), arr.dtype.str
+
+    def release(self, key):
+        shm = self.blocks.pop(key, None)
+        if shm is not None:
+            shm.close()
+            shm.unlink()
+
+    def close(self):
+        for key in list(self.blocks.keys()):
+            self.release(key)
+
+    def __len__(self):
+        return len(self.blocks)
+
+    @staticmethod
+    def load(descriptor):
+        # a private copy of the array: the block may be released while the copy is still in use
+        name, shape, dtype = descriptor
+        shm = shared_memory.SharedMemory(name=name)
+        try:
+            return numpy.ndarray(shape, dtype=numpy.dtype(dtype), buffer=shm.buf).copy()
+        finally:
+            shm.close()
+
+
+########################################################################################################################
+#################################################### T E S T ###########################################################
+########################################################################################################################
+import unittest
+import multiprocessing
+
+
+class SharedGroundTruth_Test(unittest.TestCase):
+    def test_put_load(self):
+        store = SharedGroundTruth()
+        arr = numpy.random.default_rng(0).normal(size=(1000, 20))
+        descriptor = store.put('RUN_1', arr)
+        self.assertEqual(len(store), 1)
+        with multiprocessing.Pool(processes=2) as pool:
+            arr_list = pool.map(SharedGroundTruth.load, [descriptor] * 4)
+        for arr_ in arr_list:
+            self.assertTrue(numpy.array_equal(arr_, arr))
+
+        store.put('RUN_2', numpy.empty((0, 20)))
+        self.assertEqual(SharedGroundTruth.load(store.put('RUN_2', arr[:10])).shape, (10, 20))
+        store.close()
+        self.assertEqual(len(store), 0)
+        with self.assertRaises(FileNotFoundError):
+            SharedGroundTruth.load(descriptor)
+
+
+if __name__ == "__main__":
+    unittest.main()
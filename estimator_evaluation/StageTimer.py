@@ -0,0 +1,152 @@
+#!/usr/bin/env python
+# Copyright (C) 2021, Roland Jung, Control of Networked Systems, University of Klagenfurt, Austria.
+#
+# All rights reserved.
+#
+# This software is licensed under the terms of the BSD-2-Clause-License with
+# no commercial use allowed, the full terms of which are made available in the
+# LICENSE file. No license in patents is granted.
+#
+# You can contact the author at <roland.jung@aau.at>
+#
+# Requirements:
+# pandas, resource (optional, Unix only)
+########################################################################################################################
+import os
+import time
+from contextlib import contextmanager
+import pandas as pandas
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+
+class StageTimer:
+    """
+    Records the wall time, CPU time (of the thread running the stage) and the peak resident set size (of the process,
+    so far) of named stages of the evaluation pipeline, optionally per bag file:
+
+        timer = StageTimer()
+        with timer.stage('extract', bag=bag_fn):
+            ...
+        timer.save('eval_timings.csv')
+
+    The records of other processes (e.g. pool workers) can be added by merge(). The CPU time is measured per thread:
+    the stages of the reader threads (e.g. 'extract', see EstimatorEvaluation.evaluate_serial()) do not count the
+    evaluation in the main thread, stages spanning several threads (e.g. 'evaluation') count the CPU time of the
+    thread they were entered in only.
+    """
+    records = None  # list of [bag, stage, wall, cpu, max_rss]
+
+    def __init__(self):
+        self.records = []
+
+    @contextmanager
+    def stage(self, name, bag=''):
+        t_wall = time.perf_counter()
+        t_cpu = time.thread_time()
+        try:
+            yield
+        finally:
+            self.records.append([str(bag), str(name), time.perf_counter() - t_wall, time.thread_time() - t_cpu,
+                                 StageTimer.get_max_rss()])
+
+    def merge(self, records):
+        self.records.extend(records)
+
+    def get_wall_time(self, bag, name):
+        # sum of the wall times of a stage of a bag
+        return StageTimer.sum_wall_time(self.records, bag, name)
+
+    @staticmethod
+    def sum_wall_time(records, bag, name):
+        # get_wall_time() of a list of records, e.g. the records returned with a single bag
+        return sum(r[2] for r in records if r[0] == bag and r[1] == name)
+
+    @property
+    def data_frame(self):
+        return pandas.DataFrame(self.records, columns=StageTimer.get_column_format())
+
+    def summary(self):
+        # total/mean/max wall time, total cpu time and peak rss per stage, sorted by the total wall time
+        df = self.data_frame
+        if df.empty:
+            return df
+        df_res = df.groupby('stage').agg(count=('wall', 'size'), wall=('wall', 'sum'), wall_mean=('wall', 'mean'),
+                                         wall_max=('wall', 'max'), cpu=('cpu', 'sum'), max_rss=('max_rss', 'max'))
+        return df_res.sort_values(by='wall', ascending=False)
+
+    def save(self, fn):
+        head = os.path.dirname(os.path.abspath(fn))
+        if not os.path.exists(head):
+            os.makedirs(head)
+        self.data_frame.to_csv(fn, index=False)
+
+    @staticmethod
+    def get_max_rss():
+        # peak resident set size of the process in kilobytes, -1 if unknown
+        if resource is None:
+            return -1
+        return int(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+
+    @staticmethod
+    def get_column_format():
+        return ['bag', 'stage', 'wall', 'cpu', 'max_rss']
+
+
+########################################################################################################################
+#################################################### T E S T ###########################################################
+########################################################################################################################
+import unittest
+import tempfile
+import threading
+
+
+class StageTimer_Test(unittest.TestCase):
+    def test_stage(self):
+        timer = StageTimer()
+        with timer.stage('sleep', bag='a.bag'):
+            time.sleep(0.05)
+        with timer.stage('busy'):
+            sum(i * i for i in range(100000))
+        try:
+            with timer.stage('error'):
+                raise ValueError()
+        except ValueError:
+            pass
+
+        self.assertEqual([r[1] for r in timer.records], ['sleep', 'busy', 'error'])
+        self.assertGreaterEqual(timer.get_wall_time('a.bag', 'sleep'), 0.05)
+        self.assertEqual(StageTimer.sum_wall_time(timer.records[1:], 'a.bag', 'sleep'), 0)
+        self.assertLess(timer.records[0][3], 0.05)  # sleeping does not consume cpu time
+        self.assertGreater(timer.records[1][3], 0.0)
+
+        # the cpu time of a stage in a thread does not count the busy main thread
+        def sleep():
+            with timer.stage('thread', bag='b.bag'):
+                time.sleep(0.1)
+
+        thread = threading.Thread(target=sleep)
+        thread.start()
+        while thread.is_alive():
+            sum(i * i for i in range(10000))
+        self.assertLess(timer.records[-1][3], 0.05)
+        del timer.records[-1]
+
+        timer.merge([['b.bag', 'sleep', 1.0, 0.0, 0]])
+        summary = timer.summary()
+        self.assertEqual(summary.index[0], 'sleep')
+        self.assertEqual(summary.loc['sleep', 'count'], 2)
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            fn = os.path.join(tmp_dir, 'eval_timings.csv')
+            timer.save(fn)
+            df = pandas.read_csv(fn, keep_default_na=False)
+        self.assertEqual(list(df.columns), StageTimer.get_column_format())
+        self.assertEqual(len(df.index), 4)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,399 @@
+#!/usr/bin/env python
+# Copyright (C) 2021, Roland Jung, Control of Networked Systems, University of Klagenfurt, Austria.
+#
+# All rights reserved.
+#
+# This software is licensed under the terms of the BSD-2-Clause-License with
+# no commercial use allowed, the full terms of which are made available in the
+# LICENSE file. No license in patents is granted.
+#
+# You can contact the author at <roland.jung@aau.at>
+#
+# Requirements:
+# numpy, pandas, argparse
+########################################################################################################################
+import os
+import time
+import argparse
+import numpy as numpy
+import pandas as pandas
+
+from estimator_evaluation.EstimatorReport import EstimatorReport
+from estimator_evaluation.EvaluationAnalyzer import EvaluationAnalyzer
+
+
+class StreamingAnalyzer:
+    """
+    Computes the statistics of the EvaluationAnalyzer (eval_analyzed) of a report that is read in chunks, e.g. a very
+    large eval.csv of merged campaigns. The memory is proportional to the number of (attr, lvl, est) groups times
+    `buffer_size`, not to the number of rows.
+
+    Each group keeps the maximum of each metric and a buffer of up to `buffer_size` rows. The statistics of groups
+    fitting into their buffer are computed exactly as by the EvaluationAnalyzer (same outlier removal, same values).
+    If a group exceeds its buffer, the buffer becomes a uniform sample of the group (reservoir sampling) and a second
+    pass over the report accumulates the moments (Welford/Chan updates), min and max of the runs that are not
+    outliers. The outlier threshold, the median and the confidence intervals of such groups are estimated from the
+    sample, thus approximated; a warning is printed and the groups are listed in `overflow_groups`.
+    """
+    data_frame_analyzer = None  # see EvaluationAnalyzer.get_column_format()
+
+    rmse_p_th = 0
+    rmse_q_th = 0
+    chunk_size = 100000  # rows per chunk
+    buffer_size = 10000  # rows per group
+    num_resamples = 0
+    confidence = 0.95
+
+    num_rows = 0
+    run_values = None  # set of the run values (defines the number of outliers)
+    overflow_groups = None  # list of (attr, lvl, est) groups with approximated statistics
+
+    # private data member: the accumulators per group (indexed by the group id)
+    group_ids = None  # dict: (attr, lvl, est) -> group id
+    group_keys = None  # list of (attr, lvl, est)
+    count = None  # numpy array: # of rows per group
+    max_values = None  # numpy array [group x metric]
+    buffers = None  # per group: list of row arrays [rows x metric], a reservoir [buffer_size x metric] on overflow
+    rng = None
+
+    def __init__(self, fn, rmse_p_th=0, rmse_q_th=0, chunk_size=100000, buffer_size=10000, num_resamples=0,
+                 confidence=0.95, seed=0):
+        self.rmse_p_th = rmse_p_th
+        self.rmse_q_th = rmse_q_th
+        self.chunk_size = max(1, int(chunk_size))
+        self.buffer_size = max(1, int(buffer_size))
+        self.num_resamples = int(num_resamples)
+        self.confidence = confidence
+        self.rng = numpy.random.default_rng(seed)
+
+        self.num_rows = 0
+        self.run_values = set()
+        self.overflow_groups = []
+        self.group_ids = dict()
+        self.group_keys = []
+        self.count = numpy.zeros(0, dtype=numpy.int64)
+        self.max_values = numpy.zeros((0, len(EvaluationAnalyzer.get_metric_columns())))
+        self.buffers = []
+
+        for chunk in StreamingAnalyzer.read_chunks(fn, self.chunk_size):
+            self.accumulate(chunk)
+        self.data_frame_analyzer = self.compute_statistics(fn)
+
+    def get_group_ids(self, df):
+        # the group id of each row of `df`, new groups are added
+        codes, uniques = pandas.MultiIndex.from_frame(df[EvaluationAnalyzer.get_group_keys()]).factorize()
+        ids = numpy.empty(len(uniques), dtype=numpy.int64)
+        for i, key in enumerate(uniques):
+            key = tuple(int(v) for v in key)
+            if key not in self.group_ids:
+                self.group_ids[key] = len(self.group_keys)
+                self.group_keys.append(key)
+                self.buffers.append([])
+            ids[i] = self.group_ids[key]
+
+        num_groups = len(self.group_keys)
+        if len(self.count) < num_groups:
+            num_new = num_groups - len(self.count)
+            self.count = numpy.concatenate((self.count, numpy.zeros(num_new, dtype=numpy.int64)))
+            self.max_values = numpy.concatenate((self.max_values,
+                                                 numpy.full((num_new, self.max_values.shape[1]), -numpy.inf)))
+        return codes, ids
+
+    def accumulate(self, chunk):
+        codes, ids = self.get_group_ids(chunk)
+        values = chunk[EvaluationAnalyzer.get_metric_columns()].to_numpy(dtype=float)
+        numpy.maximum.at(self.max_values, ids[codes], values)
+        self.run_values.update(numpy.unique(chunk['run'].to_numpy()).tolist())
+        self.num_rows += len(values)
+
+        # rows of each group in the order of the report
+        order = numpy.argsort(codes, kind='stable')
+        sizes = numpy.bincount(codes, minlength=len(ids))
+        for i, rows in enumerate(numpy.split(values[order], numpy.cumsum(sizes)[:-1])):
+            self.add_rows(ids[i], rows)
+
+    def add_rows(self, group_id, rows):
+        num_seen = int(self.count[group_id])
+        self.count[group_id] += len(rows)
+        buffer = self.buffers[group_id]
+        if isinstance(buffer, list):
+            if num_seen + len(rows) <= self.buffer_size:
+                buffer.append(rows)
+                return
+            # overflow: the buffer becomes a reservoir
+            reservoir = numpy.empty((self.buffer_size, rows.shape[1]))
+            reservoir[:num_seen] = numpy.concatenate(buffer) if buffer else reservoir[:0]
+            num_fill = self.buffer_size - num_seen
+            reservoir[num_seen:] = rows[:num_fill]
+            rows = rows[num_fill:]
+            num_seen = self.buffer_size
+            self.buffers[group_id] = buffer = reservoir
+
+        # reservoir sampling (algorithm R): the i-th row replaces a random row with probability buffer_size / (i + 1)
+        pos = (self.rng.random(len(rows)) * (num_seen + numpy.arange(1, len(rows) + 1))).astype(numpy.int64)
+        sel = pos < self.buffer_size
+        buffer[pos[sel]] = rows[sel]
+
+    def compute_statistics(self, fn):
+        keys = EvaluationAnalyzer.get_group_keys()
+        fmt = EvaluationAnalyzer.get_column_format(intervals=self.num_resamples > 0)
+        num_runs = len(self.run_values)
+        overflow = self.count > self.buffer_size
+
+        df_list = []
+        exact_ids = numpy.flatnonzero(~overflow)
+        if len(exact_ids):
+            df = self.get_buffer_data_frame(exact_ids)
+            df_list.append(EvaluationAnalyzer.compute_group_statistics(df, num_runs=num_runs, keys=keys,
+                                                                        num_resamples=self.num_resamples,
+                                                                        confidence=self.confidence))
+        overflow_ids = numpy.flatnonzero(overflow)
+        if len(overflow_ids):
+            self.overflow_groups = [self.group_keys[i] for i in overflow_ids]
+            print("StreamingAnalyzer: WARNING " + str(len(overflow_ids)) + " groups exceed the buffer of " +
+                  str(self.buffer_size) + " rows: their outlier removal, median and confidence intervals are "
+                                          "approximated from a uniform sample")
+            df_list.append(self.compute_overflow_statistics(fn, overflow_ids, num_runs))
+
+        if not df_list:
+            return pandas.DataFrame(columns=fmt)
+        df_res = pandas.concat(df_list).sort_values(by=keys).reset_index(drop=True)
+        for key in keys:
+            df_res[key] = df_res[key].astype(numpy.int64)
+        EvaluationAnalyzer.judge(df_res, self.rmse_p_th, self.rmse_q_th)
+        return df_res[fmt]
+
+    def get_buffer_data_frame(self, group_ids, masks=None):
+        # the buffered rows of the given groups as report (attr, lvl, est and the metrics)
+        keys = EvaluationAnalyzer.get_group_keys()
+        rows = [numpy.concatenate(self.buffers[i]) if isinstance(self.buffers[i], list) else self.buffers[i]
+                for i in group_ids]
+        if masks is not None:
+            rows = [r[mask] for r, mask in zip(rows, masks)]
+        sizes = [len(r) for r in rows]
+        key_values = numpy.repeat(numpy.array([self.group_keys[i] for i in group_ids], dtype=numpy.int64), sizes,
+                                  axis=0)
+        df = pandas.DataFrame(numpy.concatenate(rows), columns=EvaluationAnalyzer.get_metric_columns())
+        for j, key in enumerate(keys):
+            df.insert(j, key, key_values[:, j])
+        return df
+
+    def compute_overflow_statistics(self, fn, group_ids, num_runs):
+        metrics = EvaluationAnalyzer.get_metric_columns()
+        num_groups = len(self.group_keys)
+        num_rm = EvaluationAnalyzer.get_num_outliers(num_runs)
+
+        # outlier threshold of the normalized sum (see EvaluationAnalyzer.get_outlier_mask()), from the samples
+        threshold = numpy.full(num_groups, numpy.inf)
+        masks = []
+        with numpy.errstate(divide='ignore', invalid='ignore'):
+            for i in group_ids:
+                norm_sum = numpy.nansum(self.buffers[i] / self.max_values[i], axis=1)
+                if num_rm > 0:
+                    threshold[i] = numpy.quantile(norm_sum, 1.0 - num_rm / float(self.count[i]))
+                masks.append(norm_sum <= threshold[i])
+
+        # second pass: moments, min and max of the runs that are not outliers (Chan et al. merge per chunk)
+        n = numpy.zeros((num_groups, len(metrics)))
+        mean = numpy.zeros((num_groups, len(metrics)))
+        m2 = numpy.zeros((num_groups, len(metrics)))
+        sum_sq = numpy.zeros((num_groups, len(metrics)))
+        min_values = numpy.full((num_groups, len(metrics)), numpy.nan)
+        max_values = numpy.full((num_groups, len(metrics)), numpy.nan)
+        is_overflow = numpy.zeros(num_groups, dtype=bool)
+        is_overflow[group_ids] = True
+        for chunk in StreamingAnalyzer.read_chunks(fn, self.chunk_size):
+            codes, ids = self.get_group_ids(chunk)
+            gid = ids[codes]
+            values = chunk[metrics].to_numpy(dtype=float)
+            with numpy.errstate(divide='ignore', invalid='ignore'):
+                norm_sum = numpy.nansum(values / self.max_values[gid], axis=1)
+            sel = is_overflow[gid] & (norm_sum <= threshold[gid])
+            gid = gid[sel]
+            values = values[sel]
+            for j in range(len(metrics)):
+                valid = ~numpy.isnan(values[:, j])
+                g = gid[valid]
+                v = values[valid, j]
+                n_b = numpy.bincount(g, minlength=num_groups).astype(float)
+                with numpy.errstate(divide='ignore', invalid='ignore'):
+                    mean_b = numpy.bincount(g, weights=v, minlength=num_groups) / n_b
+                mean_b[n_b == 0] = 0.0
+                m2_b = numpy.bincount(g, weights=numpy.square(v - mean_b[g]), minlength=num_groups)
+                n_ab = n[:, j] + n_b
+                with numpy.errstate(divide='ignore', invalid='ignore'):
+                    delta = mean_b - mean[:, j]
+                    mean[:, j] = numpy.where(n_ab > 0, mean[:, j] + delta * n_b / n_ab, 0.0)
+                    m2[:, j] = numpy.where(n_ab > 0, m2[:, j] + m2_b + delta * delta * n[:, j] * n_b / n_ab, 0.0)
+                n[:, j] = n_ab
+                sum_sq[:, j] += numpy.bincount(g, weights=v * v, minlength=num_groups)
+                numpy.fmin.at(min_values[:, j], g, v)
+                numpy.fmax.at(max_values[:, j], g, v)
+
+        # median and confidence intervals of the samples
+        df_sample = self.get_buffer_data_frame(group_ids, masks)
+        df_res = EvaluationAnalyzer.compute_group_statistics(df_sample, num_runs=0, num_resamples=self.num_resamples,
+                                                             confidence=self.confidence)
+        pos = numpy.array([self.group_ids[key] for key in
+                           df_res[EvaluationAnalyzer.get_group_keys()].itertuples(index=False, name=None)])
+        with numpy.errstate(divide='ignore', invalid='ignore'):
+            for j, metric in enumerate(metrics):
+                count = n[pos, j]
+                scale = 3.0 if metric.startswith('anees') else 1.0  # the mean of the ANEES is normalized
+                mean_exact = numpy.where(count > 0, mean[pos, j], numpy.nan)
+                if self.num_resamples > 0:
+                    # the intervals of the sample mean are scaled to the number of runs
+                    ratio = numpy.sqrt(df_res[metric + '.pairs'].values / count)
+                    for col in [metric + '.ci_low', metric + '.ci_high']:
+                        df_res[col] = (mean_exact + (df_res[col].values * scale - df_res[metric + '.mean'].values *
+                                                     scale) * ratio) / scale
+                var = numpy.where(count > 0, m2[pos, j] / count, numpy.nan)
+                df_res[metric + '.pairs'] = count
+                df_res[metric + '.rmse'] = numpy.where(count > 0, numpy.sqrt(sum_sq[pos, j] / count), numpy.nan)
+                df_res[metric + '.mean'] = mean_exact / scale
+                df_res[metric + '.std'] = numpy.sqrt(var)
+                df_res[metric + '.var'] = var
+                df_res[metric + '.min'] = min_values[pos, j]
+                df_res[metric + '.max'] = max_values[pos, j]
+        return df_res
+
+    def save(self, fn, save_index=False):
+        EstimatorReport.save_data_frame(data_frame=self.data_frame_analyzer, fn=fn,
+                                        fmt=self.data_frame_analyzer.columns, save_index=save_index)
+
+    @staticmethod
+    def read_chunks(fn, chunk_size):
+        # yields the report (EstimatorReport.get_column_format()) in chunks of `chunk_size` rows
+        fmt = EstimatorReport.get_column_format()
+        if EstimatorReport.is_binary_format(fn):
+            # the npz columns can not be read partially
+            df = EstimatorReport.load_binary(fn, fmt)
+            for i in range(0, len(df.index), chunk_size):
+                yield df.iloc[i:i + chunk_size]
+            return
+
+        with open(fn, 'r') as f:
+            first_line = f.readline()
+        names = fmt
+        if first_line.lstrip('#').split(',')[0].strip() == 'idx':
+            names = ['idx'] + fmt
+        # the C parser converts the floats as the python parser of EstimatorReport.load() (same precision)
+        reader = pandas.read_csv(fn, sep=',', comment='#', header=None, names=names, usecols=fmt,
+                                 dtype=dict(zip(fmt, EstimatorReport.get_column_dtypes())),
+                                 chunksize=chunk_size)
+        with reader:
+            for chunk in reader:
+                yield chunk
+
+
+########################################################################################################################
+#################################################### T E S T ###########################################################
+########################################################################################################################
+import unittest
+import tempfile
+
+
+class StreamingAnalyzer_Test(unittest.TestCase):
+    @staticmethod
+    def create_report(fn, num_groups, num_runs, seed=0):
+        rng = numpy.random.default_rng(seed)
+        num_rows = num_groups * num_runs
+        group = numpy.arange(num_rows) % num_groups
+        df = pandas.DataFrame({'attr': group // 20 + 1, 'lvl': group % 20 // 4 + 1, 'run': numpy.arange(num_rows) //
+                               num_groups, 'est': group % 4 + 1, 'armse_p': rng.gamma(2.0, 0.1, num_rows),
+                               'armse_q': rng.gamma(2.0, 1.0, num_rows), 'anees_p': rng.chisquare(3, num_rows),
+                               'anees_q': rng.chisquare(3, num_rows)})
+        EstimatorReport.save_data_frame(df, fn, EstimatorReport.get_column_format())
+
+    def test_exact(self):
+        # groups fitting into their buffers: the same statistics as the EvaluationAnalyzer
+        fmt = EvaluationAnalyzer.get_column_format(intervals=True)
+        analyzer = EvaluationAnalyzer(fn="./sample_data/EVAL/eval.csv", rmse_p_th=0.5, rmse_q_th=5,
+                                      num_resamples=200)
+        streaming = StreamingAnalyzer(fn="./sample_data/EVAL/eval.csv", rmse_p_th=0.5, rmse_q_th=5, chunk_size=7,
+                                      num_resamples=200)
+        df_ref = analyzer.data_frame_analyzer
+        df_res = streaming.data_frame_analyzer
+        self.assertEqual(streaming.overflow_groups, [])
+        self.assertEqual(list(df_res.columns), fmt)
+        self.assertEqual(len(df_res.index), len(df_ref.index))
+        for col in fmt:
+            if col == 'failure':
+                self.assertTrue((df_res[col].values == df_ref[col].values).all())
+            else:
+                self.assertTrue(numpy.array_equal(df_res[col].values.astype(float), df_ref[col].values.astype(float),
+                                                  equal_nan=True), col)
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            fn = os.path.join(tmp_dir, 'eval_analyzed.csv')
+            streaming.save(fn, save_index=True)
+            df_loaded = EvaluationAnalyzer.load_statistics(fn)
+        self.assertTrue(numpy.allclose(df_loaded['armse_p.mean'].values, df_ref['armse_p.mean'].values))
+
+    def test_overflow(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            fn = os.path.join(tmp_dir, 'eval.csv')
+            StreamingAnalyzer_Test.create_report(fn, num_groups=40, num_runs=2000)
+            df_ref = EvaluationAnalyzer(fn=fn, rmse_p_th=0.25, rmse_q_th=2.5, num_resamples=100).data_frame_analyzer
+            streaming = StreamingAnalyzer(fn=fn, rmse_p_th=0.25, rmse_q_th=2.5, chunk_size=5000, buffer_size=500,
+                                          num_resamples=100)
+        df_res = streaming.data_frame_analyzer
+        self.assertEqual(len(streaming.overflow_groups), 40)
+        self.assertEqual(list(df_res.columns), list(df_ref.columns))
+        for metric in EvaluationAnalyzer.get_metric_columns():
+            for stat in ['pairs', 'mean', 'std', 'rmse']:
+                col = metric + '.' + stat
+                self.assertTrue(numpy.allclose(df_res[col].values, df_ref[col].values, rtol=0.05), col)
+            # the median of the sample
+            self.assertTrue((numpy.abs(df_res[metric + '.median'].values - df_ref[metric + '.median'].values) <
+                             0.25 * df_ref[metric + '.std'].values).all(), metric)
+            ci_width = df_ref[metric + '.ci_high'].values - df_ref[metric + '.ci_low'].values
+            ci_width_res = df_res[metric + '.ci_high'].values - df_res[metric + '.ci_low'].values
+            self.assertTrue(numpy.allclose(ci_width_res, ci_width, rtol=0.5), metric)
+
+    def test_memory(self):
+        # the buffers do not grow with the number of rows (per group); see the Benchmark for time and memory
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            num_buffered = []
+            for num_runs in [1000, 4000]:
+                fn = os.path.join(tmp_dir, 'eval.csv')
+                StreamingAnalyzer_Test.create_report(fn, num_groups=40, num_runs=num_runs)
+                streaming = StreamingAnalyzer(fn=fn, chunk_size=10000, buffer_size=200)
+                self.assertEqual(streaming.num_rows, 40 * num_runs)
+                self.assertEqual(len(streaming.overflow_groups), 40)
+                num_buffered.append(sum(len(buffer) for buffer in streaming.buffers))
+        self.assertEqual(num_buffered, [40 * 200, 40 * 200])
+
+
+########################################################################################################################
+################################################### APPLICATION ########################################################
+########################################################################################################################
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description='StreamingAnalyzer: computes eval_analyzed from a report (eval.csv) read in chunks, with memory '
+                    'proportional to the number of (attr, lvl, est) groups')
+    parser.add_argument('--fn', help='report of the EstimatorEvaluation (eval.csv)', required=True)
+    parser.add_argument('--result_fn', help='statistics (default: eval_analyzed.csv next to the report)',
+                        default=None)
+    parser.add_argument('--thresholds', type=float, nargs=2, required=True,
+                        help='position and orientation armse thresholds (<float> [m] <float> [deg]) for estimators '
+                             'judgeing')
+    parser.add_argument('--chunk_size', type=int, help='# of rows read at once', default=100000)
+    parser.add_argument('--buffer_size', type=int, help='# of rows buffered per group; groups with more rows are '
+                                                        'approximated', default=10000)
+    parser.add_argument('--bootstrap', type=int, help='# of bootstrap resamples for confidence intervals of the means, '
+                                                      '0 = none', default=0)
+    parser.add_argument('--confidence', type=float, help='confidence level of the bootstrap intervals', default=0.95)
+    args = parser.parse_args()
+
+    tp_start = time.time()
+    result_fn = args.result_fn
+    if not result_fn:
+        result_fn = os.path.join(os.path.dirname(os.path.abspath(args.fn)), "eval_analyzed.csv")
+    streaming = StreamingAnalyzer(fn=args.fn, rmse_p_th=args.thresholds[0], rmse_q_th=args.thresholds[1],
+                                  chunk_size=args.chunk_size, buffer_size=args.buffer_size,
+                                  num_resamples=args.bootstrap, confidence=args.confidence)
+    streaming.save(fn=result_fn, save_index=True)
+    print("StreamingAnalyzer: " + str(streaming.num_rows) + " rows, " + str(len(streaming.group_keys)) +
+          " groups, saved: " + result_fn)
+    print("finished after [%s sec]\n" % str(time.time() - tp_start))
@@ -0,0 +1,210 @@
+#!/usr/bin/env python
+# Copyright (C) 2021, Roland Jung, Control of Networked Systems, University of Klagenfurt, Austria.
+#
+# All rights reserved.
+#
+# This software is licensed under the terms of the BSD-2-Clause-License with
+# no commercial use allowed, the full terms of which are made available in the
+# LICENSE file. No license in patents is granted.
+#
+# You can contact the author at <roland.jung@aau.at>
+#
+# Requirements:
+# numpy, pandas, argparse
+########################################################################################################################
+import os
+import time
+import argparse
+import numpy as numpy
+import pandas as pandas
+
+from estimator_evaluation.EvaluationAnalyzer import EvaluationAnalyzer
+
+
+class ThresholdSweep:
+    """
+    Judges the estimators for many pairs of thresholds (rmse_p_th, rmse_q_th) without recomputing the statistics.
+
+    The statistics of the (attr, lvl, est) groups are threshold independent; they are taken from the statistics file
+    (e.g. the eval_analyzed.csv written by EstimatorEvaluation) if it is not older than the report, otherwise they are
+    computed once by the EvaluationAnalyzer and saved there. A group fails for a pair of thresholds, if the mean
+    armse_p or the mean armse_q exceeds it (see EvaluationAnalyzer.judge()); all pairs are judged at once in a
+    [group x pair] matrix.
+    """
+    df_stats = None  # statistics per (attr, lvl, est) group, see EvaluationAnalyzer.get_column_format()
+    recomputed = False  # True, if the statistics were computed (not loaded from the statistics file)
+
+    def __init__(self, fn, fn_stats=None, num_resamples=0, confidence=0.95):
+        """
+        Input:
+        fn -- file name of the report (EstimatorReport, e.g. eval.csv)
+        fn_stats -- file name of the statistics (e.g. eval_analyzed.csv), used as cache, optional
+        num_resamples, confidence -- bootstrap intervals, if the statistics are computed (see EvaluationAnalyzer)
+        """
+        if fn_stats and os.path.exists(fn_stats) and os.path.getmtime(fn_stats) >= os.path.getmtime(fn):
+            self.df_stats = EvaluationAnalyzer.load_statistics(fn_stats)
+            self.recomputed = False
+        else:
+            analyzer = EvaluationAnalyzer(fn=fn, num_resamples=num_resamples, confidence=confidence)
+            self.df_stats = analyzer.data_frame_analyzer
+            self.recomputed = True
+            if fn_stats:
+                analyzer.save(fn=fn_stats, save_index=True)
+
+    def sweep(self, rmse_p_th, rmse_q_th, keys=None):
+        return ThresholdSweep.compute_failure_rates(self.df_stats, rmse_p_th, rmse_q_th, keys=keys)
+
+    @staticmethod
+    def make_grid(rmse_p_th_list, rmse_q_th_list):
+        # all combinations of the position and orientation thresholds
+        th_p, th_q = numpy.meshgrid(numpy.asarray(rmse_p_th_list, dtype=float),
+                                    numpy.asarray(rmse_q_th_list, dtype=float), indexing='ij')
+        return th_p.ravel(), th_q.ravel()
+
+    @staticmethod
+    def compute_failure_rates(df_stats, rmse_p_th, rmse_q_th, keys=None, chunk_size=4194304):
+        """
+        Input:
+        df_stats -- pandas.DataFrame: statistics per (attr, lvl, est) group (at least the keys and the armse means)
+        rmse_p_th, rmse_q_th -- arrays of the same length: the pairs of thresholds
+        keys -- list of columns the failure rates are computed for, default: ['est']
+        chunk_size -- max. # of elements of the failure matrix [group x pair] held at once
+
+        Output:
+        df_res -- pandas.DataFrame: one row per key and pair of thresholds (sorted by the keys, in the order of the
+                  pairs), columns: <keys>, rmse_p_th, rmse_q_th, groups, failures, failure_rate
+        """
+        if keys is None:
+            keys = ['est']
+        th_p = numpy.asarray(rmse_p_th, dtype=float).ravel()
+        th_q = numpy.asarray(rmse_q_th, dtype=float).ravel()
+        if len(th_p) != len(th_q):
+            raise ValueError("ThresholdSweep: the same number of position and orientation thresholds is needed")
+
+        grouped = df_stats.groupby(keys, sort=True)
+        group_ids = grouped.ngroup().to_numpy()
+        order = numpy.argsort(group_ids, kind='stable')
+        mean_p = df_stats['armse_p.mean'].to_numpy(dtype=float)[order]
+        mean_q = df_stats['armse_q.mean'].to_numpy(dtype=float)[order]
+        sizes = numpy.bincount(group_ids)
+        starts = numpy.concatenate(([0], numpy.cumsum(sizes)[:-1]))
+
+        num_pairs = len(th_p)
+        failures = numpy.zeros((len(sizes), num_pairs), dtype=numpy.int64)
+        if len(group_ids) > 0:
+            num_chunk = max(1, chunk_size // len(group_ids))
+            for i in range(0, num_pairs, num_chunk):
+                # NaN means (groups without runs) do not fail, as in EvaluationAnalyzer.judge()
+                failure = (mean_p[:, None] > th_p[None, i:i + num_chunk]) | \
+                          (mean_q[:, None] > th_q[None, i:i + num_chunk])
+                failures[:, i:i + num_chunk] = numpy.add.reduceat(failure, starts, axis=0)
+
+        df_keys = grouped.size().index.to_frame(index=False)
+        df_res = df_keys.loc[numpy.repeat(numpy.arange(len(sizes)), num_pairs)].reset_index(drop=True)
+        df_res['rmse_p_th'] = numpy.tile(th_p, len(sizes))
+        df_res['rmse_q_th'] = numpy.tile(th_q, len(sizes))
+        df_res['groups'] = numpy.repeat(sizes, num_pairs)
+        df_res['failures'] = failures.ravel()
+        df_res['failure_rate'] = df_res['failures'] / df_res['groups']
+        return df_res
+
+    @staticmethod
+    def pivot(df_res, keys=None, value='failure_rate'):
+        # table: one row per key, one column per pair of thresholds
+        if keys is None:
+            keys = ['est']
+        return df_res.pivot_table(index=keys, columns=['rmse_p_th', 'rmse_q_th'], values=value, sort=False)
+
+
+########################################################################################################################
+#################################################### T E S T ###########################################################
+########################################################################################################################
+import unittest
+import tempfile
+
+
+class ThresholdSweep_Test(unittest.TestCase):
+    def test_sweep(self):
+        # the failure rates must match judging the statistics pair by pair
+        sweep = ThresholdSweep(fn="./sample_data/EVAL/eval.csv")
+        self.assertTrue(sweep.recomputed)
+        th_p, th_q = ThresholdSweep.make_grid([0.0, 0.2, 0.5, 1.0, numpy.inf], [0.0, 2.0, 5.0, numpy.inf])
+        df_res = sweep.sweep(th_p, th_q)
+        est_values = sorted(sweep.df_stats['est'].unique())
+        self.assertEqual(len(df_res.index), len(est_values) * len(th_p))
+
+        for p, q in zip(th_p, th_q):
+            df_judged = EvaluationAnalyzer.judge(sweep.df_stats.copy(), p, q)
+            rate_ref = (df_judged['failure'] == "True").groupby(df_judged['est']).mean()
+            df_pair = df_res[(df_res['rmse_p_th'] == p) & (df_res['rmse_q_th'] == q)]
+            self.assertEqual(list(df_pair['est']), est_values)
+            self.assertTrue(numpy.allclose(df_pair['failure_rate'].values, rate_ref.values))
+        never = (df_res['rmse_p_th'] == numpy.inf) & (df_res['rmse_q_th'] == numpy.inf)
+        self.assertTrue((df_res.loc[never, 'failure_rate'].values == 0.0).all())
+
+        table = ThresholdSweep.pivot(df_res)
+        self.assertEqual(table.shape, (len(est_values), len(th_p)))
+
+        df_attr = ThresholdSweep.compute_failure_rates(sweep.df_stats, [0.5], [5.0], keys=['attr', 'est'],
+                                                       chunk_size=7)
+        self.assertEqual(df_attr['groups'].sum(), len(sweep.df_stats.index))
+
+    def test_cache(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            fn_stats = os.path.join(tmp_dir, 'eval_analyzed.npz')
+            sweep = ThresholdSweep(fn="./sample_data/EVAL/eval.csv", fn_stats=fn_stats)
+            self.assertTrue(sweep.recomputed)
+            self.assertTrue(os.path.exists(fn_stats))
+
+            sweep_cached = ThresholdSweep(fn="./sample_data/EVAL/eval.csv", fn_stats=fn_stats)
+            self.assertFalse(sweep_cached.recomputed)
+            df_res = sweep.sweep([0.5, 1.0], [5.0, 5.0])
+            self.assertTrue(df_res.equals(sweep_cached.sweep([0.5, 1.0], [5.0, 5.0])))
+
+    def test_chunks(self):
+        # the failure matrix is computed in chunks of pairs: the rates do not depend on the chunk size (see Benchmark
+        # for the time of a large sweep)
+        from estimator_evaluation.Benchmark import Benchmark
+        df_stats = Benchmark.create_stats_data(num_groups=1000)
+        th_p, th_q = ThresholdSweep.make_grid(numpy.linspace(0, 1, 5), numpy.linspace(0, 10, 5))
+        df_res = ThresholdSweep.compute_failure_rates(df_stats, th_p, th_q)
+        self.assertEqual(len(df_res.index), 12 * len(th_p))
+        self.assertTrue(df_res.equals(ThresholdSweep.compute_failure_rates(df_stats, th_p, th_q, chunk_size=5000)))
+
+
+########################################################################################################################
+################################################### APPLICATION ########################################################
+########################################################################################################################
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description='ThresholdSweep: failure rates of the estimators for all combinations of the given position and '
+                    'orientation armse thresholds; the statistics of eval_analyzed are reused (computed if missing '
+                    'or outdated)')
+    parser.add_argument('--eval_dir', help='root directory of evaluation (holding eval.csv)', required=True)
+    parser.add_argument('--rmse_p_th', type=float, nargs='+', help='position armse thresholds [m]', required=True)
+    parser.add_argument('--rmse_q_th', type=float, nargs='+', help='orientation armse thresholds [deg]',
+                        required=True)
+    parser.add_argument('--by', nargs='+', help='failure rates per: est (default), attr, lvl', default=['est'],
+                        choices=['attr', 'lvl', 'est'])
+    parser.add_argument('--format', help='file format of the reports: csv (default) or npz', choices=['csv', 'npz'],
+                        default='csv')
+    parser.add_argument('--result_fn', help='file the failure rates are written to (default: '
+                                            'eval_threshold_sweep.csv in eval_dir)', default=None)
+    args = parser.parse_args()
+
+    tp_start = time.time()
+    fn_report = os.path.join(args.eval_dir, "eval." + args.format)
+    fn_analyzed = os.path.join(args.eval_dir, "eval_analyzed." + args.format)
+    result_fn = args.result_fn
+    if not result_fn:
+        result_fn = os.path.join(args.eval_dir, "eval_threshold_sweep.csv")
+
+    sweep = ThresholdSweep(fn=fn_report, fn_stats=fn_analyzed)
+    th_p, th_q = ThresholdSweep.make_grid(args.rmse_p_th, args.rmse_q_th)
+    df_res = sweep.sweep(th_p, th_q, keys=args.by)
+    df_res.to_csv(result_fn, index=False)
+
+    print(ThresholdSweep.pivot(df_res, keys=args.by))
+    print("\nThresholdSweep: " + str(len(th_p)) + " threshold pairs, statistics " +
+          ("computed" if sweep.recomputed else "loaded from " + fn_analyzed) + ", saved: " + result_fn)
+    print("finished after [%s sec]\n" % str(time.time() - tp_start))
@@ -0,0 +1,596 @@
+#!/usr/bin/env python
+# Copyright (C) 2021, Roland Jung, Control of Networked Systems, University of Klagenfurt, Austria.
+#
+# All rights reserved.
+#
+# This software is licensed under the terms of the BSD-2-Clause-License with
+# no commercial use allowed, the full terms of which are made available in the
+# LICENSE file. No license in patents is granted.
+#
+# You can contact the author at <roland.jung@aau.at>
+#
+# Requirements:
+# json, argparse
+########################################################################################################################
+import os
+import time
+import json
+import errno
+import socket
+import hashlib
+import threading
+import argparse
+
+
+class WorkQueue:
+    """
+    Work queue of bag jobs in a directory on a shared file system (e.g. EVAL/eval_queue), shared by a coordinator and
+    workers on other processes or machines:
+
+        coordinator: publish(job_list) ... collect() until all published jobs are collected
+        worker:      claim() -> evaluate -> complete() (see run_worker())
+
+    The queue consists of plain files, no locking by the file system is needed (as by SQLite, which is unreliable on
+    NFS):
+    - jobs.json: the ids and jobs in their order (<id>: hash of the bag path . hash of the job and the bag stamp),
+      replaced by publish()
+    - leases/<id>.<k>.lease: the k-th claim of job <id>
+    - leases/<id>.<k>.failed: the k-th claim failed
+    - results/<id>.json: the result (or the final failure) of the job
+    Lease, failure and result files are created exclusively and atomically: the content is written to a temporary file,
+    which is then hard linked to its name (os.link() fails, if the name exists; atomic also on NFS). Thus only one
+    worker wins the k-th claim of a job and only the first result of a job is kept.
+
+    A worker reads jobs.json only if it changed and claims the jobs from a cursor: the jobs before it were claimed
+    already, a claim only checks the lease files of the jobs it passes (jobs of the other workers and the next pending
+    one) and the jobs known as done are not checked again. Only if the cursor reaches the end, the remaining jobs are
+    checked again for expired leases. A claim thus does not scan the whole queue.
+
+    A claimed job is leased by its worker for `lease_time` seconds (the clocks of the machines are assumed to be
+    synchronized), the worker renews the lease while it evaluates the job (see run_worker()); jobs of crashed or
+    preempted workers can be claimed again when their lease expired. close() releases the leases of the jobs that
+    were claimed but neither completed nor failed. A failing job is retried up to `max_attempts` times. The bag files
+    are stored relative to the parent directory of the queue, thus the workers may mount the EVAL folder at another
+    path. Jobs that were done by a previous coordinator run with the same parameters and an unchanged bag file (size,
+    mtime) are not evaluated again.
+    """
+    fn = None
+    root_dir = None
+    lease_time = 600.0  # [sec]
+    max_attempts = 3
+    collected = None  # coordinator: ids of the collected jobs
+    claims = None  # worker: job id -> (attempt, owner) of its open claims
+    job_list = None  # list of (id, job as JSON) in their order, see load_jobs()
+    job_stamp = None  # (mtime, size) of the loaded jobs.json
+    cursor = 0  # worker: position in the job list of the next claim
+    finished = None  # worker: ids of the jobs with a result or without attempts left
+    attempts = None  # worker: job id -> attempt of its last lease seen
+
+    def __init__(self, fn, lease_time=600.0, max_attempts=3):
+        self.fn = fn
+        self.root_dir = os.path.dirname(os.path.abspath(fn))
+        self.lease_time = float(lease_time)
+        self.max_attempts = int(max_attempts)
+        self.collected = set()
+        self.claims = dict()
+        self.job_list = []
+        self.job_stamp = None
+        self.cursor = 0
+        self.finished = set()
+        self.attempts = dict()
+        for sub_dir in ['leases', 'results']:
+            os.makedirs(os.path.join(fn, sub_dir), exist_ok=True)
+
+    def close(self):
+        # releases the leases of the open claims (e.g. the worker was interrupted): other workers claim them right away
+        for job_id, (attempt, owner) in list(self.claims.items()):
+            fn_lease = self.get_path('leases', '{0}.{1}.lease'.format(job_id, attempt))
+            lease = WorkQueue.read_json(fn_lease)
+            if lease is not None and lease['owner'] == owner:
+                os.remove(fn_lease)
+        self.claims.clear()
+
+    def get_rel_fn(self, bag_fn):
+        return os.path.relpath(os.path.abspath(bag_fn), self.root_dir)
+
+    def get_abs_fn(self, rel_fn):
+        return os.path.join(self.root_dir, rel_fn)
+
+    def get_path(self, sub_dir, name):
+        return os.path.join(self.fn, sub_dir, name)
+
+    def publish(self, job_list):
+        """
+        Input:
+        job_list -- list of job tuples (see EstimatorEvaluation.evaluate_bag_job()), the bag file comes first
+
+        Output:
+        id_list -- ids of the published jobs (in the order of the job list)
+        """
+        entry_list = []
+        for job in job_list:
+            rel_fn = self.get_rel_fn(job[0])
+            job_json = json.dumps([rel_fn] + list(job[1:]))
+            # other parameters or a changed bag file: a new id, the files of the former id are ignored
+            job_id = WorkQueue.get_hash(rel_fn) + '.' + WorkQueue.get_hash(job_json + WorkQueue.get_stamp(job[0]))
+            entry_list.append([job_id, job_json])
+        WorkQueue.write_file(os.path.join(self.fn, 'jobs.json'), json.dumps({'jobs': entry_list}))
+        self.load_jobs()
+        id_list = [job_id for job_id, job_json in entry_list]
+        self.collected.difference_update(id_list)
+        return id_list
+
+    def load_jobs(self):
+        # reads jobs.json, if it changed since the last call; the claims start again at the first job
+        try:
+            stat = os.stat(os.path.join(self.fn, 'jobs.json'))
+        except FileNotFoundError:
+            return self.job_list
+        stamp = (stat.st_mtime_ns, stat.st_size)
+        if stamp != self.job_stamp:
+            data = WorkQueue.read_json(os.path.join(self.fn, 'jobs.json'))
+            if data is not None:
+                self.job_list = [tuple(entry) for entry in data['jobs']]
+                self.job_stamp = stamp
+                self.cursor = 0
+        return self.job_list
+
+    def claim(self, owner):
+        """
+        leases the next pending job (or a job whose lease expired, failed or was released) to `owner`
+
+        Output:
+        (id, job) or None -- job tuple with the absolute bag file name
+        """
+        job_list = self.load_jobs()
+        now = time.time()
+        for n in range(len(job_list)):
+            pos = (self.cursor + n) % len(job_list)
+            job_id, job_json = job_list[pos]
+            if job_id in self.finished:
+                continue
+            if os.path.exists(self.get_path('results', job_id + '.json')):
+                self.finished.add(job_id)
+                continue
+            attempt = self.get_free_attempt(job_id, now)
+            if attempt is None:
+                continue
+            # only one worker can create the lease file of this attempt
+            lease = json.dumps({'owner': owner, 'expires': now + self.lease_time})
+            self.attempts[job_id] = attempt
+            if WorkQueue.create_file(self.get_path('leases', '{0}.{1}.lease'.format(job_id, attempt)), lease):
+                self.claims[job_id] = (attempt, owner)
+                self.cursor = pos + 1
+                job = json.loads(job_json)
+                return job_id, tuple([self.get_abs_fn(job[0])] + job[1:])
+        self.cursor = 0
+        return None
+
+    def get_free_attempt(self, job_id, now):
+        # the attempt a job can be claimed with, None if it is leased by a living worker or has no attempts left
+        attempt = self.attempts.get(job_id, 1)
+        while attempt <= self.max_attempts:
+            expires = self.get_lease_expires(job_id, attempt)
+            if expires is None:
+                return attempt
+            if expires >= now and not os.path.exists(self.get_path('leases', '{0}.{1}.failed'.format(job_id,
+                                                                                                       attempt))):
+                self.attempts[job_id] = attempt
+                return None
+            attempt += 1
+        self.finished.add(job_id)  # failed by the coordinator, see collect()
+        return None
+
+    def complete(self, job_id, owner, result):
+        # result: JSON serializable, e.g. [row, timer records]; the first result of a job is kept (a job whose lease
+        # expired may be done twice)
+        WorkQueue.create_file(self.get_path('results', job_id + '.json'),
+                              json.dumps({'state': 'done', 'owner': owner, 'result': result}))
+        self.claims.pop(job_id, None)
+        self.finished.add(job_id)
+
+    def fail(self, job_id, owner, error):
+        # the job is retried until it was claimed `max_attempts` times
+        attempt, owner_ = self.claims.pop(job_id, (None, None))
+        if attempt is None:
+            return
+        WorkQueue.create_file(self.get_path('leases', '{0}.{1}.failed'.format(job_id, attempt)),
+                              json.dumps({'owner': owner, 'error': str(error)}))
+        if attempt >= self.max_attempts:
+            WorkQueue.create_file(self.get_path('results', job_id + '.json'),
+                                  json.dumps({'state': 'failed', 'owner': owner, 'error': str(error)}))
+
+    def renew(self, job_id, owner):
+        # extends the lease of a claimed job while its worker is busy: False, if the lease is not held by `owner`
+        attempt, owner_ = self.claims.get(job_id, (None, None))
+        if attempt is None:
+            return False
+        fn_lease = self.get_path('leases', '{0}.{1}.lease'.format(job_id, attempt))
+        lease = WorkQueue.read_json(fn_lease)
+        if lease is None or lease['owner'] != owner:
+            return False
+        WorkQueue.write_file(fn_lease, json.dumps({'owner': owner, 'expires': time.time() + self.lease_time}))
+        return True
+
+    def collect(self):
+        """
+        the jobs whose last attempt expired are failed (the worker died, e.g. preempted or killed for its memory)
+
+        Output:
+        list of (id, state, result) of the jobs that are done or failed and were not collected yet
+        """
+        now = time.time()
+        result_set = set(self.list_results())
+        lease_dict = self.list_leases()
+        entries = []
+        for job_id, job_json in self.load_jobs():
+            if job_id in self.collected:
+                continue
+            if job_id not in result_set:
+                attempt, failed = lease_dict.get(job_id, (0, False))
+                if attempt < self.max_attempts:
+                    continue
+                expires = self.get_lease_expires(job_id, attempt)
+                if expires is None or (not failed and expires >= now):
+                    continue  # leased or released
+                WorkQueue.create_file(self.get_path('results', job_id + '.json'),
+                                      json.dumps({'state': 'failed', 'owner': None, 'error': 'lease expired'}))
+            res = self.read_result(job_id)
+            if res is None:
+                continue
+            self.collected.add(job_id)
+            entries.append((job_id, res['state'], res.get('result')))
+        return entries
+
+    def get_counts(self):
+        # number of jobs per state: pending, leased, done, failed
+        now = time.time()
+        result_set = set(self.list_results())
+        lease_dict = self.list_leases()
+        counts = dict()
+        for job_id, job_json in self.load_jobs():
+            if job_id in result_set:
+                res = self.read_result(job_id)
+                state = res['state'] if res is not None else 'done'
+            else:
+                attempt, failed = lease_dict.get(job_id, (0, False))
+                active = attempt > 0 and not failed and self.is_leased(job_id, attempt, now)
+                state = 'leased' if active else ('pending' if attempt < self.max_attempts else 'failed')
+            counts[state] = counts.get(state, 0) + 1
+        return counts
+
+    def get_num_leased(self):
+        # number of jobs leased by a living worker (its lease did not expire)
+        now = time.time()
+        result_set = set(self.list_results())
+        return sum(1 for job_id, (attempt, failed) in self.list_leases().items()
+                   if job_id not in result_set and not failed and self.is_leased(job_id, attempt, now))
+
+    def is_leased(self, job_id, attempt, now):
+        expires = self.get_lease_expires(job_id, attempt)
+        return expires is not None and expires >= now
+
+    def get_owners(self):
+        # owners of the results, e.g. to see the distribution over the workers
+        return sorted(set(res['owner'] for res in (self.read_result(job_id) for job_id in self.list_results())
+                          if res is not None and res['owner'] is not None))
+
+    def get_max_attempts(self):
+        # highest attempt of all jobs, 0 if none was claimed
+        return max([attempt for attempt, failed in self.list_leases().values()] + [0])
+
+    def list_results(self):
+        return [name[:-len('.json')] for name in os.listdir(os.path.join(self.fn, 'results'))
+                if name.endswith('.json')]
+
+    def read_result(self, job_id):
+        return WorkQueue.read_json(self.get_path('results', job_id + '.json'))
+
+    def list_leases(self):
+        # job id -> (last attempt, whether it failed)
+        lease_dict = dict()
+        for name in os.listdir(os.path.join(self.fn, 'leases')):
+            parts = name.rsplit('.', 2)
+            if len(parts) != 3 or parts[2] not in ['lease', 'failed'] or not parts[1].isdigit():
+                continue
+            job_id, attempt, failed = parts[0], int(parts[1]), parts[2] == 'failed'
+            last_attempt, last_failed = lease_dict.get(job_id, (0, False))
+            if attempt > last_attempt:
+                lease_dict[job_id] = (attempt, failed)
+            elif attempt == last_attempt:
+                lease_dict[job_id] = (attempt, last_failed or failed)
+        return lease_dict
+
+    def get_lease_expires(self, job_id, attempt):
+        # expiry time of a lease, None if it does not exist (not claimed yet or released)
+        fn_lease = self.get_path('leases', '{0}.{1}.lease'.format(job_id, attempt))
+        lease = WorkQueue.read_json(fn_lease)
+        if lease is not None:
+            return lease['expires']
+        try:
+            # written without link (see create_file()) and not complete yet: expires relative to its creation
+            return os.stat(fn_lease).st_mtime + self.lease_time
+        except FileNotFoundError:
+            return None
+
+    @staticmethod
+    def read_json(fn):
+        # the content of a file or None, if it does not exist (yet) or is incomplete
+        try:
+            with open(fn, 'r') as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    @staticmethod
+    def write_file(fn, data):
+        # replaces the file atomically
+        fn_tmp = fn + '.' + WorkQueue.get_hash(WorkQueue.get_owner()) + '.tmp'
+        with open(fn_tmp, 'w') as f:
+            f.write(data)
+        os.replace(fn_tmp, fn)
+
+    @staticmethod
+    def create_file(fn, data):
+        """
+        creates the file exclusively with the complete content `data`: False if it exists already. The content is
+        written to a temporary file, which is hard linked to `fn`; on file systems without hard links, the file is
+        created by O_EXCL and written.
+        """
+        fn_tmp = fn + '.' + WorkQueue.get_hash(WorkQueue.get_owner() + str(time.time())) + '.tmp'
+        with open(fn_tmp, 'w') as f:
+            f.write(data)
+        try:
+            os.link(fn_tmp, fn)
+            return True
+        except FileExistsError:
+            return False
+        except OSError as e:
+            if e.errno not in [errno.EPERM, errno.ENOTSUP, errno.EOPNOTSUPP, errno.EXDEV]:
+                raise
+            try:
+                fd = os.open(fn, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o644)
+            except FileExistsError:
+                return False
+            with os.fdopen(fd, 'w') as f:
+                f.write(data)
+            return True
+        finally:
+            os.remove(fn_tmp)
+
+    @staticmethod
+    def get_hash(text):
+        return hashlib.sha1(text.encode('utf-8')).hexdigest()[:16]
+
+    @staticmethod
+    def get_stamp(bag_fn):
+        # state of the bag file: a changed bag is evaluated again
+        if not os.path.exists(bag_fn):
+            return ''
+        stat = os.stat(bag_fn)
+        return str(stat.st_size) + ':' + str(stat.st_mtime_ns)
+
+    @staticmethod
+    def get_owner():
+        return socket.gethostname() + ':' + str(os.getpid())
+
+    @staticmethod
+    def run_heartbeat(queue, job_id, owner, stopped):
+        # renews the lease four times per lease time until `stopped` (threading.Event) is set
+        while not stopped.wait(queue.lease_time / 4.0):
+            queue.renew(job_id, owner)
+
+    @staticmethod
+    def run_worker(fn, owner=None, evaluate=None, lease_time=600.0, max_attempts=3, poll_interval=1.0,
+                   wait=False):
+        """
+        claims and evaluates jobs until the queue is empty (or forever if `wait` is set)
+
+        Input:
+        evaluate -- function(job) -> (row, records, stats), default: EstimatorEvaluation.evaluate_bag_job
+
+        Output:
+        num_jobs -- number of evaluated jobs
+        """
+        if evaluate is None:
+            from estimator_evaluation.EstimatorEvaluation import EstimatorEvaluation
+            evaluate = EstimatorEvaluation.evaluate_bag_job
+        if owner is None:
+            owner = WorkQueue.get_owner()
+        queue = WorkQueue(fn, lease_time=lease_time, max_attempts=max_attempts)
+        num_jobs = 0
+        try:
+            while True:
+                item = queue.claim(owner)
+                if item is None:
+                    if not wait:
+                        break
+                    time.sleep(poll_interval)
+                    continue
+                job_id, job = item
+                # the lease is renewed while the job is evaluated, thus slow bags are not claimed by a second worker
+                stopped = threading.Event()
+                heartbeat = threading.Thread(target=WorkQueue.run_heartbeat, args=(queue, job_id, owner, stopped),
+                                             name='WorkQueue', daemon=True)
+                heartbeat.start()
+                try:
+                    row, records, stats = evaluate(job)
+                except Exception as e:
+                    print("WorkQueue: " + str(owner) + " failed on " + str(job[0]) + ": " + str(e))
+                    queue.fail(job_id, owner, e)
+                    continue
+                finally:
+                    stopped.set()
+                    heartbeat.join()
+                queue.complete(job_id, owner, [list(row) if row is not None else None, records])
+                num_jobs += 1
+        finally:
+            queue.close()
+        return num_jobs
+
+
+########################################################################################################################
+#################################################### T E S T ###########################################################
+########################################################################################################################
+import unittest
+import tempfile
+import multiprocessing
+from unittest import mock
+
+
+class WorkQueue_Test(unittest.TestCase):
+    @staticmethod
+    def evaluate_job(job):
+        # stand-in of EstimatorEvaluation.evaluate_bag_job(): a row from the bag name
+        name = os.path.basename(job[0])
+        if 'FAIL' in name:
+            raise ValueError('broken bag')
+        time.sleep(0.01)
+        return (1, 1, int(name.split('_')[1]), 1, 0.5, 1.0, 3.0, 3.0), [[job[0], 'total', 0.01, 0.01, 0]], None
+
+    @staticmethod
+    def create_jobs(tmp_dir, num_jobs):
+        return [(os.path.join(tmp_dir, 'RUN_{0}_.bag'.format(i)), False, 'se3') for i in range(num_jobs)]
+
+    def test_lease(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            fn = os.path.join(tmp_dir, 'eval_queue')
+            queue = WorkQueue(fn, lease_time=0.2, max_attempts=2)
+            jobs = WorkQueue_Test.create_jobs(tmp_dir, 3) + [(os.path.join(tmp_dir, 'FAIL.bag'), False, 'se3')]
+            id_list = queue.publish(jobs)
+            self.assertEqual(len(id_list), 4)
+
+            job_id_a, job_a = queue.claim('a')
+            job_id_b, job_b = queue.claim('b')
+            self.assertEqual(job_a, jobs[0])
+            self.assertEqual(job_b, jobs[1])
+            self.assertEqual(queue.get_num_leased(), 2)
+            self.assertEqual(queue.get_counts(), {'leased': 2, 'pending': 2})
+            # the lease of 'a' expires, its job is claimed again by a new worker
+            time.sleep(0.3)
+            queue_c = WorkQueue(fn, lease_time=0.2, max_attempts=2)
+            job_id_c, job_c = queue_c.claim('c')
+            self.assertEqual(job_id_c, job_id_a)
+            queue_c.complete(job_id_c, 'c', [[0], []])
+            queue.complete(job_id_a, 'a', [[1], []])  # late result of the expired lease is ignored
+            self.assertEqual(queue.collect(), [(job_id_a, 'done', [[0], []])])
+            self.assertEqual(queue.collect(), [])
+
+            # the remaining jobs (including the one of 'b', whose lease expired) are done by a worker, the failing
+            # job is retried once
+            self.assertEqual(WorkQueue.run_worker(fn, owner='w', evaluate=WorkQueue_Test.evaluate_job,
+                                                  lease_time=0.2, max_attempts=2), 2)
+            self.assertEqual(queue.get_counts(), {'done': 3, 'failed': 1})
+            self.assertEqual(sorted(state for job_id, state, result in queue.collect()), ['done', 'done', 'failed'])
+
+            # the same jobs are not evaluated again, other parameters are
+            queue.publish(jobs[:2] + [(jobs[2][0], True, 'se3')])
+            self.assertEqual(queue.get_counts(), {'done': 2, 'pending': 1})
+            queue.close()
+
+    @staticmethod
+    def evaluate_slow_job(job):
+        # takes longer than the lease time of test_renew()
+        time.sleep(0.6)
+        return WorkQueue_Test.evaluate_job(job)
+
+    def test_renew(self):
+        # jobs taking longer than the lease time are not claimed again while their worker is busy
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            fn = os.path.join(tmp_dir, 'eval_queue')
+            queue = WorkQueue(fn, lease_time=0.2, max_attempts=2)
+            id_list = queue.publish(WorkQueue_Test.create_jobs(tmp_dir, 2))
+            process_list = [multiprocessing.Process(target=WorkQueue.run_worker,
+                                                    kwargs={'fn': fn, 'owner': 'w' + str(i), 'lease_time': 0.2,
+                                                            'max_attempts': 2,
+                                                            'evaluate': WorkQueue_Test.evaluate_slow_job})
+                            for i in range(2)]
+            for process in process_list:
+                process.start()
+            results = []
+            while len(results) < len(id_list):
+                results += queue.collect()  # the leases of the busy workers do not expire
+                time.sleep(0.05)
+            for process in process_list:
+                process.join()
+            self.assertEqual(sorted(state for job_id, state, result in results), ['done', 'done'])
+            self.assertEqual(queue.get_max_attempts(), 1)
+            queue.close()
+
+    def test_cursor(self):
+        # a claim checks the leases of the jobs it passes only, not of the whole queue
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            fn = os.path.join(tmp_dir, 'eval_queue')
+            WorkQueue(fn).publish(WorkQueue_Test.create_jobs(tmp_dir, 100))
+            queue_a = WorkQueue(fn)
+            queue_b = WorkQueue(fn)
+            with mock.patch.object(WorkQueue, 'get_lease_expires', autospec=True,
+                                   side_effect=WorkQueue.get_lease_expires) as get_lease_expires:
+                for i in range(50):
+                    job_id, job = queue_a.claim('a')
+                    queue_a.complete(job_id, 'a', [[i], []])
+                    queue_b.claim('b')
+                # a lease check per claim, 'a' passes the jobs claimed by 'b' (except the last) once
+                self.assertEqual(get_lease_expires.call_count, 50 + 50 + 49)
+
+            # the open claims are released by close(), their jobs are claimed again at once
+            queue_b.close()
+            self.assertEqual(queue_a.get_counts(), {'done': 50, 'pending': 50})
+            self.assertEqual(len([queue_a.claim('a') for i in range(50)]), 50)
+            self.assertIsNone(queue_a.claim('a'))
+            self.assertEqual(queue_a.get_max_attempts(), 1)
+            queue_a.close()
+            self.assertEqual(queue_a.get_counts(), {'done': 50, 'pending': 50})
+
+    def test_create_file(self):
+        # without hard links, the files are created by O_EXCL
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            fn = os.path.join(tmp_dir, 'a.lease')
+            with mock.patch('os.link', side_effect=OSError(errno.EPERM, 'not permitted')):
+                self.assertTrue(WorkQueue.create_file(fn, '{"owner": "a"}'))
+                self.assertFalse(WorkQueue.create_file(fn, '{"owner": "b"}'))
+            self.assertFalse(WorkQueue.create_file(fn, '{"owner": "c"}'))
+            self.assertEqual(WorkQueue.read_json(fn), {'owner': 'a'})
+            self.assertEqual(os.listdir(tmp_dir), ['a.lease'])
+
+    def test_workers(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            fn = os.path.join(tmp_dir, 'eval_queue')
+            queue = WorkQueue(fn)
+            id_list = queue.publish(WorkQueue_Test.create_jobs(tmp_dir, 40))
+
+            process_list = [multiprocessing.Process(target=WorkQueue.run_worker,
+                                                    kwargs={'fn': fn, 'owner': 'w' + str(i),
+                                                            'evaluate': WorkQueue_Test.evaluate_job})
+                            for i in range(3)]
+            for process in process_list:
+                process.start()
+            for process in process_list:
+                process.join()
+
+            results = queue.collect()
+            self.assertEqual(sorted(job_id for job_id, state, result in results), sorted(id_list))
+            self.assertEqual(sorted(result[0][2] for job_id, state, result in results), list(range(40)))
+            self.assertLessEqual(len(queue.get_owners()), 3)
+            self.assertEqual(queue.get_max_attempts(), 1)  # no job was claimed twice
+            queue.close()
+
+
+########################################################################################################################
+################################################### APPLICATION ########################################################
+########################################################################################################################
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description='WorkQueue worker: claims and evaluates the bag jobs published by an EstimatorEvaluation '
+                    'coordinator (--queue) into the queue directory')
+    parser.add_argument('--queue', help='queue directory, e.g. EVAL/eval_queue', required=True)
+    parser.add_argument('--owner', help='name of the worker (default: host:pid)', default=None)
+    parser.add_argument('--lease', type=float, help='lease time of a job [sec]', default=600.0)
+    parser.add_argument('--wait', help='keeps waiting for new jobs if the queue is empty', action='store_true',
+                        default=False)
+    args = parser.parse_args()
+
+    tp_start = time.time()
+    num_jobs = WorkQueue.run_worker(args.queue, owner=args.owner, lease_time=args.lease, wait=args.wait)
+    print("WorkQueue: " + str(num_jobs) + " jobs evaluated")
+    print("finished after [%s sec]\n" % str(time.time() - tp_start))